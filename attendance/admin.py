@@ -1,12 +1,136 @@
 from django.contrib import admin
-from .models import AttendanceRecord
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Count
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from . import dashboard, summary, users
+from .forms import KioskCredentialForm
+from .models import (
+    ArchivedAttendanceRecord, AttendanceRecord, ClockEvent, KioskCredential, MonthlyAttendanceSummary, Team,
+    TeamMembership,
+)
+
+# 件数の推定値がこれより多い場合は COUNT(*) を実行せず推定値を使う
+ESTIMATED_COUNT_THRESHOLD = 10000
+
+
+def _estimated_count(model, using):
+    """テーブルの行数の推定値（推定できない場合は None）"""
+    connection = connections[using]
+    table = connection.ops.quote_name(model._meta.db_table)
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [model._meta.db_table])
+        elif connection.vendor == 'sqlite':
+            # rowid の範囲（削除が少なければ行数に近い。インデックスの両端を読むだけで済む）
+            cursor.execute(f'SELECT MAX(rowid) - MIN(rowid) + 1 FROM {table}')
+        elif connection.vendor == 'mysql':
+            cursor.execute(
+                'SELECT table_rows FROM information_schema.tables WHERE table_schema = DATABASE() AND table_name = %s',
+                [model._meta.db_table],
+            )
+        else:
+            return None
+        row = cursor.fetchone()
+    if not row or row[0] is None or row[0] < 0:
+        return None
+    return row[0]
+
+
+class EstimatedCountPaginator(Paginator):
+    """絞り込みのない大きなテーブルでは件数に推定値を使うページネータ"""
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not queryset.query.where:
+            estimate = _estimated_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > ESTIMATED_COUNT_THRESHOLD:
+                return estimate
+        return super().count
+
+
+class UserAutocompleteFilter(admin.ListFilter):
+    """ユーザーでの絞り込み（全ユーザーを一覧せず、ユーザー検索 API の候補から選択）"""
+    title = 'ユーザー'
+    parameter_name = 'user__id__exact'
+    template = 'attendance/admin/user_filter.html'
+
+    def __init__(self, request, params, model, model_admin):
+        super().__init__(request, params, model, model_admin)
+        if self.parameter_name in params:
+            self.used_parameters[self.parameter_name] = params.pop(self.parameter_name)[-1]
+
+    def value(self):
+        return self.used_parameters.get(self.parameter_name)
+
+    def has_output(self):
+        return True
+
+    def expected_parameters(self):
+        return [self.parameter_name]
+
+    def queryset(self, request, queryset):
+        value = self.value()
+        if value is None:
+            return queryset
+        try:
+            return queryset.filter(user_id=int(value))
+        except ValueError:
+            raise IncorrectLookupParameters(value)
+
+    def choices(self, changelist):
+        entry = None
+        if self.value() is not None:
+            try:
+                entry = users.get(int(self.value()))
+            except ValueError:
+                pass
+        # 検索フォームで送信し直す他の絞り込み条件
+        other_params = [
+            (key, value)
+            for key, values in changelist.params.items()
+            if key != self.parameter_name
+            for value in (values if isinstance(values, list) else [values])
+        ]
+        yield {
+            'selected': self.value() is None,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+            'display': 'すべて',
+            'other_params': other_params,
+            # UserTypeaheadWidget のテンプレートに渡す値
+            'widget': {
+                'name': self.parameter_name,
+                'value': self.value() or '',
+                'label': f"{entry['full_name']} ({entry['username']})" if entry else '',
+                'placeholder': 'ユーザーを検索',
+                'attrs': {'id': 'user_filter', 'class': 'vTextField'},
+            },
+        }
+
+
+def _refresh_derived(keys):
+    """一括更新した勤怠記録の月次集計とダッシュボードを更新（UPDATE ではシグナルが送られないため）"""
+    summary.refresh(keys)
+    for record_date in {record_date for _, record_date in keys}:
+        dashboard.invalidate(record_date)
 
 
 @admin.register(AttendanceRecord)
 class AttendanceRecordAdmin(admin.ModelAdmin):
     list_display = ('user', 'date', 'clock_in_time', 'clock_out_time', 'break_start_time', 'break_end_time', 'total_work_time', 'get_status_display')
-    list_filter = ('date', 'user')
+    list_filter = (UserAutocompleteFilter,)
+    date_hierarchy = 'date'
     search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    autocomplete_fields = ('user',)
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    # 絞り込み前の全件数（COUNT(*)）は表示しない
+    show_full_result_count = False
+    actions = ('recalculate_summaries', 'clear_break', 'clear_clock_out')
     readonly_fields = ('total_work_time', 'total_break_time', 'created_at', 'updated_at')
     fieldsets = (
         ('ユーザー情報', {
@@ -25,3 +149,114 @@ class AttendanceRecordAdmin(admin.ModelAdmin):
         }),
     )
     ordering = ('-date', 'user')
+
+    @admin.action(description='選択した記録の月次集計を再計算')
+    def recalculate_summaries(self, request, queryset):
+        keys = list(queryset.values_list('user_id', 'date'))
+        _refresh_derived(keys)
+        self.message_user(request, f'{len(keys)} 件の記録の月次集計を再計算しました。')
+
+    @admin.action(description='選択した記録の休憩時刻を消去')
+    def clear_break(self, request, queryset):
+        # 実働・休憩時間は生成列のため、1回の UPDATE で再計算される
+        keys = list(queryset.values_list('user_id', 'date'))
+        updated = AttendanceRecord.objects.filter(pk__in=queryset.values('pk')).update(
+            break_start_time=None, break_end_time=None, updated_at=timezone.now(),
+        )
+        _refresh_derived(keys)
+        self.message_user(request, f'{updated} 件の休憩時刻を消去しました。')
+
+    @admin.action(description='選択した記録の退勤時刻を消去（出勤中に戻す）')
+    def clear_clock_out(self, request, queryset):
+        keys = list(queryset.values_list('user_id', 'date'))
+        updated = AttendanceRecord.objects.filter(pk__in=queryset.values('pk')).update(
+            clock_out_time=None, updated_at=timezone.now(),
+        )
+        _refresh_derived(keys)
+        self.message_user(request, f'{updated} 件の退勤時刻を消去しました。')
+
+
+@admin.register(ClockEvent)
+class ClockEventAdmin(admin.ModelAdmin):
+    """打刻イベント（追記のみのため閲覧専用）"""
+    list_display = ('user', 'event_type', 'timestamp', 'source', 'created_at')
+    list_filter = ('event_type', UserAutocompleteFilter)
+    search_fields = ('user__username', 'source')
+    date_hierarchy = 'timestamp'
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    ordering = ('-timestamp',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(KioskCredential)
+class KioskCredentialAdmin(admin.ModelAdmin):
+    """打刻用 PIN（ハッシュは表示しない）"""
+    form = KioskCredentialForm
+    list_display = ('user', 'updated_at')
+    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    raw_id_fields = ('user',)
+    list_select_related = ('user',)
+
+
+@admin.register(MonthlyAttendanceSummary)
+class MonthlyAttendanceSummaryAdmin(admin.ModelAdmin):
+    """月次勤怠集計（勤怠記録から自動更新されるため閲覧専用）"""
+    list_display = ('user', 'month', 'days_worked', 'total_work_time', 'total_break_time', 'first_punch_at', 'last_punch_at')
+    search_fields = ('user__username', 'user__first_name', 'user__last_name')
+    date_hierarchy = 'month'
+    list_select_related = ('user',)
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(ArchivedAttendanceRecord)
+class ArchivedAttendanceRecordAdmin(admin.ModelAdmin):
+    """アーカイブ済み勤怠記録（archive_attendance コマンドで移した記録のため閲覧専用）"""
+    list_display = ('user', 'date', 'clock_in_time', 'clock_out_time', 'total_work_time', 'archived_at')
+    list_filter = (UserAutocompleteFilter,)
+    date_hierarchy = 'date'
+    list_select_related = ('user',)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+class TeamMembershipInline(admin.TabularInline):
+    """チームのメンバー"""
+    model = TeamMembership
+    autocomplete_fields = ('user',)
+    extra = 0
+
+
+@admin.register(Team)
+class TeamAdmin(admin.ModelAdmin):
+    """チーム（メンバーはチームの画面で編集する）"""
+    list_display = ('name', 'member_count', 'updated_at')
+    search_fields = ('name',)
+    inlines = (TeamMembershipInline,)
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(member_count=Count('memberships'))
+
+    @admin.display(description='メンバー数', ordering='member_count')
+    def member_count(self, obj):
+        return obj.member_count
@@ -0,0 +1,169 @@
+"""勤怠の分析（残業・出勤時刻・遅刻・週あたりの労働時間）
+
+検索条件（ReportFilter）で絞り込んだ勤怠記録（アーカイブを含む場合はテーブルごと）から、
+出勤時刻の秒数・実働秒数・ISO 週を SQL で整数として求めて1回のクエリで取得し、NumPy の配列演算でユーザーごとに集計する。
+モデルインスタンスや時刻オブジェクトは作成しない。
+
+時刻は他の画面と同じく保存されている時刻（UTC）で比較する。
+週あたりの労働時間は期間の最初と最後の週が途中までの場合もそのまま集計する。
+"""
+from datetime import time
+from itertools import chain
+
+import numpy as np
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import models
+from django.db.models import Value
+from django.db.models.functions import Cast, Coalesce, ExtractHour, ExtractIsoYear, ExtractMinute, ExtractSecond, ExtractWeek
+
+from . import users
+from .expressions import DurationSeconds
+
+# 週あたりの労働時間の分布の区切り（時間）
+WEEKLY_HOURS_BINS = (20, 30, 40, 45, 50)
+WEEKLY_HOURS_LABELS = ('20時間未満', '20〜30時間', '30〜40時間', '40〜45時間', '45〜50時間', '50時間以上')
+
+# 取得する列の数（ユーザーID, 出勤秒, 実働秒, 週）
+COLUMNS = 4
+
+
+def _settings():
+    late_after = getattr(settings, 'ATTENDANCE_LATE_AFTER', time(9, 0))
+    if isinstance(late_after, str):
+        late_after = time.fromisoformat(late_after)
+    return (
+        getattr(settings, 'ATTENDANCE_STANDARD_DAILY_HOURS', 8),
+        late_after,
+    )
+
+
+def _seconds_of_day(field_name):
+    """TimeField を 0 時からの秒数（整数）にする式"""
+    return Cast(
+        ExtractHour(field_name) * 3600 + ExtractMinute(field_name) * 60 + ExtractSecond(field_name),
+        models.IntegerField(),
+    )
+
+
+def fetch_arrays(sources):
+    """出勤済みの勤怠記録を (ユーザーID, 出勤秒, 実働秒, 年*100+ISO週) の int64 配列で取得（テーブルごとに1クエリ）
+
+    実働時間がない（退勤していない）日は実働秒を -1 とする。
+    """
+    return np.concatenate([_fetch_array(records) for records in sources])
+
+
+def _fetch_array(records):
+    rows = records.filter(clock_in_time__isnull=False).order_by().values_list(
+        'user_id',
+        _seconds_of_day('clock_in_time'),
+        Coalesce(Cast(DurationSeconds('total_work_time'), models.BigIntegerField()), Value(-1)),
+        ExtractIsoYear('date') * 100 + ExtractWeek('date'),
+    )
+    return np.fromiter(chain.from_iterable(rows), dtype=np.int64).reshape(-1, COLUMNS)
+
+
+def _grouped_sum(index, values, size):
+    return np.bincount(index, weights=values, minlength=size)
+
+
+def _format_seconds_of_day(seconds):
+    seconds = int(round(seconds))
+    return f'{seconds // 3600:02d}:{seconds % 3600 // 60:02d}'
+
+
+def _names(user_ids):
+    """ユーザーID から表示名を取得（アクティブユーザーはキャッシュした一覧、それ以外は1クエリ）"""
+    names = {}
+    missing = []
+    for user_id in user_ids:
+        entry = users.get(user_id)
+        if entry is None:
+            missing.append(user_id)
+        else:
+            names[user_id] = (entry['username'], entry['full_name'])
+    if missing:
+        for user_id, username, first_name, last_name in User.objects.filter(pk__in=missing).values_list(
+            'id', 'username', 'first_name', 'last_name',
+        ):
+            names[user_id] = (username, f'{first_name} {last_name}'.strip())
+    return names
+
+
+def analyze(sources):
+    """ユーザーごとの残業・平均出勤時刻・遅刻回数・週あたりの労働時間の分布を求める
+
+    sources には集計するクエリセット（ReportFilter.base_querysets）のリストを指定する。
+    """
+    standard_daily_hours, late_after = _settings()
+    standard_seconds = int(standard_daily_hours * 3600)
+    late_after_seconds = late_after.hour * 3600 + late_after.minute * 60 + late_after.second
+
+    data = fetch_arrays(sources)
+    result = {
+        'standard_daily_hours': standard_daily_hours,
+        'late_after': late_after.strftime('%H:%M'),
+        'weekly_hours_labels': list(WEEKLY_HOURS_LABELS),
+        'users': [],
+        'weekly_distribution': [0] * len(WEEKLY_HOURS_LABELS),
+    }
+    if not len(data):
+        return result
+
+    user_ids, user_index = np.unique(data[:, 0], return_inverse=True)
+    clock_in, work, weeks = data[:, 1], data[:, 2], data[:, 3]
+    size = len(user_ids)
+
+    # 日単位の集計
+    days_worked = np.bincount(user_index, minlength=size)
+    completed = work >= 0
+    work_seconds = np.where(completed, work, 0)
+    overtime_seconds = np.maximum(work_seconds - standard_seconds, 0)
+    late = clock_in > late_after_seconds
+
+    total_work = _grouped_sum(user_index, work_seconds, size)
+    total_overtime = _grouped_sum(user_index, overtime_seconds, size)
+    overtime_days = _grouped_sum(user_index, overtime_seconds > 0, size)
+    late_count = _grouped_sum(user_index, late, size)
+    average_clock_in = _grouped_sum(user_index, clock_in, size) / days_worked
+
+    # 週単位の集計（ユーザー × 週の実働時間）
+    week_ids, week_index = np.unique(weeks, return_inverse=True)
+    cells = user_index * len(week_ids) + week_index
+    weekly_hours = _grouped_sum(cells, work_seconds, size * len(week_ids)).reshape(size, len(week_ids)) / 3600
+    worked_weeks = np.bincount(cells, minlength=size * len(week_ids)).reshape(size, len(week_ids)) > 0
+
+    buckets = np.digitize(weekly_hours, WEEKLY_HOURS_BINS)
+    bucket_count = len(WEEKLY_HOURS_LABELS)
+    distribution = np.bincount(
+        (np.arange(size)[:, None] * bucket_count + buckets)[worked_weeks],
+        minlength=size * bucket_count,
+    ).reshape(size, bucket_count)
+    weeks_worked = worked_weeks.sum(axis=1)
+    weekly_mean = np.where(worked_weeks, weekly_hours, 0).sum(axis=1) / np.maximum(weeks_worked, 1)
+    weekly_max = np.where(worked_weeks, weekly_hours, 0).max(axis=1)
+
+    names = _names(user_ids.tolist())
+    for position, user_id in enumerate(user_ids.tolist()):
+        username, full_name = names.get(user_id, ('', ''))
+        result['users'].append({
+            'user_id': user_id,
+            'username': username,
+            'full_name': full_name,
+            'days_worked': int(days_worked[position]),
+            'work_hours': round(float(total_work[position]) / 3600, 2),
+            'overtime_hours': round(float(total_overtime[position]) / 3600, 2),
+            'overtime_days': int(overtime_days[position]),
+            'average_clock_in': _format_seconds_of_day(average_clock_in[position]),
+            'late_count': int(late_count[position]),
+            'late_rate': round(float(late_count[position]) / int(days_worked[position]), 3),
+            'weeks_worked': int(weeks_worked[position]),
+            'weekly_hours_mean': round(float(weekly_mean[position]), 2),
+            'weekly_hours_max': round(float(weekly_max[position]), 2),
+            'weekly_distribution': distribution[position].tolist(),
+        })
+
+    result['users'].sort(key=lambda row: (row['full_name'], row['user_id']))
+    result['weekly_distribution'] = distribution.sum(axis=0).tolist()
+    return result
@@ -3,3 +3,15 @@ from django.apps import AppConfig
 
 class AttendanceConfig(AppConfig):
     name = 'attendance'
+
+    def ready(self):
+        # シグナルハンドラを登録
+        from . import signals  # noqa: F401
+
+        # PDF 用のフォントとスタイルを起動時に一度だけ登録
+        try:
+            from . import pdf
+        except ImportError:
+            # reportlab が未インストールの場合は PDF エクスポート時にエラーとなる
+            return
+        pdf.setup()
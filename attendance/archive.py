@@ -0,0 +1,152 @@
+"""古い勤怠記録のアーカイブ
+
+AttendanceRecord は増え続けるため、一定期間より古い記録を ArchivedAttendanceRecord へ移し、
+打刻・ダッシュボードが使う稼働テーブルとそのインデックスを小さく保つ。
+
+レポート・エクスポート・月次集計は期間がアーカイブ済みの日付を含む場合のみアーカイブも参照する。
+判定は参照のたびにアーカイブの日付のインデックスで行う（キャッシュしないため、移した直後から
+どのプロセスでも結果に含まれる）。当月の期間はアーカイブできないため判定のクエリも行わない。
+(ユーザー, 日付) の行はどちらか一方のテーブルにのみ存在し、アーカイブ済みの日の記録を
+稼働テーブルへ書き戻す処理（遅れて届いた打刻の射影・CSV の取り込み）は discard() で
+アーカイブ側の行を削除する。
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import ArchivedAttendanceRecord, AttendanceRecord
+
+# アーカイブへ移す列
+ARCHIVE_FIELDS = (
+    'user_id',
+    'date',
+    'clock_in_time',
+    'clock_out_time',
+    'break_start_time',
+    'break_end_time',
+    'total_work_time',
+    'total_break_time',
+    'created_at',
+    'updated_at',
+)
+
+# 1トランザクションで移す行数
+BATCH_SIZE = 5000
+
+
+def default_cutoff(today=None):
+    """既定のアーカイブ境界日（保持日数より前の月の月初。月の途中では分割しない）"""
+    days = getattr(settings, 'ATTENDANCE_ARCHIVE_AFTER_DAYS', 730)
+    today = today or timezone.now().date()
+    return (today - timedelta(days=days)).replace(day=1)
+
+
+def boundary():
+    """アーカイブ済みの範囲の境界日（この日付より前はアーカイブにある。未アーカイブの場合は None）"""
+    latest = ArchivedAttendanceRecord.objects.aggregate(latest=Max('date'))['latest']
+    return latest + timedelta(days=1) if latest else None
+
+
+def current_month_start():
+    """アーカイブできる境界日の上限（当月の記録は打刻で更新されるため移さない）"""
+    return timezone.now().date().replace(day=1)
+
+
+def includes(start_date):
+    """start_date 以降の期間がアーカイブ済みの日付を含むか（当月以降の期間はクエリを行わない）"""
+    if start_date >= current_month_start():
+        return False
+    return ArchivedAttendanceRecord.objects.filter(date__gte=start_date).exists()
+
+
+def _delete_rows(model, pks):
+    """主キーを指定して行を削除（シグナルを送らない DELETE。参照する外部キーのないモデルのみ）
+
+    パラメータ数がデータベースの上限（古い SQLite では 999）を超えないよう分割して実行する。
+    """
+    connection = connections[router.db_for_write(model)]
+    quote_name = connection.ops.quote_name
+    chunk_size = connection.features.max_query_params or max(len(pks), 1)
+    with connection.cursor() as cursor:
+        for start in range(0, len(pks), chunk_size):
+            chunk = pks[start:start + chunk_size]
+            cursor.execute(
+                f'DELETE FROM {quote_name(model._meta.db_table)} WHERE {quote_name(model._meta.pk.column)} '
+                f'IN ({", ".join(["%s"] * len(chunk))})',
+                chunk,
+            )
+
+
+def _move_batch(cutoff, batch_size):
+    """cutoff より前の勤怠記録を最大 batch_size 行アーカイブへ移す"""
+    with transaction.atomic():
+        rows = list(
+            AttendanceRecord.objects.filter(date__lt=cutoff)
+            .order_by('pk')
+            .values_list('pk', *ARCHIVE_FIELDS)[:batch_size]
+        )
+        if not rows:
+            return 0
+
+        ArchivedAttendanceRecord.objects.bulk_create(
+            [ArchivedAttendanceRecord(**dict(zip(ARCHIVE_FIELDS, row[1:]))) for row in rows],
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=[name for name in ARCHIVE_FIELDS if name not in ('user_id', 'date')],
+        )
+        # 月次集計・ダッシュボードの値は変わらないため、シグナルを送らずに削除する
+        # （QuerySet.delete() は post_delete の受信側があるため行ごとに読み込んで集計を更新してしまう）
+        _delete_rows(AttendanceRecord, [row[0] for row in rows])
+    return len(rows)
+
+
+def archive(cutoff, batch_size=BATCH_SIZE, progress=None):
+    """cutoff より前の勤怠記録をアーカイブへ移し、移した行数を返す
+
+    バッチごとにトランザクションを確定するため、中断しても再実行すれば続きから移せる。
+    progress には確定ごとに移した行数の累計を受け取る関数を指定できる。
+    """
+    if cutoff > current_month_start():
+        raise ValueError(f'当月（{current_month_start()} 以降）の記録はアーカイブできません。')
+
+    moved = 0
+    while True:
+        count = _move_batch(cutoff, batch_size)
+        if not count:
+            break
+        moved += count
+        if progress:
+            progress(moved)
+    return moved
+
+
+def _archived_rows(keys, *fields):
+    """(ユーザーID, 日付) の組のうちアーカイブにある行の (pk, ユーザーID, 日付, *fields)"""
+    before = boundary()
+    if before is None:
+        return []
+    keys = {(user_id, record_date) for user_id, record_date in keys if record_date < before}
+    if not keys:
+        return []
+
+    candidates = ArchivedAttendanceRecord.objects.filter(
+        user_id__in={user_id for user_id, _ in keys},
+        date__range=(min(record_date for _, record_date in keys), max(record_date for _, record_date in keys)),
+    ).values_list('pk', 'user_id', 'date', *fields)
+    return [row for row in candidates if (row[1], row[2]) in keys]
+
+
+def fetch(keys, fields):
+    """(ユーザーID, 日付) の組のうちアーカイブにある行の値を {(ユーザーID, 日付): {列名: 値}} で返す"""
+    return {(row[1], row[2]): dict(zip(fields, row[3:])) for row in _archived_rows(keys, *fields)}
+
+
+def discard(keys):
+    """(ユーザーID, 日付) の組のうちアーカイブにある行を削除（稼働テーブルへ書き戻す前に呼ぶ）"""
+    ids = [row[0] for row in _archived_rows(keys)]
+    if ids:
+        _delete_rows(ArchivedAttendanceRecord, ids)
+    return len(ids)
@@ -0,0 +1,245 @@
+"""データ規模ごとの性能計測
+
+指定した人数 × 日数の勤怠記録を投入し、主要な画面のレイテンシ・クエリ数・ピークメモリを計測する。
+benchmark コマンドと tests.py のクエリ数の上限チェックで共通に使用する。
+"""
+import json
+import platform
+import random
+import statistics
+import time as time_module
+import tracemalloc
+from dataclasses import asdict, dataclass, field
+from datetime import time, timedelta
+from itertools import cycle
+
+import django
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import summary
+from .models import AttendanceRecord
+
+# 一度に投入する行数
+SEED_BATCH_SIZE = 5000
+
+# 投入するユーザーのパスワード
+SEED_PASSWORD = 'benchmark'
+
+# 1リクエストあたりのクエリ数の上限（キャッシュなしの状態で計測）
+# 人数や記録数に比例して増える場合（N+1）はこの上限を超える
+QUERY_BUDGETS = {
+    'dashboard': 2,
+    # 条件付き GET の検証子（件数・最終更新日時）の集計1回を含む
+    'reports': 4,
+    'report_export_csv': 2,
+    'report_export_pdf': 2,
+    # ユーザー取得1回、打刻のトランザクション（開始・確定）2回、記録の読み込み1回、
+    # 出勤の INSERT 1回（同時作成に備えたセーブポイント2回を含む）、イベント1回、月次集計の読み込みと upsert 2回
+    'clock_action': 10,
+}
+
+
+@dataclass
+class Dataset:
+    """投入したデータの範囲"""
+    users: int
+    days: int
+    start_date: object
+    end_date: object
+    user_ids: list = field(default_factory=list)
+    records: int = 0
+    seed_seconds: float = 0.0
+
+
+def _seed_record(rng, user_id, record_date):
+    """1日分の勤怠記録（出勤・休憩・退勤の時刻を分単位でばらつかせる）"""
+    clock_in = time(8, 30 + rng.randrange(30)) if rng.random() < 0.5 else time(9, rng.randrange(30))
+    break_start = time(12, rng.randrange(15))
+    break_end = time(13, rng.randrange(15))
+    clock_out = time(17 + rng.randrange(2), rng.randrange(60))
+    return AttendanceRecord(
+        user_id=user_id,
+        date=record_date,
+        clock_in_time=clock_in,
+        clock_out_time=clock_out,
+        break_start_time=break_start,
+        break_end_time=break_end,
+    )
+
+
+def seed(users, days, end_date=None, seed=0, prefix='bench'):
+    """ユーザーと勤怠記録（平日のみ、end_date まで days 日分）を一括投入
+
+    当日の打刻を計測できるよう、end_date の既定値は前日とする。
+    """
+    started = time_module.perf_counter()
+    rng = random.Random(seed)
+    end_date = end_date or timezone.now().date() - timedelta(days=1)
+    start_date = end_date - timedelta(days=days - 1)
+
+    # パスワードのハッシュ化は1回のみ
+    password = make_password(SEED_PASSWORD)
+    User.objects.bulk_create(
+        [
+            User(
+                username=f'{prefix}{index:05d}',
+                first_name=f'名{index}',
+                last_name=f'姓{index}',
+                password=password,
+            )
+            for index in range(users)
+        ],
+        batch_size=SEED_BATCH_SIZE,
+    )
+    user_ids = list(
+        User.objects.filter(username__startswith=prefix).order_by('id').values_list('id', flat=True)
+    )
+
+    count = 0
+    batch = []
+    for offset in range(days):
+        record_date = start_date + timedelta(days=offset)
+        if record_date.weekday() >= 5:
+            continue
+        for user_id in user_ids:
+            batch.append(_seed_record(rng, user_id, record_date))
+            if len(batch) >= SEED_BATCH_SIZE:
+                AttendanceRecord.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+    AttendanceRecord.objects.bulk_create(batch)
+    count += len(batch)
+
+    # 一括投入ではシグナルが送られないため、集計とキャッシュは作り直す
+    summary.rebuild()
+    cache.clear()
+
+    return Dataset(
+        users=users,
+        days=days,
+        start_date=start_date,
+        end_date=end_date,
+        user_ids=user_ids,
+        records=count,
+        seed_seconds=round(time_module.perf_counter() - started, 3),
+    )
+
+
+def _report_query(dataset, range_days):
+    return f'start_date={dataset.end_date - timedelta(days=range_days - 1)}&end_date={dataset.end_date}'
+
+
+def requests_for(dataset, range_days=31):
+    """計測する画面ごとのリクエスト（URL を返す関数）
+
+    clock_action は呼び出しごとに別のユーザーを出勤させる（当日最初の打刻）。
+    """
+    query = _report_query(dataset, range_days)
+    punch_users = cycle(dataset.user_ids)
+    return {
+        'dashboard': lambda: reverse('attendance:dashboard'),
+        'reports': lambda: f"{reverse('attendance:reports')}?{query}",
+        'report_export_csv': lambda: f"{reverse('attendance:report_export_csv')}?{query}",
+        'report_export_pdf': lambda: f"{reverse('attendance:report_export_pdf')}?{query}",
+        'clock_action': lambda: reverse('attendance:clock_action', args=[next(punch_users), 'clock_in']),
+    }
+
+
+def _get(client, url):
+    """リクエストを送り、ストリーミングを含めて本文を最後まで読み込む"""
+    response = client.get(url)
+    if response.streaming:
+        size = sum(len(chunk) for chunk in response.streaming_content)
+    else:
+        size = len(response.content)
+    return response.status_code, size
+
+
+def measure(client, name, url, repeat=3):
+    """1画面を計測
+
+    キャッシュを消した状態のリクエストでクエリ数・レイテンシと（別のリクエストで）ピークメモリを、
+    続く repeat 回でキャッシュが効いた状態のレイテンシを計測する。
+    """
+    cache.clear()
+    with CaptureQueriesContext(connection) as queries:
+        started = time_module.perf_counter()
+        status, size = _get(client, url())
+        cold_ms = (time_module.perf_counter() - started) * 1000
+    # 記録したクエリは次のリクエストの開始時に消去されるため、件数をここで確定する
+    query_count = len(queries)
+
+    # tracemalloc は処理を遅くするため、レイテンシとは別に計測
+    cache.clear()
+    tracemalloc.start()
+    try:
+        _get(client, url())
+        peak_memory = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    timings = []
+    warm_queries = 0
+    for _ in range(repeat):
+        with CaptureQueriesContext(connection) as captured:
+            started = time_module.perf_counter()
+            _get(client, url())
+            timings.append((time_module.perf_counter() - started) * 1000)
+        warm_queries = len(captured)
+
+    return {
+        'view': name,
+        'status': status,
+        'response_bytes': size,
+        'queries': query_count,
+        'warm_queries': warm_queries,
+        'query_budget': QUERY_BUDGETS.get(name),
+        'cold_ms': round(cold_ms, 2),
+        'latency_ms': {
+            'min': round(min(timings), 2),
+            'median': round(statistics.median(timings), 2),
+            'max': round(max(timings), 2),
+        } if timings else None,
+        'peak_memory_kb': round(peak_memory / 1024, 1),
+    }
+
+
+def run(client, dataset, views=None, repeat=3, range_days=31):
+    """データセットに対して各画面を計測"""
+    requests = requests_for(dataset, range_days)
+    return [
+        measure(client, name, url, repeat)
+        for name, url in requests.items()
+        if views is None or name in views
+    ]
+
+
+def write_results(path, datasets):
+    """計測結果を JSON で保存
+
+    datasets は (Dataset, 計測結果のリスト) の組のリスト。
+    """
+    payload = {
+        'generated_at': timezone.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+        'datasets': [
+            {
+                **{key: value for key, value in asdict(dataset).items() if key != 'user_ids'},
+                'start_date': dataset.start_date.isoformat(),
+                'end_date': dataset.end_date.isoformat(),
+                'results': results,
+            }
+            for dataset, results in datasets
+        ],
+    }
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(payload, f, ensure_ascii=False, indent=2)
+    return payload
@@ -0,0 +1,191 @@
+"""ダッシュボードのスナップショット
+
+日付ごとのダッシュボード表示内容を Django のキャッシュに保存する（全体とチームごと）。
+キャッシュは全ワーカーで共有するもの（settings.CACHES）を前提とする。
+打刻やユーザー・チームの変更時はコミット後に日付の世代を更新し、その日付のスナップショットを
+まとめて無効化する。スナップショットのキーには世代を含めるため、コミット前のデータから作成中の
+スナップショットが無効化の後に保存されても参照されない（取得・変更・保存の競合で古い表示が残らない）。
+無効化後は最初の表示で1回のクエリで作り直し、以降の画面は同じスナップショットを共有する。
+スナップショットには内容から求めたバージョンと更新日時を持たせ、画面の条件付き GET の検証子に使う。
+"""
+import hashlib
+import uuid
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, F, FilteredRelation, IntegerField, Q, Sum, Value, When, Window
+from django.db.models.functions import Coalesce, Concat, Trim
+from django.utils import timezone
+
+from .expressions import duration_hours, duration_minutes
+from .models import status_expression, status_label_expression
+
+# スナップショットの有効期限（秒）
+DASHBOARD_CACHE_TIMEOUT = 300
+
+# 日付ごとの世代の有効期限（秒）。期限切れ後は新しい世代で作り直すだけなので、スナップショットより長ければよい
+GENERATION_CACHE_TIMEOUT = 60 * 60 * 24
+
+# 統計情報の項目名
+COUNTER_KEYS = ('total_clocked_in', 'total_on_break', 'total_clocked_out', 'total_not_clocked')
+
+
+def _generation_key(target_date):
+    return f'attendance:dashboard:{target_date.isoformat()}:generation'
+
+
+def _generation(target_date):
+    """日付の世代（無効化後の最初の参照で新しく発行する）"""
+    key = _generation_key(target_date)
+    generation = cache.get(key)
+    if generation is None:
+        # 同時に発行した場合は先に保存されたものを使う
+        cache.add(key, uuid.uuid4().hex, GENERATION_CACHE_TIMEOUT)
+        generation = cache.get(key)
+    return generation
+
+
+def _cache_key(target_date, team_id, generation):
+    return f'attendance:dashboard:{target_date.isoformat()}:{generation}:{team_id or "all"}'
+
+
+def _counter_conditions(prefix=''):
+    """統計情報の判定条件（出勤中には休憩中も含む）"""
+    return {
+        'total_clocked_in': Q(**{f'{prefix}clock_in_time__isnull': False, f'{prefix}clock_out_time__isnull': True}),
+        'total_on_break': Q(**{f'{prefix}break_start_time__isnull': False, f'{prefix}break_end_time__isnull': True}),
+        'total_clocked_out': Q(**{f'{prefix}clock_in_time__isnull': False, f'{prefix}clock_out_time__isnull': False}),
+        'total_not_clocked': Q(**{f'{prefix}clock_in_time__isnull': True}),
+    }
+
+
+def _stamp(snapshot):
+    """内容からバージョンを求め、更新日時を記録（内容が同じなら再作成してもバージョンは変わらない）"""
+    content = repr((
+        [sorted(item.items()) for item in snapshot['user_attendance_list']],
+        [snapshot[key] for key in COUNTER_KEYS],
+    ))
+    snapshot['version'] = hashlib.md5(content.encode('utf-8'), usedforsecurity=False).hexdigest()
+    snapshot['updated_at'] = timezone.now()
+    return snapshot
+
+
+def build_snapshot(target_date, team_id=None):
+    """データベースからスナップショットを作成
+
+    アクティブユーザーと対象日の勤怠記録の結合、勤務状態、実働時間の時・分、
+    統計情報（ウィンドウ関数）を1回のクエリで取得する。team_id を指定した場合はそのチームのメンバーのみ。
+    """
+    prefix = 'today_record__'
+    counters = {
+        key: Window(Sum(Case(When(condition, then=Value(1)), default=Value(0), output_field=IntegerField())))
+        for key, condition in _counter_conditions(prefix).items()
+    }
+
+    user_queryset = User.objects.filter(is_active=True)
+    if team_id:
+        user_queryset = user_queryset.filter(team_membership__team_id=team_id)
+
+    rows = list(
+        user_queryset
+        .annotate(today_record=FilteredRelation('attendance_records', condition=Q(attendance_records__date=target_date)))
+        .order_by('last_name', 'first_name', 'id')
+        .values(
+            'username',
+            'last_name',
+            'first_name',
+            user_id=F('id'),
+            team_id=F('team_membership__team_id'),
+            full_name=Trim(Concat('first_name', Value(' '), 'last_name')),
+            status_code=status_expression(prefix),
+            status=status_label_expression(prefix),
+            clock_in_time=F(f'{prefix}clock_in_time'),
+            clock_out_time=F(f'{prefix}clock_out_time'),
+            break_start_time=F(f'{prefix}break_start_time'),
+            break_end_time=F(f'{prefix}break_end_time'),
+            total_work_time=F(f'{prefix}total_work_time'),
+            total_work_hours=Coalesce(duration_hours(f'{prefix}total_work_time'), 0),
+            total_work_minutes=Coalesce(duration_minutes(f'{prefix}total_work_time'), 0),
+            **counters,
+        )
+    )
+
+    snapshot = {'date': target_date, 'team_id': team_id, 'user_attendance_list': []}
+    for key in COUNTER_KEYS:
+        snapshot[key] = rows[0][key] if rows else 0
+    for row in rows:
+        for key in COUNTER_KEYS:
+            del row[key]
+        snapshot['user_attendance_list'].append(row)
+    return _stamp(snapshot)
+
+
+def get_snapshot(target_date, team_id=None):
+    """キャッシュからスナップショットを取得（なければ作成して保存）"""
+    key = _cache_key(target_date, team_id, _generation(target_date))
+    snapshot = cache.get(key)
+    if snapshot is None:
+        snapshot = build_snapshot(target_date, team_id)
+        cache.set(key, snapshot, DASHBOARD_CACHE_TIMEOUT)
+    return snapshot
+
+
+def invalidate(target_date):
+    """日付のスナップショット（全体とすべてのチーム）を無効化
+
+    トランザクション中の場合はコミット後に無効化する（コミット前のデータで作り直されないように）。
+    """
+    key = _generation_key(target_date)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, GENERATION_CACHE_TIMEOUT))
+
+
+def _find_item(snapshot, user_id):
+    for index, item in enumerate(snapshot['user_attendance_list']):
+        if item['user_id'] == user_id:
+            return index, item
+    return None, None
+
+
+def _format_time(value):
+    return f'{value.hour:02d}:{value.minute:02d}' if value else None
+
+
+def _delta(snapshot, item):
+    return {
+        'date': snapshot['date'].isoformat(),
+        'team_id': snapshot['team_id'],
+        'user_id': item['user_id'],
+        'member_team_id': item['team_id'],
+        'status_code': item['status_code'],
+        'status': item['status'],
+        'clock_in_time': _format_time(item['clock_in_time']),
+        'clock_out_time': _format_time(item['clock_out_time']),
+        'break_start_time': _format_time(item['break_start_time']),
+        'break_end_time': _format_time(item['break_end_time']),
+        'total_work': f"{item['total_work_hours']}h {item['total_work_minutes']}m" if item['total_work_time'] else None,
+        'counters': {key: snapshot[key] for key in COUNTER_KEYS},
+    }
+
+
+def make_delta(target_date, user_id, team_id=None):
+    """1ユーザー分の状態の差分（ダッシュボード画面への配信用。team_id の場合はそのチームの集計）"""
+    snapshot = get_snapshot(target_date, team_id)
+    index, item = _find_item(snapshot, user_id)
+    if item is None:
+        return None
+    return _delta(snapshot, item)
+
+
+def changed_deltas(previous, snapshot):
+    """previous から snapshot までに状態の変わったユーザーの差分のリスト
+
+    他のプロセスでの打刻を共有キャッシュのスナップショットから検出するために使う。
+    一覧からユーザーが外れた場合は差分で表せないため None を返す（画面を再読み込みさせる）。
+    """
+    if previous['version'] == snapshot['version']:
+        return []
+    before = {item['user_id']: item for item in previous['user_attendance_list']}
+    if before.keys() - {item['user_id'] for item in snapshot['user_attendance_list']}:
+        return None
+    return [_delta(snapshot, item) for item in snapshot['user_attendance_list'] if before.get(item['user_id']) != item]
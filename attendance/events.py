@@ -0,0 +1,69 @@
+"""ダッシュボード更新イベントの配信
+
+打刻で勤怠記録が保存されると、変更のあったユーザーの状態（差分）を
+Server-Sent Events の購読者へ配信する。購読者ごとに asyncio.Queue を持ち、
+同期ビュー（スレッド）からの publish はイベントループ経由で安全に受け渡す。
+
+ここでの配信はプロセス内に限られる。ASGI サーバーを複数プロセスで動かす場合の
+他のプロセスでの打刻は、配信側（views._iter_dashboard_events）が共有キャッシュの
+スナップショットと定期的に照合して差分を送る。
+"""
+import asyncio
+import threading
+
+# 購読者ごとのキューの上限（溢れた場合は古い画面側で再読み込みさせる）
+SUBSCRIBER_QUEUE_SIZE = 100
+
+_subscribers = set()
+_lock = threading.Lock()
+
+
+class Subscription:
+    """1接続分の購読"""
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def _put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            self.overflowed = True
+
+    async def get(self, timeout):
+        """次のイベントを待つ（timeout 秒でなければ None）"""
+        try:
+            return await asyncio.wait_for(self.queue.get(), timeout)
+        except asyncio.TimeoutError:
+            return None
+
+    def close(self):
+        with _lock:
+            _subscribers.discard(self)
+
+
+def subscribe():
+    """購読を開始（イベントループ内で呼び出す）"""
+    subscription = Subscription()
+    with _lock:
+        _subscribers.add(subscription)
+    return subscription
+
+
+def has_subscribers():
+    """購読者がいるかどうか"""
+    return bool(_subscribers)
+
+
+def publish(event):
+    """全購読者にイベントを配信（どのスレッドからでも呼び出し可能）"""
+    with _lock:
+        subscribers = list(_subscribers)
+    for subscription in subscribers:
+        try:
+            subscription.loop.call_soon_threadsafe(subscription._put, event)
+        except RuntimeError:
+            # イベントループが終了済みの購読者は破棄
+            subscription.close()
@@ -0,0 +1,246 @@
+"""バックグラウンドでのレポートのエクスポート
+
+大きな期間の CSV / PDF はリクエストの中で作成せず、プロセスプールで作成してファイルに保存する。
+ジョブは正規化した検索条件（ReportFilter.querystring）と出力形式のハッシュをキーとし、
+状態（待機中・作成中・完了・失敗）と進捗は同じキーの JSON ファイルに記録する。
+
+完了したファイルは対象の勤怠記録の件数と最終更新日時（fingerprint）が変わらない限り、
+同じ検索条件のエクスポートで再利用する。ファイルの内容は report_export_csv / report_export_pdf と同じ。
+
+ATTENDANCE_EXPORT_WORKERS が 0 の場合はプロセスプールを使わずにその場で作成する（開発・テスト用）。
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import get_context
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+# ジョブの状態
+STATE_QUEUED = 'queued'
+STATE_RUNNING = 'running'
+STATE_DONE = 'done'
+STATE_FAILED = 'failed'
+
+# 出力形式ごとの拡張子と Content-Type
+OUTPUT_TYPES = {
+    'csv': ('csv', 'text/csv; charset=utf-8-sig'),
+    'pdf': ('pdf', 'application/pdf'),
+}
+
+# 進捗を記録する間隔（行）
+PROGRESS_INTERVAL = 1000
+
+# プロセスプール（最初のジョブの登録時に作成）
+_lock = threading.Lock()
+_executor = None
+
+
+def _settings():
+    return (
+        getattr(settings, 'ATTENDANCE_EXPORT_DIR', os.path.join(settings.BASE_DIR, 'exports')),
+        getattr(settings, 'ATTENDANCE_EXPORT_WORKERS', 2),
+        # 作成中のまま応答がないジョブを失敗とみなすまでの秒数
+        getattr(settings, 'ATTENDANCE_EXPORT_TIMEOUT', 60 * 60),
+        # 完了したファイルを保持する秒数
+        getattr(settings, 'ATTENDANCE_EXPORT_RETENTION', 60 * 60 * 24 * 7),
+    )
+
+
+def job_key(report_filter, output):
+    """正規化した検索条件と出力形式から求めるジョブのキー"""
+    return hashlib.sha256(f'{output}?{report_filter.querystring()}'.encode('utf-8')).hexdigest()[:32]
+
+
+def fingerprint(report_filter):
+    """対象の勤怠記録の (件数, 件数と最終更新日時を表す文字列)（記録が変わるとファイルを作り直す）"""
+    count, last_modified = report_filter.fingerprint()
+    return count, f'{count}:{last_modified.isoformat() if last_modified else "-"}'
+
+
+def _paths(key, output):
+    directory = _settings()[0]
+    extension = OUTPUT_TYPES[output][0]
+    return os.path.join(directory, f'{key}.json'), os.path.join(directory, f'{key}.{extension}')
+
+
+def _write_json(path, data):
+    # 書き込み途中の内容を読まないよう、一時ファイルから置き換える
+    temporary = f'{path}.{os.getpid()}.tmp'
+    with open(temporary, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(temporary, path)
+
+
+def status(key, output):
+    """ジョブの状態（存在しない場合は None）"""
+    status_path, _ = _paths(key, output)
+    try:
+        with open(status_path, encoding='utf-8') as f:
+            return json.load(f)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def file_path(key, output):
+    """完了したジョブのファイル（未完了の場合は None）"""
+    job = status(key, output)
+    _, path = _paths(key, output)
+    if job is None or job['state'] != STATE_DONE or not os.path.exists(path):
+        return None
+    return path
+
+
+def _is_reusable(job, current_fingerprint, output):
+    """登録済みのジョブをそのまま使えるか（完了済みで記録が変わっていない、または作成中）"""
+    if job is None or job['fingerprint'] != current_fingerprint:
+        return False
+    if job['state'] == STATE_DONE:
+        return os.path.exists(_paths(job['key'], output)[1])
+    if job['state'] in (STATE_QUEUED, STATE_RUNNING):
+        return time.time() - job['updated_at'] < _settings()[2]
+    return False
+
+
+def _executor_instance(reset=False):
+    global _executor
+    with _lock:
+        if reset and _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+        if _executor is None:
+            # fork した子プロセスは親のデータベース接続を共有してしまうため spawn で起動する
+            _executor = ProcessPoolExecutor(
+                max_workers=_settings()[1],
+                mp_context=get_context('spawn'),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def _init_worker():
+    import django
+
+    django.setup()
+
+
+def _render_in_worker(job):
+    # リクエストの外で実行するため、接続の確認と後始末はここで行う
+    close_old_connections()
+    try:
+        render(job)
+    finally:
+        close_old_connections()
+
+
+def submit(report_filter, output):
+    """エクスポートのジョブを登録して状態を返す
+
+    同じ検索条件のジョブが作成中、または完了済みで記録が変わっていない場合は登録せずにその状態を返す。
+    """
+    directory, workers, _, _ = _settings()
+    os.makedirs(directory, exist_ok=True)
+
+    key = job_key(report_filter, output)
+    total, current_fingerprint = fingerprint(report_filter)
+    job = status(key, output)
+    if _is_reusable(job, current_fingerprint, output):
+        return job
+
+    purge()
+    job = {
+        'key': key,
+        'output': output,
+        'query': report_filter.querystring(),
+        'fingerprint': current_fingerprint,
+        'state': STATE_QUEUED,
+        'rows': 0,
+        'total': total,
+        'error': '',
+        'created_at': timezone.now().isoformat(),
+        'updated_at': time.time(),
+    }
+    _write_json(_paths(key, output)[0], job)
+
+    if workers:
+        try:
+            _executor_instance().submit(_render_in_worker, job)
+        except BrokenProcessPool:
+            # ワーカーが異常終了したプロセスプールは作り直す
+            _executor_instance(reset=True).submit(_render_in_worker, job)
+    else:
+        render(job)
+        job = status(key, output)
+    return job
+
+
+def _iter_with_progress(rows, job, status_path):
+    """行を数えながら返し、PROGRESS_INTERVAL 行ごとに進捗を記録"""
+    for row in rows:
+        yield row
+        job['rows'] += 1
+        if job['rows'] % PROGRESS_INTERVAL == 0:
+            job['updated_at'] = time.time()
+            _write_json(status_path, job)
+
+
+def render(job):
+    """ジョブのファイルを作成（プロセスプールのワーカーで実行。失敗はジョブの状態に記録する）"""
+    from django.http import QueryDict
+    from . import pdf
+    from .filters import ReportFilter
+    from .views import _iter_csv_export, _iter_pdf_rows
+
+    key, output = job['key'], job['output']
+    status_path, path = _paths(key, output)
+    job = {**job, 'state': STATE_RUNNING, 'rows': 0, 'updated_at': time.time()}
+    _write_json(status_path, job)
+
+    temporary = f'{path}.{os.getpid()}.tmp'
+    try:
+        report_filter = ReportFilter(QueryDict(job['query']))
+        rows = _iter_with_progress(report_filter.rows(output), job, status_path)
+        with open(temporary, 'wb') as f:
+            if output == 'csv':
+                for chunk in _iter_csv_export(rows):
+                    f.write(chunk)
+            else:
+                pdf.build_report(f, _iter_pdf_rows(rows))
+        os.replace(temporary, path)
+    except Exception as e:
+        logger.exception('エクスポート %s の作成に失敗しました', key)
+        if os.path.exists(temporary):
+            os.remove(temporary)
+        _write_json(status_path, {**job, 'state': STATE_FAILED, 'error': str(e), 'updated_at': time.time()})
+        return
+
+    _write_json(status_path, {**job, 'state': STATE_DONE, 'updated_at': time.time()})
+
+
+def purge():
+    """保持期間を過ぎたジョブのファイルを削除"""
+    directory, _, _, retention = _settings()
+    expires = time.time() - retention
+    try:
+        entries = list(os.scandir(directory))
+    except FileNotFoundError:
+        return 0
+
+    removed = 0
+    for entry in entries:
+        if entry.is_file() and entry.stat().st_mtime < expires:
+            try:
+                os.remove(entry.path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+    return removed
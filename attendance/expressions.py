@@ -0,0 +1,116 @@
+"""データベース関数"""
+from django.db import models
+from django.db.models import Case, F, Func, Value, When
+from django.db.models.functions import Cast, Greatest
+from django.db.models.lookups import GreaterThanOrEqual, IsNull
+
+
+class DurationSeconds(Func):
+    """DurationField を秒数に変換
+
+    PostgreSQL は interval 型、それ以外（SQLite 等）はマイクロ秒の整数で保存される。
+    """
+    output_field = models.BigIntegerField()
+
+    def as_sql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='(%(expressions)s / 1000000)', **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template='EXTRACT(EPOCH FROM %(expressions)s)', **extra_context)
+
+
+def duration_hours(expression):
+    """時間部分（整数）"""
+    seconds = Cast(DurationSeconds(expression), models.BigIntegerField())
+    return seconds / 3600
+
+
+def duration_minutes(expression):
+    """分部分（0〜59）"""
+    seconds = Cast(DurationSeconds(expression), models.BigIntegerField())
+    return seconds / 60 - (seconds / 3600) * 60
+
+
+# 1日（マイクロ秒）
+DAY_MICROSECONDS = 24 * 60 * 60 * 1000000
+
+
+class TimeMicroseconds(Func):
+    """TimeField を 0 時からのマイクロ秒（整数）に変換
+
+    生成列の式に使えるよう、各データベースの組み込みの演算だけで計算する
+    （SQLite は 'HH:MM:SS[.ffffff]' 形式の文字列として保存される）。
+    """
+    output_field = models.BigIntegerField()
+    template = (
+        '((EXTRACT(HOUR FROM %(expressions)s) * 3600 + EXTRACT(MINUTE FROM %(expressions)s) * 60'
+        ' + EXTRACT(SECOND FROM %(expressions)s)) * 1000000 + EXTRACT(MICROSECOND FROM %(expressions)s))'
+    )
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        template = (
+            '((CAST(substr(%(expressions)s, 1, 2) AS INTEGER) * 3600'
+            ' + CAST(substr(%(expressions)s, 4, 2) AS INTEGER) * 60) * 1000000'
+            ' + CAST(ROUND(CAST(substr(%(expressions)s, 7) AS REAL) * 1000000) AS INTEGER))'
+        )
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        template = 'CAST(EXTRACT(EPOCH FROM %(expressions)s) * 1000000 AS BIGINT)'
+        return super().as_sql(compiler, connection, template=template, **extra_context)
+
+
+class MicrosecondsDuration(Func):
+    """マイクロ秒（整数）を DurationField の値に変換
+
+    PostgreSQL は interval 型、それ以外はマイクロ秒の整数のまま保存される。
+    """
+    output_field = models.DurationField()
+    template = '%(expressions)s'
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, template="(%(expressions)s * INTERVAL '1 microsecond')", **extra_context)
+
+
+def _elapsed(start, end):
+    """start から end までのマイクロ秒（end が start より前の場合は日をまたいだものとする）"""
+    start, end = TimeMicroseconds(start), TimeMicroseconds(end)
+    return Case(
+        When(GreaterThanOrEqual(end, start), then=end - start),
+        default=end - start + Value(DAY_MICROSECONDS),
+        output_field=models.BigIntegerField(),
+    )
+
+
+def _break_microseconds(break_start, break_end):
+    return Case(
+        When(IsNull(break_start, True), then=Value(0)),
+        When(IsNull(break_end, True), then=Value(0)),
+        default=_elapsed(break_start, break_end),
+        output_field=models.BigIntegerField(),
+    )
+
+
+def break_time_expression(break_start='break_start_time', break_end='break_end_time'):
+    """休憩時間を求める式（AttendanceRecord.total_break_time の生成式）
+
+    休憩開始・終了のどちらかがない場合は 0。終了が開始より前の場合は日をまたいだ休憩とする。
+    """
+    return MicrosecondsDuration(_break_microseconds(F(break_start), F(break_end)))
+
+
+def work_time_expression(clock_in='clock_in_time', clock_out='clock_out_time',
+                         break_start='break_start_time', break_end='break_end_time'):
+    """実働時間を求める式（AttendanceRecord.total_work_time の生成式）
+
+    出勤・退勤のどちらかがない場合は NULL。退勤が出勤より前の場合は日をまたいだ勤務とする。
+    生成列は他の生成列を参照できないため、休憩時間も同じ式で計算する。
+    """
+    clock_in, clock_out = F(clock_in), F(clock_out)
+    work = _elapsed(clock_in, clock_out) - _break_microseconds(F(break_start), F(break_end))
+    return Case(
+        When(IsNull(clock_in, True), then=Value(None)),
+        When(IsNull(clock_out, True), then=Value(None)),
+        default=MicrosecondsDuration(Greatest(work, Value(0))),
+        output_field=models.DurationField(),
+    )
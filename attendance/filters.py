@@ -0,0 +1,223 @@
+"""レポート用の検索条件
+
+reports / report_export_csv / report_export_pdf で共通の検索条件を扱う。
+DateRangeFilterForm で一度だけ検証し、既定の期間と最大期間を適用したうえで、
+出力形式ごとに必要な列だけを取得するクエリセットを組み立てる。
+期間がアーカイブ済みの日付を含む場合は、稼働テーブルとアーカイブの両方のクエリセットを
+新しい順に返し、エクスポートの行は同じ並び順（日付の降順、ユーザーID順）に併合する。
+チームを指定した場合は (チーム, ユーザー) のインデックスで引いたメンバーのユーザーIDで絞り込む。
+"""
+import heapq
+from datetime import timedelta
+
+from django.db.models import Count, Max
+
+from . import archive
+from .forms import DateRangeFilterForm
+from .models import ArchivedAttendanceRecord, AttendanceRecord, MonthlyAttendanceSummary, TeamMembership
+from .summary import month_start, next_month
+
+# 出力形式ごとに取得する列
+EXPORT_COLUMNS = {
+    'csv': (
+        'user__first_name',
+        'user__last_name',
+        'user__username',
+        'date',
+        'clock_in_time',
+        'clock_out_time',
+        'break_start_time',
+        'break_end_time',
+        'total_work_time',
+        'total_break_time',
+    ),
+    'pdf': (
+        'user__first_name',
+        'user__last_name',
+        'user__username',
+        'date',
+        'clock_in_time',
+        'clock_out_time',
+        'total_work_time',
+    ),
+}
+
+# 画面表示で読み込むフィールド（モデルインスタンスとして取得）
+HTML_FIELDS = (
+    'user_id',
+    'date',
+    'clock_in_time',
+    'clock_out_time',
+    'total_work_time',
+    'total_break_time',
+    'user__username',
+    'user__first_name',
+    'user__last_name',
+)
+
+# 並び順（Meta.ordering と (user, date) / (date) インデックスに一致）
+ORDERING = ('-date', 'user_id')
+
+# 一度に読み込む行数
+ITERATOR_CHUNK_SIZE = 500
+
+
+class ReportFilter:
+    """レポートの検索条件とクエリ生成"""
+
+    def __init__(self, data):
+        self.form = DateRangeFilterForm(data)
+        self._cleaned = None
+
+    @classmethod
+    def from_request(cls, request):
+        """GET パラメータから検索条件を作成"""
+        return cls(request.GET)
+
+    def is_valid(self):
+        """検索条件を検証（結果はキャッシュ）"""
+        if self._cleaned is None:
+            self._cleaned = self.form.cleaned_data if self.form.is_valid() else {}
+        return bool(self._cleaned)
+
+    @property
+    def errors(self):
+        """検証エラーを '項目: メッセージ' のリストで返す"""
+        self.is_valid()
+        result = []
+        for field, errors in self.form.errors.items():
+            label = self.form.fields[field].label if field in self.form.fields else ''
+            for error in errors:
+                result.append(f'{label}: {error}' if label else error)
+        return result
+
+    def display_form(self):
+        """画面表示用のフォーム（適用中の期間を初期値として表示）"""
+        if not self.is_valid():
+            return self.form
+        return DateRangeFilterForm(initial={
+            'start_date': self.start_date,
+            'end_date': self.end_date,
+            'user': self.user,
+            'team': self.team,
+        })
+
+    @property
+    def start_date(self):
+        self.is_valid()
+        return self._cleaned.get('start_date')
+
+    @property
+    def end_date(self):
+        self.is_valid()
+        return self._cleaned.get('end_date')
+
+    @property
+    def user(self):
+        self.is_valid()
+        return self._cleaned.get('user')
+
+    @property
+    def team(self):
+        """チームID（未指定の場合は None）"""
+        self.is_valid()
+        return self._cleaned.get('team')
+
+    def _team_user_ids(self):
+        """チームのメンバーのユーザーID（サブクエリ）"""
+        return TeamMembership.objects.filter(team_id=self.team).values('user_id')
+
+    def sources(self):
+        """期間に該当する勤怠記録のモデル（稼働テーブル、アーカイブ済みの日付を含む場合はアーカイブも）"""
+        if self.is_valid() and archive.includes(self.start_date):
+            return [AttendanceRecord, ArchivedAttendanceRecord]
+        return [AttendanceRecord]
+
+    def base_queryset(self, model=AttendanceRecord):
+        """期間・ユーザー・チームで絞り込んだクエリセット（並び順・列指定なし）"""
+        if not self.is_valid():
+            return model.objects.none()
+
+        records = model.objects.filter(date__range=(self.start_date, self.end_date))
+        if self.user is not None:
+            records = records.filter(user_id=self.user.pk)
+        if self.team is not None:
+            records = records.filter(user_id__in=self._team_user_ids())
+        return records
+
+    def base_querysets(self):
+        """sources() ごとの base_queryset のリスト"""
+        return [self.base_queryset(model) for model in self.sources()]
+
+    def fingerprint(self):
+        """対象の勤怠記録の (件数, 最終更新日時)（テーブルごとに1クエリ。記録の変更の検出に使う）"""
+        count, last_modified = 0, None
+        for records in self.base_querysets():
+            aggregated = records.order_by().aggregate(count=Count('id'), last_modified=Max('updated_at'))
+            count += aggregated['count']
+            if aggregated['last_modified'] and (last_modified is None or aggregated['last_modified'] > last_modified):
+                last_modified = aggregated['last_modified']
+        return count, last_modified
+
+    def covers_whole_months(self):
+        """期間が月初から月末までの月単位かどうか（月次集計を使用できる）"""
+        if not self.is_valid():
+            return False
+        return self.start_date.day == 1 and next_month(self.end_date) - timedelta(days=1) == self.end_date
+
+    def monthly_summaries(self):
+        """期間・ユーザー・チームで絞り込んだ月次集計（covers_whole_months の場合のみ使用）"""
+        summaries = MonthlyAttendanceSummary.objects.filter(
+            month__gte=self.start_date,
+            month__lte=month_start(self.end_date),
+        )
+        if self.user is not None:
+            summaries = summaries.filter(user_id=self.user.pk)
+        if self.team is not None:
+            summaries = summaries.filter(user_id__in=self._team_user_ids())
+        return summaries
+
+    def queryset(self, output='html', model=AttendanceRecord):
+        """出力形式に応じて必要な列だけを取得するクエリセット"""
+        records = self.base_queryset(model).order_by(*ORDERING)
+        if output == 'html':
+            return records.select_related('user').only(*HTML_FIELDS)
+        return records.values_list(*EXPORT_COLUMNS[output])
+
+    def querysets(self, output='html'):
+        """sources() ごとの queryset のリスト"""
+        return [self.queryset(output, model) for model in self.sources()]
+
+    def rows(self, output):
+        """エクスポート用の行をサーバーサイドカーソルで逐次取得（複数のテーブルは (-date, user) 順に併合）"""
+        querysets = self.querysets(output)
+        if len(querysets) == 1:
+            return querysets[0].iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+
+        # 同じ日付の行もユーザーID順に並べるため、ユーザーIDを末尾に加えて取得し、併合後に取り除く
+        date_index = EXPORT_COLUMNS[output].index('date')
+        iterators = [
+            records.values_list(*EXPORT_COLUMNS[output], 'user_id').iterator(chunk_size=ITERATOR_CHUNK_SIZE)
+            for records in querysets
+        ]
+        merged = heapq.merge(*iterators, key=lambda row: (row[date_index], -row[-1]), reverse=True)
+        return (row[:-1] for row in merged)
+
+    def explain(self, output='html'):
+        """生成されるクエリの実行計画を返す（チューニング用）"""
+        return self.queryset(output).explain()
+
+    def querystring(self):
+        """検証後の検索条件をクエリ文字列にして返す"""
+        from django.http import QueryDict
+
+        params = QueryDict(mutable=True)
+        if self.is_valid():
+            params['start_date'] = self.start_date.isoformat()
+            params['end_date'] = self.end_date.isoformat()
+            if self.user is not None:
+                params['user'] = str(self.user.pk)
+            if self.team is not None:
+                params['team'] = str(self.team)
+        return params.urlencode()
+
@@ -1,37 +1,103 @@
+from datetime import timedelta
+
 from django import forms
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import AttendanceRecord
+from django.utils import timezone
+from . import kiosk, users
+from .models import AttendanceRecord, KioskCredential
+
+
+class UserTypeaheadWidget(forms.Widget):
+    """ユーザーの前方一致検索入力（選択肢を埋め込まず、入力に応じて検索 API から取得）"""
+    template_name = 'attendance/widgets/user_typeahead.html'
+
+    def __init__(self, attrs=None, placeholder='名前またはユーザー名で検索'):
+        super().__init__(attrs)
+        self.placeholder = placeholder
+
+    def get_context(self, name, value, attrs):
+        context = super().get_context(name, value, attrs)
+        entry = None
+        if value not in (None, ''):
+            try:
+                entry = users.get(int(value))
+            except (TypeError, ValueError):
+                pass
+        context['widget'].update({
+            'label': f"{entry['full_name']} ({entry['username']})" if entry else '',
+            'placeholder': self.placeholder,
+        })
+        return context
+
+
+class ActiveUserField(forms.Field):
+    """アクティブユーザーの選択（キャッシュしたユーザー一覧で検証）
+
+    fetch=True の場合はデータベースから User を取得して返す（パスワード検証等に使用）。
+    fetch=False の場合は一覧の内容から作成した表示用の User を返す。
+    """
+    widget = UserTypeaheadWidget
+    default_error_messages = {
+        'invalid_choice': '正しく選択してください。選択したものは候補にありません。',
+    }
+
+    def __init__(self, *, fetch=True, **kwargs):
+        super().__init__(**kwargs)
+        self.fetch = fetch
+
+    def prepare_value(self, value):
+        if isinstance(value, User):
+            return value.pk
+        return value
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        if isinstance(value, User):
+            return value
+        try:
+            entry = users.get(int(value))
+        except (TypeError, ValueError):
+            entry = None
+        if entry is None:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+
+        if not self.fetch:
+            return User(
+                id=entry['id'],
+                username=entry['username'],
+                first_name=entry['first_name'],
+                last_name=entry['last_name'],
+            )
+        try:
+            return User.objects.get(pk=entry['id'], is_active=True)
+        except User.DoesNotExist:
+            raise forms.ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
 
 
 class ClockingForm(forms.Form):
     """打刻用フォーム"""
 
     # ユーザー選択
-    user = forms.ModelChoiceField(
-        queryset=User.objects.filter(is_active=True).order_by('last_name', 'first_name'),
-        widget=forms.Select(attrs={
-            'class': 'form-select form-select-lg',
+    user = ActiveUserField(
+        widget=UserTypeaheadWidget(attrs={
+            'class': 'form-control form-control-lg',
             'id': 'user_select',
-        }),
+        }, placeholder='ユーザーを検索してください'),
         label='ユーザー',
-        empty_label='ユーザーを選択してください'
     )
 
-    # パスワード入力
+    # PIN（未設定の場合はパスワード）入力
     password = forms.CharField(
         widget=forms.PasswordInput(attrs={
             'class': 'form-control form-control-lg',
-            'placeholder': 'パスワードを入力',
+            'placeholder': 'PIN またはパスワードを入力',
             'autocomplete': 'off',
         }),
-        label='パスワード',
+        label='PIN / パスワード',
     )
 
-    def __init__(self, *args, **kwargs):
-        super().__init__(*args, **kwargs)
-        # アクティブなユーザーのみ表示
-        self.fields['user'].queryset = User.objects.filter(is_active=True).order_by('last_name', 'first_name')
-
     def clean(self):
         """フォームの検証"""
         cleaned_data = super().clean()
@@ -39,9 +105,16 @@ class ClockingForm(forms.Form):
         password = cleaned_data.get('password')
 
         if user and password:
-            # ユーザーが存在するか、パスワードが正しいか確認
-            if not user.check_password(password):
-                raise forms.ValidationError('パスワードが正しくありません。', code='invalid_password')
+            # 打刻用 PIN（未設定の場合はパスワード）が正しいか確認
+            try:
+                valid = kiosk.authenticate(user, password)
+            except kiosk.TooManyAttempts:
+                raise forms.ValidationError(
+                    '認証に続けて失敗したため、しばらく打刻できません。時間をおいて再度お試しください。',
+                    code='too_many_attempts',
+                )
+            if not valid:
+                raise forms.ValidationError('PIN またはパスワードが正しくありません。', code='invalid_password')
 
         return cleaned_data
 
@@ -65,6 +138,17 @@ class ActionSelectionForm(forms.Form):
     )
 
 
+class PunchForm(ClockingForm):
+    """打刻 API 用フォーム（認証とアクションを1回で受け付ける）"""
+
+    action = forms.ChoiceField(choices=ActionSelectionForm.ACTION_CHOICES, label='アクション')
+
+
+def team_choices():
+    """チームの選択肢（先頭は全チーム）"""
+    return [('', '全チーム')] + [(team['id'], team['name']) for team in users.teams()]
+
+
 class DateRangeFilterForm(forms.Form):
     """日付範囲フィルタフォーム"""
 
@@ -86,11 +170,89 @@ class DateRangeFilterForm(forms.Form):
         label='終了日'
     )
 
-    user = forms.ModelChoiceField(
-        queryset=User.objects.filter(is_active=True).order_by('last_name', 'first_name'),
+    user = ActiveUserField(
+        fetch=False,
+        widget=UserTypeaheadWidget(attrs={
+            'class': 'form-control',
+        }, placeholder='全ユーザー'),
+        required=False,
+        label='ユーザー'
+    )
+
+    team = forms.TypedChoiceField(
+        choices=team_choices,
+        coerce=int,
+        empty_value=None,
         widget=forms.Select(attrs={
             'class': 'form-select',
         }),
         required=False,
-        label='ユーザー'
+        label='チーム'
     )
+
+    def clean(self):
+        """期間の検証と既定値の適用
+
+        期間が未指定の場合は直近の既定日数、片方のみ指定の場合は最大日数の範囲で補完する。
+        """
+        cleaned_data = super().clean()
+        if self.errors:
+            return cleaned_data
+
+        default_days = getattr(settings, 'ATTENDANCE_REPORT_DEFAULT_DAYS', 31)
+        max_days = getattr(settings, 'ATTENDANCE_REPORT_MAX_DAYS', 366)
+        today = timezone.localdate()
+        start_date = cleaned_data.get('start_date')
+        end_date = cleaned_data.get('end_date')
+
+        if start_date is None and end_date is None:
+            end_date = today
+            start_date = end_date - timedelta(days=default_days - 1)
+        elif start_date is None:
+            start_date = end_date - timedelta(days=default_days - 1)
+        elif end_date is None:
+            end_date = min(today, start_date + timedelta(days=max_days - 1))
+            end_date = max(end_date, start_date)
+
+        if start_date > end_date:
+            raise forms.ValidationError('開始日は終了日以前の日付を指定してください。', code='invalid_range')
+        if (end_date - start_date).days + 1 > max_days:
+            raise forms.ValidationError(
+                f'検索期間は最大{max_days}日までです。',
+                code='range_too_long',
+            )
+
+        cleaned_data['start_date'] = start_date
+        cleaned_data['end_date'] = end_date
+        return cleaned_data
+
+
+class KioskCredentialForm(forms.ModelForm):
+    """打刻用 PIN の設定フォーム（管理画面用）"""
+
+    pin = forms.CharField(
+        widget=forms.PasswordInput(render_value=False),
+        min_length=4,
+        max_length=32,
+        required=False,
+        label='PIN',
+        help_text='4文字以上の数字または社員証コード。変更しない場合は空欄のままにしてください。',
+    )
+
+    class Meta:
+        model = KioskCredential
+        fields = ('user',)
+
+    def clean(self):
+        cleaned_data = super().clean()
+        if not self.instance.pin_hash and not cleaned_data.get('pin'):
+            self.add_error('pin', 'PIN を入力してください。')
+        return cleaned_data
+
+    def save(self, commit=True):
+        credential = super().save(commit=False)
+        if self.cleaned_data.get('pin'):
+            credential.set_pin(self.cleaned_data['pin'])
+        if commit:
+            credential.save()
+        return credential
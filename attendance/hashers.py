@@ -0,0 +1,13 @@
+"""打刻用 PIN のハッシュ"""
+from django.contrib.auth.hashers import PBKDF2PasswordHasher
+
+
+class KioskPINHasher(PBKDF2PasswordHasher):
+    """打刻用 PIN のハッシュ（PBKDF2、反復回数を打刻向けに抑えたもの）
+
+    打刻は出勤・退勤の時間帯に集中するため、管理画面用の既定のハッシュ
+    （数十万〜百万回の反復）では CPU 負荷が打刻の待ち時間を左右する。
+    PIN は総当たり対策として試行回数の制限（kiosk.authenticate）と組み合わせて使う。
+    """
+    algorithm = 'kiosk_pbkdf2_sha256'
+    iterations = 20000
@@ -0,0 +1,196 @@
+"""過去の勤怠記録の一括取り込み
+
+CSV を逐次読み込み、ユーザー名はメモリ上の対応表で ID に変換して
+bulk_create(update_conflicts=True) で upsert する（実働・休憩時間はデータベースの生成列）。
+バッチごとにトランザクションを確定し（取り込んだ (ユーザー, 月) の月次集計も同じトランザクションで更新する）、
+確定済みの行数をチェックポイントファイルに記録するため、中断しても続きから再開できる
+（同じ行を再度取り込んでも結果は変わらない）。
+
+CSV はエクスポート（report_export_csv）と同じ見出しか、英語の列名を受け付ける。
+時刻は他の打刻と同じく UTC の時刻として保存する。
+"""
+import csv
+import json
+import os
+from dataclasses import dataclass, field
+from datetime import date, time
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.utils import timezone
+
+from . import archive, dashboard, summary
+from .models import AttendanceRecord
+
+# 見出しと列の対応（エクスポートの見出し・英語の列名）
+COLUMN_ALIASES = {
+    'username': ('ユーザー名', 'username'),
+    'date': ('日付', 'date'),
+    'clock_in_time': ('出勤', 'clock_in', 'clock_in_time'),
+    'clock_out_time': ('退勤', 'clock_out', 'clock_out_time'),
+    'break_start_time': ('休憩開始', 'break_start', 'break_start_time'),
+    'break_end_time': ('休憩終了', 'break_end', 'break_end_time'),
+}
+
+TIME_COLUMNS = ('clock_in_time', 'clock_out_time', 'break_start_time', 'break_end_time')
+
+# upsert で更新する列
+UPDATE_FIELDS = [*TIME_COLUMNS, 'updated_at']
+
+# 1トランザクションで取り込む行数
+BATCH_SIZE = 5000
+
+# 空欄として扱う値（エクスポートでは未打刻を '-' で出力）
+EMPTY_VALUES = ('', '-')
+
+
+class InvalidCSV(Exception):
+    """CSV の形式が正しくない"""
+
+
+@dataclass
+class ImportResult:
+    """取り込み結果"""
+    rows: int = 0
+    imported: int = 0
+    skipped: int = 0
+    resumed_from: int = 0
+    errors: list = field(default_factory=list)
+
+
+def _columns(header):
+    """見出しから列番号を求める"""
+    positions = {}
+    normalized = [name.strip() for name in header]
+    for column, aliases in COLUMN_ALIASES.items():
+        for alias in aliases:
+            if alias in normalized:
+                positions[column] = normalized.index(alias)
+                break
+    missing = {'username', 'date'} - positions.keys()
+    if missing:
+        raise InvalidCSV(f'必須の列がありません: {", ".join(sorted(missing))}')
+    return positions
+
+
+def _parse_time(value):
+    value = value.strip()
+    if value in EMPTY_VALUES:
+        return None
+    return time.fromisoformat(value)
+
+
+class Checkpoint:
+    """確定済みの行数を記録するファイル"""
+
+    def __init__(self, path, source):
+        self.path = path
+        self.source = os.path.abspath(source)
+
+    def load(self):
+        """再開位置（同じ CSV のチェックポイントがなければ 0）"""
+        try:
+            with open(self.path, encoding='utf-8') as f:
+                data = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return 0
+        return data['rows'] if data.get('source') == self.source else 0
+
+    def save(self, rows):
+        # 書き込み途中で中断しても壊れないよう、一時ファイルから置き換える
+        temporary = f'{self.path}.tmp'
+        with open(temporary, 'w', encoding='utf-8') as f:
+            json.dump({'source': self.source, 'rows': rows, 'updated_at': timezone.now().isoformat()}, f)
+        os.replace(temporary, self.path)
+
+    def clear(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
+
+
+def _write_batch(batch):
+    """1バッチ分を upsert し、該当する月の月次集計を更新"""
+    # 同じ (ユーザー, 日付) が複数ある場合は後の行を採用
+    records = list({(record.user_id, record.date): record for record in batch}.values())
+
+    with transaction.atomic():
+        # アーカイブ済みの日の記録は稼働テーブルの行で置き換える（次回のアーカイブで再び移される）
+        archive.discard((record.user_id, record.date) for record in records)
+        AttendanceRecord.objects.bulk_create(
+            records,
+            update_conflicts=True,
+            unique_fields=['user', 'date'],
+            update_fields=UPDATE_FIELDS,
+        )
+        # 一括更新ではシグナルが送られないため、取り込んだ (ユーザー, 月) の集計のみ作り直す
+        summary.refresh((record.user_id, record.date) for record in records)
+    return len(records)
+
+
+def import_csv(path, checkpoint_path=None, batch_size=BATCH_SIZE, progress=None, max_errors=100):
+    """CSV を取り込む
+
+    checkpoint_path を指定した場合は確定済みの行を読み飛ばして再開し、完了時にファイルを削除する。
+    progress には確定ごとに ImportResult を受け取る関数を指定できる。
+    """
+    user_ids = dict(User.objects.values_list('username', 'id'))
+    checkpoint = Checkpoint(checkpoint_path, path) if checkpoint_path else None
+    result = ImportResult(resumed_from=checkpoint.load() if checkpoint else 0)
+    dates = set()
+
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        try:
+            columns = _columns(next(reader))
+        except StopIteration:
+            raise InvalidCSV('CSV が空です。')
+
+        batch = []
+        for line_number, row in enumerate(reader, start=2):
+            result.rows += 1
+            if result.rows <= result.resumed_from:
+                continue
+
+            try:
+                username = row[columns['username']].strip()
+                user_id = user_ids.get(username)
+                if user_id is None:
+                    raise ValueError(f'ユーザー {username!r} が存在しません')
+                record = AttendanceRecord(
+                    user_id=user_id,
+                    date=date.fromisoformat(row[columns['date']].strip()),
+                    **{
+                        name: _parse_time(row[columns[name]]) if name in columns else None
+                        for name in TIME_COLUMNS
+                    },
+                )
+            except (IndexError, ValueError) as e:
+                result.skipped += 1
+                if len(result.errors) < max_errors:
+                    result.errors.append(f'{line_number} 行目: {e}')
+                continue
+
+            batch.append(record)
+            dates.add(record.date)
+            if len(batch) >= batch_size:
+                result.imported += _write_batch(batch)
+                batch = []
+                if checkpoint:
+                    checkpoint.save(result.rows)
+                if progress:
+                    progress(result)
+
+        if batch:
+            result.imported += _write_batch(batch)
+            if progress:
+                progress(result)
+
+    # 一括更新ではシグナルが送られないため、ダッシュボードは作り直す
+    for record_date in dates:
+        dashboard.invalidate(record_date)
+
+    if checkpoint:
+        checkpoint.clear()
+    return result
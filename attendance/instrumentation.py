@@ -0,0 +1,239 @@
+"""リクエストの計測
+
+RequestTimingMiddleware がリクエストごとにクエリ数・データベース時間・ビュー時間・
+テンプレート描画時間を記録し、Server-Timing ヘッダーとして返す。
+しきい値を超えたリクエストは 'attendance.slow_requests' ロガーへ JSON で出力し、
+ビューごとの処理時間はプロセス内に保持して metrics エンドポイントで百分位数を返す。
+
+クエリは接続ごとに登録した install_query_timer の wrapper で計測する。接続はスレッドごとのため、
+計測中のリクエストはコンテキスト変数で受け渡す（ASGI で sync_to_async により別スレッドで実行される
+ビューのクエリも、実行したリクエストに記録される）。
+テンプレート描画時間は TimedDjangoTemplates（TEMPLATES の BACKEND）で計測する。
+その他の処理（パスワードのハッシュ計算等）は timer() で任意の名前を付けて計測できる。
+ストリーミングレスポンスの本文生成中のクエリは計測の対象外。
+"""
+import json
+import logging
+import threading
+import time
+from collections import defaultdict, deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.template.backends.django import DjangoTemplates, Template
+
+logger = logging.getLogger('attendance.slow_requests')
+
+# 計測中のリクエスト
+_current = ContextVar('attendance_request_timings', default=None)
+
+
+def _settings():
+    return (
+        getattr(settings, 'ATTENDANCE_SLOW_REQUEST_MS', 500),
+        getattr(settings, 'ATTENDANCE_METRICS_WINDOW', 1000),
+    )
+
+
+class RequestTimings:
+    """1リクエスト分の計測値（ミリ秒）"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.view_started = None
+        self.queries = 0
+        self.durations = defaultdict(float)
+
+    def add(self, name, seconds):
+        self.durations[name] += seconds * 1000
+
+    def record_query(self, execute, sql, params, many, context):
+        """クエリ1回分の計測"""
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.add('db', time.perf_counter() - started)
+
+    def finish(self):
+        now = time.perf_counter()
+        if self.view_started is not None:
+            self.durations['view'] = (now - self.view_started) * 1000
+        self.durations['total'] = (now - self.started) * 1000
+
+    def server_timing(self):
+        """Server-Timing ヘッダーの値"""
+        entries = []
+        for name, duration in self.durations.items():
+            entry = f'{name};dur={duration:.1f}'
+            if name == 'db':
+                entry += f';desc="{self.queries} queries"'
+            entries.append(entry)
+        if 'db' not in self.durations:
+            entries.insert(0, 'db;dur=0.0;desc="0 queries"')
+        return ', '.join(entries)
+
+
+def _record_query(execute, sql, params, many, context):
+    """計測中のリクエストがあればクエリ数とデータベース時間を加算"""
+    timings = _current.get()
+    if timings is None:
+        return execute(sql, params, many, context)
+    return timings.record_query(execute, sql, params, many, context)
+
+
+def install_query_timer(connection):
+    """接続にクエリの計測を登録（connection_created の受信側から呼ぶ。再接続時も重複しない）"""
+    if _record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_record_query)
+
+
+@contextmanager
+def timer(name):
+    """計測中のリクエストに name の処理時間を加算（リクエスト外では何もしない）"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(name, time.perf_counter() - started)
+
+
+class Metrics:
+    """ビューごとの直近の処理時間（プロセス内）"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._samples = {}
+        self._counts = defaultdict(int)
+
+    def add(self, view_name, timings):
+        window = _settings()[1]
+        sample = (timings.durations['total'], timings.durations.get('db', 0.0), timings.queries)
+        with self._lock:
+            if view_name not in self._samples:
+                self._samples[view_name] = deque(maxlen=window)
+            self._samples[view_name].append(sample)
+            self._counts[view_name] += 1
+
+    def snapshot(self):
+        """ビューごとの件数と百分位数（ミリ秒）"""
+        with self._lock:
+            samples = {name: list(values) for name, values in self._samples.items()}
+            counts = dict(self._counts)
+
+        result = {}
+        for name, values in sorted(samples.items()):
+            totals = sorted(value[0] for value in values)
+            db_times = sorted(value[1] for value in values)
+            queries = sorted(value[2] for value in values)
+            result[name] = {
+                'count': counts[name],
+                'window': len(values),
+                'total_ms': {f'p{p}': round(_percentile(totals, p), 1) for p in (50, 90, 99)},
+                'db_ms': {f'p{p}': round(_percentile(db_times, p), 1) for p in (50, 90, 99)},
+                'queries': {f'p{p}': _percentile(queries, p) for p in (50, 90, 99)},
+                'max_ms': round(totals[-1], 1),
+            }
+        return result
+
+    def clear(self):
+        with self._lock:
+            self._samples.clear()
+            self._counts.clear()
+
+
+def _percentile(values, percent):
+    """ソート済みの値の百分位数（最近傍順位法）"""
+    index = max(0, -(-len(values) * percent // 100) - 1)
+    return values[index]
+
+
+metrics = Metrics()
+
+
+def _view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else '-'
+
+
+class RequestTimingMiddleware:
+    """リクエストの計測（MIDDLEWARE の先頭に追加する）"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.async_mode = iscoroutinefunction(get_response)
+        if self.async_mode:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.async_mode:
+            return self.__acall__(request)
+
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    async def __acall__(self, request):
+        timings = RequestTimings()
+        token = _current.set(timings)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        return self._finish(request, response, timings)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        timings = _current.get()
+        if timings is not None:
+            timings.view_started = time.perf_counter()
+
+    def _finish(self, request, response, timings):
+        timings.finish()
+        response['Server-Timing'] = timings.server_timing()
+
+        view_name = _view_name(request)
+        metrics.add(view_name, timings)
+
+        slow_request_ms = _settings()[0]
+        if timings.durations['total'] >= slow_request_ms:
+            logger.warning(json.dumps({
+                'view': view_name,
+                'method': request.method,
+                'path': request.path,
+                'status': response.status_code,
+                'queries': timings.queries,
+                **{f'{name}_ms': round(duration, 1) for name, duration in timings.durations.items()},
+            }, ensure_ascii=False))
+        return response
+
+
+class TimedTemplate(Template):
+    """描画時間を計測するテンプレート"""
+
+    def render(self, context=None, request=None):
+        with timer('template'):
+            return super().render(context, request)
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+    """テンプレートの描画時間を計測する DjangoTemplates バックエンド"""
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
@@ -0,0 +1,67 @@
+"""打刻端末での本人確認
+
+打刻用 PIN（KioskCredential）があればそれを、なければログインパスワードを検証する。
+ユーザーごとに失敗回数を制限し、検証に成功した認証情報は短時間キャッシュして
+同じ PIN による連続した打刻ではハッシュ計算を省略する。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.crypto import salted_hmac
+
+from .instrumentation import timer
+from .models import KioskCredential
+
+
+class TooManyAttempts(Exception):
+    """失敗回数が上限に達した"""
+
+
+def _settings():
+    return (
+        getattr(settings, 'ATTENDANCE_KIOSK_MAX_ATTEMPTS', 5),
+        getattr(settings, 'ATTENDANCE_KIOSK_LOCKOUT_SECONDS', 300),
+        getattr(settings, 'ATTENDANCE_KIOSK_VERIFIED_SECONDS', 60),
+    )
+
+
+def _attempts_key(user):
+    return f'attendance:kiosk:attempts:{user.pk}'
+
+
+def _verified_key(user, secret, encoded):
+    # 平文の PIN はキャッシュのキーに含めない
+    digest = salted_hmac('attendance.kiosk.verified', f'{user.pk}:{encoded}:{secret}').hexdigest()
+    return f'attendance:kiosk:verified:{user.pk}:{digest}'
+
+
+def authenticate(user, secret):
+    """PIN（未設定の場合はパスワード）を検証
+
+    失敗回数が上限に達している場合は TooManyAttempts を送出する。
+    """
+    max_attempts, lockout_seconds, verified_seconds = _settings()
+    attempts_key = _attempts_key(user)
+    if cache.get(attempts_key, 0) >= max_attempts:
+        raise TooManyAttempts
+
+    credential = KioskCredential.objects.filter(user=user).only('pin_hash').first()
+    encoded = credential.pin_hash if credential else user.password
+
+    verified_key = _verified_key(user, secret, encoded)
+    if cache.get(verified_key):
+        return True
+
+    with timer('auth'):
+        valid = credential.check_pin(secret) if credential else user.check_password(secret)
+    if valid:
+        cache.set(verified_key, True, verified_seconds)
+        cache.delete(attempts_key)
+        return True
+
+    # 失敗回数を加算（最初の失敗から lockout_seconds の間保持）
+    if not cache.add(attempts_key, 1, lockout_seconds):
+        try:
+            cache.incr(attempts_key)
+        except ValueError:
+            cache.set(attempts_key, 1, lockout_seconds)
+    return False
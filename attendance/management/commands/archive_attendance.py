@@ -0,0 +1,43 @@
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance import archive
+from attendance.models import AttendanceRecord
+
+
+class Command(BaseCommand):
+    help = '古い勤怠記録をアーカイブへ移します（中断した場合は同じコマンドで続きから移します）'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--before',
+            help='この日付より前の記録を移す（YYYY-MM-DD。既定: ATTENDANCE_ARCHIVE_AFTER_DAYS 日前の月の月初）',
+        )
+        parser.add_argument('--batch-size', type=int, default=archive.BATCH_SIZE, help='1トランザクションで移す行数')
+        parser.add_argument('--dry-run', action='store_true', help='移す行数だけを表示する')
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                cutoff = date.fromisoformat(options['before'])
+            except ValueError:
+                raise CommandError(f'日付の形式が正しくありません: {options["before"]}')
+        else:
+            cutoff = archive.default_cutoff()
+        if cutoff > archive.current_month_start():
+            raise CommandError(f'当月（{archive.current_month_start()} 以降）の記録はアーカイブできません。')
+
+        if options['dry_run']:
+            count = AttendanceRecord.objects.filter(date__lt=cutoff).count()
+            self.stdout.write(f'{cutoff} より前の勤怠記録 {count} 件が対象です。')
+            return
+
+        started = time.perf_counter()
+
+        def progress(moved):
+            self.stdout.write(f'{moved} 件を移しました（{time.perf_counter() - started:.1f} 秒）')
+
+        moved = archive.archive(cutoff, batch_size=options['batch_size'], progress=progress)
+        self.stdout.write(self.style.SUCCESS(f'{cutoff} より前の勤怠記録 {moved} 件をアーカイブへ移しました。'))
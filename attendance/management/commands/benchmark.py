@@ -0,0 +1,53 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import Client
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from attendance import benchmark
+
+
+class Command(BaseCommand):
+    help = 'テスト用データベースにデータを投入し、主要な画面のレイテンシ・クエリ数・ピークメモリを計測します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, nargs='+', default=[100], help='ユーザー数（複数指定で規模ごとに計測）')
+        parser.add_argument('--days', type=int, default=365, help='勤怠記録の日数')
+        parser.add_argument('--repeat', type=int, default=3, help='キャッシュが効いた状態での計測回数')
+        parser.add_argument('--range-days', type=int, default=31, help='レポート・エクスポートの期間（日数）')
+        parser.add_argument('--views', nargs='+', choices=list(benchmark.QUERY_BUDGETS), help='計測する画面')
+        parser.add_argument('--output', default='benchmark-results.json', help='結果の出力先（JSON）')
+
+    def handle(self, *args, **options):
+        # 実データに影響しないようテスト用データベースで計測する
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            datasets = []
+            for users in options['users']:
+                call_command('flush', interactive=False, verbosity=0)
+                self.stdout.write(f'{users} 人 × {options["days"]} 日のデータを投入しています...')
+                dataset = benchmark.seed(users, options['days'])
+                self.stdout.write(f'  {dataset.records} 件（{dataset.seed_seconds} 秒）')
+
+                results = benchmark.run(
+                    Client(),
+                    dataset,
+                    views=options['views'],
+                    repeat=options['repeat'],
+                    range_days=options['range_days'],
+                )
+                for result in results:
+                    over = result['query_budget'] is not None and result['queries'] > result['query_budget']
+                    line = (
+                        f"  {result['view']:<18} {result['cold_ms']:>9.1f} ms  "
+                        f"{result['queries']:>3} クエリ  {result['peak_memory_kb']:>9.1f} KiB"
+                    )
+                    self.stdout.write(self.style.ERROR(line) if over else line)
+                datasets.append((dataset, results))
+
+            benchmark.write_results(options['output'], datasets)
+            self.stdout.write(self.style.SUCCESS(f'計測結果を {options["output"]} に保存しました。'))
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+# PRAGMA が数値で返す設定値の対応
+PRAGMA_VALUES = {
+    'synchronous': {'off': 0, 'normal': 1, 'full': 2, 'extra': 3},
+    'temp_store': {'default': 0, 'file': 1, 'memory': 2},
+}
+
+
+def _normalize(name, value):
+    if isinstance(value, str):
+        value = value.lower()
+        value = PRAGMA_VALUES.get(name, {}).get(value, value)
+    return str(value)
+
+
+class Command(BaseCommand):
+    help = 'SQLite の PRAGMA と接続設定が SQLITE_PRAGMAS のとおり適用されているか確認します'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--database', default='default', help='確認するデータベース')
+
+    def handle(self, *args, **options):
+        connection = connections[options['database']]
+        if connection.vendor != 'sqlite':
+            raise CommandError(f'{options["database"]} は SQLite ではありません。')
+
+        expected = getattr(settings, 'SQLITE_PRAGMAS', {})
+        mismatches = []
+        with connection.cursor() as cursor:
+            for name, value in expected.items():
+                cursor.execute(f'PRAGMA {name}')
+                actual = cursor.fetchone()[0]
+                ok = _normalize(name, actual) == _normalize(name, value)
+                if not ok:
+                    mismatches.append(name)
+                self.stdout.write(f'{"OK" if ok else "NG"}  {name} = {actual}（期待値: {value}）')
+
+        self.stdout.write(f'transaction_mode = {connection.transaction_mode or "DEFERRED"}')
+        self.stdout.write(f'CONN_MAX_AGE = {connection.settings_dict["CONN_MAX_AGE"]}')
+
+        if mismatches:
+            raise CommandError(f'適用されていない PRAGMA があります: {", ".join(mismatches)}')
+        self.stdout.write(self.style.SUCCESS('すべての PRAGMA が適用されています。'))
@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from attendance import importer
+
+
+class Command(BaseCommand):
+    help = '勤怠記録の CSV を一括で取り込みます（中断した場合は同じコマンドで続きから再開します）'
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='取り込む CSV ファイル')
+        parser.add_argument('--batch-size', type=int, default=importer.BATCH_SIZE, help='1トランザクションで取り込む行数')
+        parser.add_argument('--checkpoint', help='再開位置を記録するファイル（既定: <CSV>.checkpoint）')
+        parser.add_argument('--restart', action='store_true', help='チェックポイントを無視して最初から取り込む')
+
+    def handle(self, *args, **options):
+        checkpoint_path = options['checkpoint'] or f'{options["path"]}.checkpoint'
+        if options['restart']:
+            importer.Checkpoint(checkpoint_path, options['path']).clear()
+
+        started = time.perf_counter()
+
+        def progress(result):
+            elapsed = time.perf_counter() - started
+            rate = (result.rows - result.resumed_from) / elapsed if elapsed else 0
+            self.stdout.write(
+                f'{result.rows} 行（取り込み {result.imported} 件、スキップ {result.skipped} 件）{rate:,.0f} 行/秒'
+            )
+
+        try:
+            result = importer.import_csv(
+                options['path'],
+                checkpoint_path=checkpoint_path,
+                batch_size=options['batch_size'],
+                progress=progress,
+            )
+        except FileNotFoundError:
+            raise CommandError(f'{options["path"]} が見つかりません。')
+        except importer.InvalidCSV as e:
+            raise CommandError(str(e))
+
+        if result.resumed_from:
+            self.stdout.write(f'{result.resumed_from} 行目の続きから再開しました。')
+        for error in result.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'{result.imported} 件を取り込みました（スキップ {result.skipped} 件、{time.perf_counter() - started:.1f} 秒）。'
+        ))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from attendance import summary
+
+
+class Command(BaseCommand):
+    help = '月次勤怠集計を勤怠記録から全件作り直します'
+
+    def handle(self, *args, **options):
+        count = summary.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'月次勤怠集計を {count} 件作成しました。'))
@@ -0,0 +1,15 @@
+"""レスポンスの圧縮"""
+from django.middleware.gzip import GZipMiddleware as BaseGZipMiddleware
+
+
+class GZipMiddleware(BaseGZipMiddleware):
+    """ストリーミングレスポンスを圧縮しない GZipMiddleware
+
+    CSV のエクスポートや Server-Sent Events は圧縮器の中に出力が溜まり、
+    少しずつ送る（画面に届ける）ことができなくなるため、通常のレスポンスのみ圧縮する。
+    """
+
+    def process_response(self, request, response):
+        if response.streaming or response.get('Content-Type', '').startswith('text/event-stream'):
+            return response
+        return super().process_response(request, response)
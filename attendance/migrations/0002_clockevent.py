@@ -0,0 +1,34 @@
+# Generated by Django 6.0 on 2026-10-18 04:25
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0001_initial'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ClockEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('event_type', models.PositiveSmallIntegerField(choices=[(1, '出勤'), (2, '退勤'), (3, '休憩開始'), (4, '休憩終了')], verbose_name='種別')),
+                ('timestamp', models.DateTimeField(verbose_name='打刻日時')),
+                ('source', models.CharField(blank=True, default='', max_length=64, verbose_name='打刻元')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='登録日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='clock_events', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '打刻イベント',
+                'verbose_name_plural': '打刻イベント',
+                'ordering': ['timestamp', 'id'],
+                'indexes': [models.Index(fields=['user', 'timestamp'], name='attendance__user_id_f70411_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'event_type', 'timestamp'), name='unique_clock_event')],
+            },
+        ),
+    ]
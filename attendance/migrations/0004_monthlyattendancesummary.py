@@ -0,0 +1,98 @@
+# Generated by Django 6.0 on 2026-10-18 11:20
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+# 既存の勤怠記録から集計する際に一度に書き込む行数
+BACKFILL_BATCH_SIZE = 1000
+
+
+def backfill_monthly_summaries(apps, schema_editor):
+    """既存の勤怠記録から月次集計を作成（集計表の作成前の記録もレポートの月単位の集計に含める）
+
+    attendance.summary._summarize と同じ集計を、この時点のモデルで行う。
+    """
+    AttendanceRecord = apps.get_model('attendance', 'AttendanceRecord')
+    MonthlyAttendanceSummary = apps.get_model('attendance', 'MonthlyAttendanceSummary')
+    db_alias = schema_editor.connection.alias
+
+    rows = (
+        AttendanceRecord.objects.using(db_alias)
+        .order_by('user_id', 'date')
+        .values_list(
+            'user_id', 'date', 'clock_in_time', 'clock_out_time', 'break_start_time', 'break_end_time',
+            'total_work_time', 'total_break_time',
+        )
+        .iterator(chunk_size=BACKFILL_BATCH_SIZE)
+    )
+
+    batch = []
+    summary = None
+    for row in rows:
+        user_id, record_date = row[0], row[1]
+        month = record_date.replace(day=1)
+        if summary is None or (summary.user_id, summary.month) != (user_id, month):
+            if summary is not None:
+                batch.append(summary)
+            summary = MonthlyAttendanceSummary(
+                user_id=user_id,
+                month=month,
+                total_work_time=datetime.timedelta(0),
+                total_break_time=datetime.timedelta(0),
+            )
+        summary.record_count += 1
+        if row[2] is not None:
+            summary.days_worked += 1
+        if row[6]:
+            summary.total_work_time += row[6]
+        if row[7]:
+            summary.total_break_time += row[7]
+        for value in row[2:6]:
+            if value is not None:
+                punch = datetime.datetime.combine(record_date, value, tzinfo=datetime.timezone.utc)
+                summary.first_punch_at = min(summary.first_punch_at or punch, punch)
+                summary.last_punch_at = max(summary.last_punch_at or punch, punch)
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            MonthlyAttendanceSummary.objects.using(db_alias).bulk_create(batch)
+            batch = []
+
+    if summary is not None:
+        batch.append(summary)
+    if batch:
+        MonthlyAttendanceSummary.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0003_kioskcredential'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MonthlyAttendanceSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('month', models.DateField(verbose_name='対象月')),
+                ('record_count', models.PositiveIntegerField(default=0, verbose_name='記録数')),
+                ('days_worked', models.PositiveIntegerField(default=0, verbose_name='勤務日数')),
+                ('total_work_time', models.DurationField(default=datetime.timedelta(0), verbose_name='実働時間')),
+                ('total_break_time', models.DurationField(default=datetime.timedelta(0), verbose_name='休憩時間')),
+                ('first_punch_at', models.DateTimeField(blank=True, null=True, verbose_name='最初の打刻')),
+                ('last_punch_at', models.DateTimeField(blank=True, null=True, verbose_name='最後の打刻')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='更新日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='monthly_summaries', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': '月次勤怠集計',
+                'verbose_name_plural': '月次勤怠集計',
+                'ordering': ['-month', 'user'],
+                'indexes': [models.Index(fields=['month'], name='attendance__month_569836_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'month'), name='unique_monthly_summary')],
+            },
+        ),
+        migrations.RunPython(backfill_monthly_summaries, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 6.0 on 2026-10-18 14:05
+
+import attendance.expressions
+import django.db.models.expressions
+import django.db.models.functions.comparison
+import django.db.models.lookups
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0004_monthlyattendancesummary'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='attendancerecord',
+            name='total_work_time',
+        ),
+        migrations.RemoveField(
+            model_name='attendancerecord',
+            name='total_break_time',
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='total_work_time',
+            field=models.GeneratedField(db_persist=True, expression=models.Case(models.When(django.db.models.lookups.IsNull(models.F('clock_in_time'), True), then=models.Value(None)), models.When(django.db.models.lookups.IsNull(models.F('clock_out_time'), True), then=models.Value(None)), default=attendance.expressions.MicrosecondsDuration(django.db.models.functions.comparison.Greatest(django.db.models.expressions.CombinedExpression(models.Case(models.When(django.db.models.lookups.GreaterThanOrEqual(attendance.expressions.TimeMicroseconds(models.F('clock_out_time')), attendance.expressions.TimeMicroseconds(models.F('clock_in_time'))), then=django.db.models.expressions.CombinedExpression(attendance.expressions.TimeMicroseconds(models.F('clock_out_time')), '-', attendance.expressions.TimeMicroseconds(models.F('clock_in_time')))), default=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(attendance.expressions.TimeMicroseconds(models.F('clock_out_time')), '-', attendance.expressions.TimeMicroseconds(models.F('clock_in_time'))), '+', models.Value(86400000000)), output_field=models.BigIntegerField()), '-', models.Case(models.When(django.db.models.lookups.IsNull(models.F('break_start_time'), True), then=models.Value(0)), models.When(django.db.models.lookups.IsNull(models.F('break_end_time'), True), then=models.Value(0)), default=models.Case(models.When(django.db.models.lookups.GreaterThanOrEqual(attendance.expressions.TimeMicroseconds(models.F('break_end_time')), attendance.expressions.TimeMicroseconds(models.F('break_start_time'))), then=django.db.models.expressions.CombinedExpression(attendance.expressions.TimeMicroseconds(models.F('break_end_time')), '-', attendance.expressions.TimeMicroseconds(models.F('break_start_time')))), default=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(attendance.expressions.TimeMicroseconds(models.F('break_end_time')), '-', attendance.expressions.TimeMicroseconds(models.F('break_start_time'))), '+', models.Value(86400000000)), output_field=models.BigIntegerField()), output_field=models.BigIntegerField())), models.Value(0))), output_field=models.DurationField()), output_field=models.DurationField(null=True), verbose_name='実働時間'),
+        ),
+        migrations.AddField(
+            model_name='attendancerecord',
+            name='total_break_time',
+            field=models.GeneratedField(db_persist=True, expression=attendance.expressions.MicrosecondsDuration(models.Case(models.When(django.db.models.lookups.IsNull(models.F('break_start_time'), True), then=models.Value(0)), models.When(django.db.models.lookups.IsNull(models.F('break_end_time'), True), then=models.Value(0)), default=models.Case(models.When(django.db.models.lookups.GreaterThanOrEqual(attendance.expressions.TimeMicroseconds(models.F('break_end_time')), attendance.expressions.TimeMicroseconds(models.F('break_start_time'))), then=django.db.models.expressions.CombinedExpression(attendance.expressions.TimeMicroseconds(models.F('break_end_time')), '-', attendance.expressions.TimeMicroseconds(models.F('break_start_time')))), default=django.db.models.expressions.CombinedExpression(django.db.models.expressions.CombinedExpression(attendance.expressions.TimeMicroseconds(models.F('break_end_time')), '-', attendance.expressions.TimeMicroseconds(models.F('break_start_time'))), '+', models.Value(86400000000)), output_field=models.BigIntegerField()), output_field=models.BigIntegerField())), output_field=models.DurationField(), verbose_name='休憩時間'),
+        ),
+    ]
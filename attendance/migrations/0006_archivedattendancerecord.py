@@ -0,0 +1,41 @@
+# Generated by Django 6.0 on 2026-10-18 14:20
+
+import datetime
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0005_generated_totals'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedAttendanceRecord',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('date', models.DateField(verbose_name='記録日')),
+                ('clock_in_time', models.TimeField(blank=True, null=True, verbose_name='出勤時刻')),
+                ('clock_out_time', models.TimeField(blank=True, null=True, verbose_name='退勤時刻')),
+                ('break_start_time', models.TimeField(blank=True, null=True, verbose_name='休憩開始時刻')),
+                ('break_end_time', models.TimeField(blank=True, null=True, verbose_name='休憩終了時刻')),
+                ('total_work_time', models.DurationField(blank=True, null=True, verbose_name='実働時間')),
+                ('total_break_time', models.DurationField(default=datetime.timedelta(0), verbose_name='休憩時間')),
+                ('created_at', models.DateTimeField(verbose_name='作成日時')),
+                ('updated_at', models.DateTimeField(verbose_name='更新日時')),
+                ('archived_at', models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_attendance_records', to=settings.AUTH_USER_MODEL, verbose_name='ユーザー')),
+            ],
+            options={
+                'verbose_name': 'アーカイブ済み勤怠記録',
+                'verbose_name_plural': 'アーカイブ済み勤怠記録',
+                'ordering': ['-date', 'user'],
+                'indexes': [models.Index(fields=['date'], name='attendance__date_bb1e0f_idx')],
+                'constraints': [models.UniqueConstraint(fields=('user', 'date'), name='unique_archived_attendance_record')],
+            },
+        ),
+    ]
@@ -1,7 +1,53 @@
 from django.db import models
+from django.db.models import Case, Q, Value, When
 from django.contrib.auth.models import User
 from datetime import time, timedelta
 
+from .expressions import break_time_expression, work_time_expression
+
+# 勤務状態
+STATUS_NOT_CLOCKED = 'not_clocked'
+STATUS_ON_BREAK = 'on_break'
+STATUS_CLOCKED_IN = 'clocked_in'
+STATUS_CLOCKED_OUT = 'clocked_out'
+
+STATUS_LABELS = {
+    STATUS_NOT_CLOCKED: '未出勤',
+    STATUS_ON_BREAK: '休憩中',
+    STATUS_CLOCKED_IN: '出勤中',
+    STATUS_CLOCKED_OUT: '退勤済',
+}
+
+
+def status_conditions(prefix=''):
+    """勤務状態の判定条件（get_status_display と同じ優先順）
+
+    prefix には関連先の勤怠記録を参照する場合のパス（例: 'today_record__'）を指定する。
+    """
+    return [
+        (STATUS_NOT_CLOCKED, Q(**{f'{prefix}clock_in_time__isnull': True})),
+        (STATUS_ON_BREAK, Q(**{f'{prefix}break_start_time__isnull': False, f'{prefix}break_end_time__isnull': True})),
+        (STATUS_CLOCKED_IN, Q(**{f'{prefix}clock_out_time__isnull': True})),
+    ]
+
+
+def status_expression(prefix=''):
+    """勤務状態コードを求める式"""
+    return Case(
+        *[When(condition, then=Value(code)) for code, condition in status_conditions(prefix)],
+        default=Value(STATUS_CLOCKED_OUT),
+        output_field=models.CharField(),
+    )
+
+
+def status_label_expression(prefix=''):
+    """勤務状態の表示名を求める式"""
+    return Case(
+        *[When(condition, then=Value(STATUS_LABELS[code])) for code, condition in status_conditions(prefix)],
+        default=Value(STATUS_LABELS[STATUS_CLOCKED_OUT]),
+        output_field=models.CharField(),
+    )
+
 
 class AttendanceRecord(models.Model):
     """勤怠記録モデル"""
@@ -15,9 +61,19 @@ class AttendanceRecord(models.Model):
     break_start_time = models.TimeField(null=True, blank=True, verbose_name='休憩開始時刻')
     break_end_time = models.TimeField(null=True, blank=True, verbose_name='休憩終了時刻')
 
-    # 計算値（自動計算）
-    total_work_time = models.DurationField(null=True, blank=True, verbose_name='実働時間')
-    total_break_time = models.DurationField(null=True, blank=True, verbose_name='休憩時間')
+    # 計算値（データベースの生成列。UPDATE・一括作成でも常に打刻時刻と一致する）
+    total_work_time = models.GeneratedField(
+        expression=work_time_expression(),
+        output_field=models.DurationField(null=True),
+        db_persist=True,
+        verbose_name='実働時間',
+    )
+    total_break_time = models.GeneratedField(
+        expression=break_time_expression(),
+        output_field=models.DurationField(),
+        db_persist=True,
+        verbose_name='休憩時間',
+    )
 
     created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
     updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
@@ -35,45 +91,6 @@ class AttendanceRecord(models.Model):
     def __str__(self):
         return f'{self.user.get_full_name() or self.user.username} - {self.date}'
 
-    def calculate_work_time(self):
-        """実働時間を計算"""
-        if not self.clock_in_time or not self.clock_out_time:
-            return None
-
-        # 同じ日付内での計算を想定
-        clock_in = self._time_to_datetime(self.clock_in_time)
-        clock_out = self._time_to_datetime(self.clock_out_time)
-
-        # 実働時間 = (退勤時刻 - 出勤時刻) - 休憩時間
-        work_duration = clock_out - clock_in
-
-        if self.total_break_time:
-            work_duration -= self.total_break_time
-
-        return work_duration if work_duration.total_seconds() > 0 else timedelta(0)
-
-    def calculate_break_time(self):
-        """休憩時間を計算"""
-        if not self.break_start_time or not self.break_end_time:
-            return timedelta(0)
-
-        break_start = self._time_to_datetime(self.break_start_time)
-        break_end = self._time_to_datetime(self.break_end_time)
-
-        break_duration = break_end - break_start
-        return break_duration if break_duration.total_seconds() > 0 else timedelta(0)
-
-    def _time_to_datetime(self, t):
-        """TimeフィールドをDatetimeに変換（日付は当日を使用）"""
-        from datetime import datetime as dt
-        return dt.combine(self.date, t)
-
-    def save(self, *args, **kwargs):
-        """保存時に実働時間と休憩時間を自動計算"""
-        self.total_break_time = self.calculate_break_time()
-        self.total_work_time = self.calculate_work_time()
-        super().save(*args, **kwargs)
-
     @property
     def is_clocked_in(self):
         """出勤中か判定"""
@@ -84,13 +101,211 @@ class AttendanceRecord(models.Model):
         """休憩中か判定"""
         return self.break_start_time is not None and self.break_end_time is None
 
-    def get_status_display(self):
-        """ステータスを表示用に取得"""
+    def get_status_code(self):
+        """勤務状態コードを取得（status_expression と同じ判定）"""
         if not self.clock_in_time:
-            return '未出勤'
+            return STATUS_NOT_CLOCKED
         elif self.is_on_break:
-            return '休憩中'
+            return STATUS_ON_BREAK
         elif self.is_clocked_in:
-            return '出勤中'
+            return STATUS_CLOCKED_IN
         else:
-            return '退勤済'
+            return STATUS_CLOCKED_OUT
+
+    def get_status_display(self):
+        """ステータスを表示用に取得"""
+        return STATUS_LABELS[self.get_status_code()]
+
+
+class ClockEvent(models.Model):
+    """打刻イベント（追記のみ）
+
+    打刻の履歴。AttendanceRecord はこのイベントを時刻順に適用した結果（射影）として再構築できる。
+    """
+
+    class EventType(models.IntegerChoices):
+        CLOCK_IN = 1, '出勤'
+        CLOCK_OUT = 2, '退勤'
+        BREAK_START = 3, '休憩開始'
+        BREAK_END = 4, '休憩終了'
+
+    # アクション名（ActionSelectionForm.ACTION_CHOICES）との対応
+    ACTION_TYPES = {
+        'clock_in': EventType.CLOCK_IN,
+        'clock_out': EventType.CLOCK_OUT,
+        'break_start': EventType.BREAK_START,
+        'break_end': EventType.BREAK_END,
+    }
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='clock_events', verbose_name='ユーザー')
+    event_type = models.PositiveSmallIntegerField(choices=EventType.choices, verbose_name='種別')
+    timestamp = models.DateTimeField(verbose_name='打刻日時')
+    source = models.CharField(max_length=64, blank=True, default='', verbose_name='打刻元')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='登録日時')
+
+    class Meta:
+        verbose_name = '打刻イベント'
+        verbose_name_plural = '打刻イベント'
+        ordering = ['timestamp', 'id']
+        constraints = [
+            # 同じ打刻の再送は重複登録しない
+            models.UniqueConstraint(fields=['user', 'event_type', 'timestamp'], name='unique_clock_event'),
+        ]
+        indexes = [
+            models.Index(fields=['user', 'timestamp']),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.get_event_type_display()} {self.timestamp}'
+
+    @property
+    def action(self):
+        """アクション名（'clock_in' など）"""
+        for action, event_type in self.ACTION_TYPES.items():
+            if event_type == self.event_type:
+                return action
+
+
+class KioskCredential(models.Model):
+    """打刻端末用の認証情報（PIN・社員証コード）
+
+    管理画面のログインパスワードとは別に、打刻専用の軽量なハッシュで保存する。
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='kiosk_credential', verbose_name='ユーザー')
+    pin_hash = models.CharField(max_length=128, verbose_name='PIN（ハッシュ）')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = '打刻用PIN'
+        verbose_name_plural = '打刻用PIN'
+
+    def __str__(self):
+        return self.user.username
+
+    def set_pin(self, pin):
+        """PIN をハッシュ化して設定"""
+        from .hashers import KioskPINHasher
+
+        hasher = KioskPINHasher()
+        self.pin_hash = hasher.encode(pin, hasher.salt())
+
+    def check_pin(self, pin):
+        """PIN を検証"""
+        from .hashers import KioskPINHasher
+
+        return KioskPINHasher().verify(pin, self.pin_hash)
+
+
+class MonthlyAttendanceSummary(models.Model):
+    """月次の勤怠集計（ユーザー × 月）
+
+    勤怠記録の保存・削除時に該当月の行を更新する（summary.refresh）。
+    rebuild_monthly_summary コマンドで全件を作り直せる。
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='monthly_summaries', verbose_name='ユーザー')
+    month = models.DateField(verbose_name='対象月')  # 月初日
+
+    record_count = models.PositiveIntegerField(default=0, verbose_name='記録数')
+    days_worked = models.PositiveIntegerField(default=0, verbose_name='勤務日数')
+    total_work_time = models.DurationField(default=timedelta(0), verbose_name='実働時間')
+    total_break_time = models.DurationField(default=timedelta(0), verbose_name='休憩時間')
+
+    # 月内の最初と最後の打刻（UTC）
+    first_punch_at = models.DateTimeField(null=True, blank=True, verbose_name='最初の打刻')
+    last_punch_at = models.DateTimeField(null=True, blank=True, verbose_name='最後の打刻')
+
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = '月次勤怠集計'
+        verbose_name_plural = '月次勤怠集計'
+        ordering = ['-month', 'user']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'month'], name='unique_monthly_summary'),
+        ]
+        indexes = [
+            models.Index(fields=['month']),
+        ]
+
+    def __str__(self):
+        return f'{self.user.username} - {self.month:%Y-%m}'
+
+
+class ArchivedAttendanceRecord(models.Model):
+    """アーカイブ済みの勤怠記録
+
+    archive_attendance コマンドで一定期間より古い AttendanceRecord をこのテーブルへ移す。
+    列は AttendanceRecord と同じ名前で、実働・休憩時間は移動時の値をそのまま保存する。
+    レポート・エクスポートは期間がアーカイブ済みの日付を含む場合のみこのテーブルも参照する。
+    """
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archived_attendance_records', verbose_name='ユーザー')
+    date = models.DateField(verbose_name='記録日')
+
+    clock_in_time = models.TimeField(null=True, blank=True, verbose_name='出勤時刻')
+    clock_out_time = models.TimeField(null=True, blank=True, verbose_name='退勤時刻')
+    break_start_time = models.TimeField(null=True, blank=True, verbose_name='休憩開始時刻')
+    break_end_time = models.TimeField(null=True, blank=True, verbose_name='休憩終了時刻')
+
+    total_work_time = models.DurationField(null=True, blank=True, verbose_name='実働時間')
+    total_break_time = models.DurationField(default=timedelta(0), verbose_name='休憩時間')
+
+    # 元の勤怠記録の作成・更新日時
+    created_at = models.DateTimeField(verbose_name='作成日時')
+    updated_at = models.DateTimeField(verbose_name='更新日時')
+    archived_at = models.DateTimeField(auto_now_add=True, verbose_name='アーカイブ日時')
+
+    class Meta:
+        verbose_name = 'アーカイブ済み勤怠記録'
+        verbose_name_plural = 'アーカイブ済み勤怠記録'
+        ordering = ['-date', 'user']
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'date'], name='unique_archived_attendance_record'),
+        ]
+        indexes = [
+            models.Index(fields=['date']),
+        ]
+
+    def __str__(self):
+        return f'{self.user.get_full_name() or self.user.username} - {self.date}'
+
+
+class Team(models.Model):
+    """チーム（部署・フロア等）"""
+
+    name = models.CharField(max_length=100, unique=True, verbose_name='チーム名')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+    updated_at = models.DateTimeField(auto_now=True, verbose_name='更新日時')
+
+    class Meta:
+        verbose_name = 'チーム'
+        verbose_name_plural = 'チーム'
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
+class TeamMembership(models.Model):
+    """チームの所属（ユーザーは1つのチームに所属する）
+
+    ダッシュボード・レポートのチームでの絞り込みは現在の所属で行う。
+    (チーム, ユーザー) のインデックスでチームのメンバーだけを取得し、
+    勤怠記録は (ユーザー, 日付) のインデックスで引く。
+    """
+
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='team_membership', verbose_name='ユーザー')
+    team = models.ForeignKey(Team, on_delete=models.CASCADE, related_name='memberships', verbose_name='チーム')
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name='作成日時')
+
+    class Meta:
+        verbose_name = 'チーム所属'
+        verbose_name_plural = 'チーム所属'
+        indexes = [
+            models.Index(fields=['team', 'user']),
+        ]
+
+    def __str__(self):
+        return f'{self.team} - {self.user.username}'
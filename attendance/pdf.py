@@ -0,0 +1,112 @@
+"""PDF レポート生成
+
+フォントとスタイルはアプリ起動時（AttendanceConfig.ready）に一度だけ登録し、
+リクエストごとの再生成を避ける。表はページ単位の小さな Table に分割して
+ヘッダー行を繰り返すため、行数が増えても描画コストは線形に収まる。
+"""
+from datetime import datetime
+from itertools import islice
+
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.cidfonts import UnicodeCIDFont
+from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+
+# 日本語フォント（CIDフォント）
+JP_FONT = 'HeiseiKakuGo-W5'
+
+# 1ページに収める行数（1ページ目はタイトル分だけ少なくする）
+FIRST_PAGE_ROWS = 36
+ROWS_PER_PAGE = 42
+
+TABLE_HEADER = ['ユーザー', 'ユーザー名', '日付', '出勤', '退勤', '実働時間']
+TABLE_COL_WIDTHS = [1.5*inch, 1.2*inch, 1.2*inch, 0.9*inch, 0.9*inch, 1*inch]
+
+# 登録済みのスタイル（setup() で生成）
+_styles = None
+
+
+def setup():
+    """フォントとスタイルを登録（複数回呼ばれても一度だけ実行）"""
+    global _styles
+    if _styles is not None:
+        return _styles
+
+    if JP_FONT not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(UnicodeCIDFont(JP_FONT))
+
+    sample = getSampleStyleSheet()
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=sample['Heading1'],
+        fontSize=20,
+        textColor=colors.HexColor('#007bff'),
+        spaceAfter=12,
+        alignment=1,  # Center
+        fontName=JP_FONT,
+    )
+    normal_style = sample['Normal'].clone('JapaneseNormal')
+    normal_style.fontName = JP_FONT
+
+    table_style = TableStyle([
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#007bff')),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), JP_FONT),
+        ('FONTSIZE', (0, 0), (-1, 0), 10),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('FONTNAME', (0, 1), (-1, -1), JP_FONT),
+    ])
+
+    _styles = {
+        'title': title_style,
+        'normal': normal_style,
+        'table': table_style,
+    }
+    return _styles
+
+
+def _iter_tables(rows, styles):
+    """行イテレータをページ単位の Table に分割して返す"""
+    rows = iter(rows)
+    page_size = FIRST_PAGE_ROWS
+    first = True
+    while True:
+        chunk = list(islice(rows, page_size))
+        if not chunk:
+            if first:
+                # データがなくてもヘッダーだけの表を出力
+                yield Table([TABLE_HEADER], colWidths=TABLE_COL_WIDTHS, style=styles['table'])
+            return
+        if not first:
+            yield PageBreak()
+        yield Table([TABLE_HEADER] + chunk, colWidths=TABLE_COL_WIDTHS, repeatRows=1, style=styles['table'])
+        first = False
+        page_size = ROWS_PER_PAGE
+
+
+def build_report(buffer, rows):
+    """勤怠レポートの PDF を buffer に書き出す
+
+    rows は TABLE_HEADER の順に並んだ文字列リストを返すイテレータ。
+    """
+    styles = setup()
+    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=20, bottomMargin=20)
+
+    # タイトルと生成日時
+    now = datetime.now().strftime('%Y年%m月%d日 %H:%M:%S')
+    elements = [
+        Paragraph('勤怠レポート', styles['title']),
+        Spacer(1, 0.3*inch),
+        Paragraph(f'生成日時: {now}', styles['normal']),
+        Spacer(1, 0.2*inch),
+    ]
+    elements.extend(_iter_tables(rows, styles))
+
+    doc.build(elements)
@@ -0,0 +1,160 @@
+"""打刻イベントの一括登録と勤怠記録への射影
+
+ClockEvent を打刻の履歴とし、AttendanceRecord の (ユーザー, 日付) ごとに、その日のイベントを
+時刻順に打刻の規則（punch.TRANSITIONS）へ適用した結果のうち、新しく登録したイベントで値が変わった列だけを反映する。
+イベントのない記録（CSV で取り込んだ記録等）や、新しいイベントに関係しない列（管理画面での修正等）は変更しない。
+"""
+from collections import defaultdict
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import archive, dashboard, summary
+from .models import AttendanceRecord, ClockEvent
+from .punch import TRANSITIONS, NOW
+
+# イベントから設定する勤怠記録の列
+CLOCK_FIELDS = [
+    'clock_in_time',
+    'clock_out_time',
+    'break_start_time',
+    'break_end_time',
+]
+
+
+def replay(record, events, touched=None):
+    """イベントを時刻順に適用（規則に合わない打刻は無視）
+
+    touched に集合を指定した場合は、適用した遷移で設定した列名を追加する。
+    """
+    for event in events:
+        rules = TRANSITIONS[event.action]
+        rule = next(rule for rule in rules if rule.matches(record))
+        if not rule.is_transition:
+            continue
+        event_time = event.timestamp.astimezone(dt_timezone.utc).time()
+        for name, value in rule.changes.items():
+            setattr(record, name, event_time if value is NOW else value)
+            if touched is not None:
+                touched.add(name)
+    return record
+
+
+def _event_fields(events):
+    """イベントの種別の遷移で設定されうる列"""
+    return {
+        name
+        for action in {event.action for event in events}
+        for rule in TRANSITIONS[action] if rule.is_transition
+        for name in rule.changes
+    }
+
+
+def _project(record, events):
+    """記録を前提にイベントを適用した各列の値
+
+    イベントの種別で設定されうる列は未打刻の状態から、それ以外の列は記録の値を前提に遷移を判定する
+    （取り込んだ出勤時刻に、端末の退勤の打刻が遅れて届いた場合等）。
+    """
+    event_fields = _event_fields(events)
+    state = AttendanceRecord(**{
+        name: None if name in event_fields else getattr(record, name) for name in CLOCK_FIELDS
+    })
+    touched = set()
+    replay(state, events, touched)
+    return {name: getattr(state, name) for name in touched}
+
+
+def rebuild_records(keys, since=None):
+    """(ユーザーID, 日付) の組ごとに、イベントが設定する列を勤怠記録へ反映する
+
+    日付は打刻と同じく UTC の日付。その日のイベントを時刻順に適用し、適用した遷移で設定した列だけを書き込む。
+    since を指定した場合は、それ以降に登録したイベントの有無で適用結果が変わる列だけを書き込む
+    （既存のイベントで設定済みの列を管理画面で修正した後に遅れて届いた打刻で、修正を上書きしない）。
+    イベントのない組の記録や、イベントが設定しない列（CSV で取り込んだ記録）は変更しない。
+    """
+    keys = set(keys)
+    if not keys:
+        return 0
+
+    # 対象日の範囲のイベントを1回で取得し、(ユーザー, 日付) ごとに振り分ける
+    user_ids = {user_id for user_id, _ in keys}
+    dates = {record_date for _, record_date in keys}
+    grouped = defaultdict(list)
+    events = ClockEvent.objects.filter(
+        user_id__in=user_ids,
+        timestamp__gte=datetime.combine(min(dates), time.min, tzinfo=dt_timezone.utc),
+        timestamp__lt=datetime.combine(max(dates) + timedelta(days=1), time.min, tzinfo=dt_timezone.utc),
+    ).order_by('timestamp', 'id')
+    for event in events:
+        key = (event.user_id, event.timestamp.astimezone(dt_timezone.utc).date())
+        if key in keys:
+            grouped[key].append(event)
+    if not grouped:
+        return 0
+
+    # 既存の記録（稼働テーブル、なければアーカイブ）を遷移の前提にする
+    existing = {
+        (record.user_id, record.date): record
+        for record in AttendanceRecord.objects.filter(user_id__in=user_ids, date__in=dates)
+    }
+    archived = archive.fetch(grouped.keys() - existing.keys(), CLOCK_FIELDS)
+
+    now = timezone.now()
+    created = []
+    updated = defaultdict(list)
+    for (user_id, record_date), key_events in grouped.items():
+        record = existing.get((user_id, record_date))
+        if record is None:
+            record = AttendanceRecord(user_id=user_id, date=record_date, **archived.get((user_id, record_date), {}))
+
+        changes = _project(record, key_events)
+        if since is not None:
+            previous = _project(record, [event for event in key_events if event.created_at < since])
+            changes = {
+                name: changes.get(name)
+                for name in changes.keys() | previous.keys()
+                if changes.get(name) != previous.get(name)
+            }
+        if not changes:
+            continue
+
+        for name, value in changes.items():
+            setattr(record, name, value)
+        record.updated_at = now
+        if record.pk is None:
+            created.append(record)
+        else:
+            # 設定した列の組み合わせごとにまとめて更新する
+            updated[frozenset(changes)].append(record)
+
+    # アーカイブ済みの日に遅れて届いた打刻は、アーカイブの値にイベントを反映した記録を稼働テーブルへ戻す
+    archive.discard((record.user_id, record.date) for record in created)
+    AttendanceRecord.objects.bulk_create(created)
+    for fields, records in updated.items():
+        AttendanceRecord.objects.bulk_update(records, [*sorted(fields), 'updated_at'])
+
+    # 一括更新ではシグナルが送られないため、ダッシュボードは作り直し、月次集計は対象月を更新する
+    changed = [(record.user_id, record.date) for record in created]
+    changed += [(record.user_id, record.date) for records in updated.values() for record in records]
+    for record_date in {record_date for _, record_date in changed}:
+        dashboard.invalidate(record_date)
+    summary.refresh(changed)
+    return len(changed)
+
+
+def ingest(events):
+    """打刻イベントを一括登録して勤怠記録を更新
+
+    events は ClockEvent の未保存インスタンスのリスト。再送された打刻（同じユーザー・種別・時刻）は無視する。
+    1つのトランザクションで登録と射影の更新を行う。
+    """
+    for event in events:
+        event.timestamp = event.timestamp.astimezone(dt_timezone.utc)
+
+    with transaction.atomic():
+        since = timezone.now()
+        ClockEvent.objects.bulk_create(events, ignore_conflicts=True)
+        updated = rebuild_records(((event.user_id, event.timestamp.date()) for event in events), since=since)
+    return updated
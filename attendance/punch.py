@@ -0,0 +1,155 @@
+"""打刻処理（状態遷移）
+
+各アクションは「条件 → 結果」の規則を上から順に評価する状態遷移として定義する。
+1つのトランザクションでレコードを1回読み込んで該当する規則を判定し、遷移の場合は
+読み込んだ状態のままであることを条件にした1回の UPDATE で変更する列だけを書き込む
+（実働・休憩時間はデータベースの生成列）。警告のみの規則は書き込みを行わない。
+その日最初の出勤はレコードを INSERT し、同時に作成された場合は読み込みからやり直す。
+成功した打刻は ClockEvent にも記録する。
+"""
+from dataclasses import dataclass, field
+
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.db.models.signals import post_save
+from django.utils import timezone
+
+from .models import AttendanceRecord, ClockEvent
+
+# 同時更新で状態が変わった場合に遷移をやり直す回数
+MAX_ATTEMPTS = 3
+
+# 遷移で設定する値の目印（打刻時刻）
+NOW = object()
+
+
+@dataclass(frozen=True)
+class Rule:
+    """状態遷移の規則
+
+    when は {列名: NULL かどうか} の条件。空の場合は常に該当する。
+    changes が None の規則は警告のみ（レコードは変更しない）。
+    """
+    when: dict
+    message: str
+    changes: dict = field(default=None)
+
+    @property
+    def is_transition(self):
+        return self.changes is not None
+
+    def q(self):
+        return Q(**{f'{name}__isnull': isnull for name, isnull in self.when.items()})
+
+    def matches(self, record):
+        return all((getattr(record, name) is None) == isnull for name, isnull in self.when.items())
+
+
+NOT_CLOCKED_IN = Rule({'clock_in_time': True}, '出勤時刻が記録されていません。')
+
+TRANSITIONS = {
+    'clock_in': [
+        # 退勤済みの場合は退勤時刻をクリアして出勤中に戻す
+        Rule({'clock_out_time': False}, '{name}を出勤中に戻しました。', {'clock_out_time': None}),
+        Rule({'clock_in_time': False}, '{name}は既に出勤しています。'),
+        Rule({}, '{name}が出勤しました。({time})', {'clock_in_time': NOW}),
+    ],
+    'clock_out': [
+        NOT_CLOCKED_IN,
+        Rule({'clock_out_time': False}, '{name}は既に退勤しています。'),
+        Rule({}, '{name}が退勤しました。({time})', {'clock_out_time': NOW}),
+    ],
+    'break_start': [
+        NOT_CLOCKED_IN,
+        Rule({'clock_out_time': False}, '既に退勤しています。'),
+        Rule({'break_start_time': False}, '既に休憩中です。'),
+        Rule({}, '{name}が休憩を開始しました。({time})', {'break_start_time': NOW}),
+    ],
+    'break_end': [
+        Rule({'break_start_time': True}, '休憩中ではありません。'),
+        Rule({'break_end_time': False}, '既に休憩から戻っています。'),
+        Rule({}, '{name}が休憩から戻りました。({time})', {'break_end_time': NOW}),
+    ],
+}
+
+
+@dataclass
+class PunchResult:
+    """打刻結果"""
+    success: bool
+    message: str
+    record: AttendanceRecord = None
+
+
+def _guard(rules, index):
+    """index 番目の規則に該当する条件（それより前の規則に該当しない）"""
+    condition = rules[index].q()
+    for previous in rules[:index]:
+        condition &= ~previous.q() if previous.when else Q(pk__in=[])
+    return condition
+
+
+def _resolve(changes, now_time):
+    return {name: now_time if value is NOW else value for name, value in changes.items()}
+
+
+def _notify(record, update_fields, created=False):
+    """UPDATE ではシグナルが送られないため、保存後の処理（ダッシュボード更新等）を呼び出す"""
+    post_save.send(
+        sender=AttendanceRecord,
+        instance=record,
+        created=created,
+        update_fields=frozenset(update_fields) if update_fields else None,
+        raw=False,
+        using=record._state.db,
+    )
+
+
+def _format(rule, user, now_time):
+    return rule.message.format(name=user.get_full_name(), time=now_time.strftime('%H:%M:%S'))
+
+
+def _log_event(user, action, now, source):
+    """打刻イベントを履歴に追加"""
+    ClockEvent.objects.create(user=user, event_type=ClockEvent.ACTION_TYPES[action], timestamp=now, source=source)
+
+
+def punch(user, action, now=None, source='web'):
+    """打刻を実行（読み込み・状態遷移・イベントの記録を1つのトランザクションで行う）"""
+    rules = TRANSITIONS[action]
+    now = now or timezone.now()
+    today = now.date()
+    now_time = now.time()
+    records = AttendanceRecord.objects.filter(user=user, date=today)
+
+    with transaction.atomic():
+        for _ in range(MAX_ATTEMPTS):
+            # 現在の状態から該当する規則を判定（行ロックに対応したデータベースではロックする）
+            record = records.select_for_update().first()
+            current = record or AttendanceRecord(user=user, date=today)
+            index, rule = next((index, rule) for index, rule in enumerate(rules) if rule.matches(current))
+            if not rule.is_transition:
+                return PunchResult(False, _format(rule, user, now_time), record)
+
+            changes = _resolve(rule.changes, now_time)
+            if record is None:
+                # その日最初の打刻はレコードを作成（同時に作成された場合は読み込みからやり直す）
+                try:
+                    with transaction.atomic():
+                        record = AttendanceRecord.objects.create(user=user, date=today, **changes)
+                except IntegrityError:
+                    continue
+            else:
+                # 読み込んだ状態のままの場合のみ更新（行ロックのないデータベースでの同時更新に備える）
+                updated = records.filter(_guard(rules, index), pk=record.pk).update(
+                    updated_at=timezone.now(), **changes,
+                )
+                if not updated:
+                    continue
+                record = records.get()
+                _notify(record, [*changes, 'total_break_time', 'total_work_time', 'updated_at'])
+
+            _log_event(user, action, now, source)
+            return PunchResult(True, _format(rule, user, now_time), record)
+
+    return PunchResult(False, '打刻が混み合っています。もう一度お試しください。')
@@ -0,0 +1,84 @@
+"""シグナルハンドラ"""
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import dashboard, events, instrumentation, summary, users
+from .models import AttendanceRecord, Team, TeamMembership
+
+
+@receiver(post_save, sender=AttendanceRecord)
+def invalidate_dashboard_on_record_save(sender, instance, **kwargs):
+    """打刻時にダッシュボードを無効化し、表示中の画面へ差分を配信（全体と所属チームの画面）"""
+    target_date, user_id = instance.date, instance.user_id
+
+    def invalidate_and_publish():
+        dashboard.invalidate(target_date)
+        if not events.has_subscribers():
+            return
+        delta = dashboard.make_delta(target_date, user_id)
+        if delta is None:
+            return
+        events.publish(delta)
+        if delta['member_team_id']:
+            team_delta = dashboard.make_delta(target_date, user_id, delta['member_team_id'])
+            if team_delta is not None:
+                events.publish(team_delta)
+
+    transaction.on_commit(invalidate_and_publish)
+
+
+@receiver(post_delete, sender=AttendanceRecord)
+def invalidate_dashboard_on_record_delete(sender, instance, **kwargs):
+    """勤怠記録の削除時はダッシュボードを作り直す"""
+    dashboard.invalidate(instance.date)
+
+
+@receiver(post_save, sender=AttendanceRecord)
+def refresh_monthly_summary_on_record_save(sender, instance, raw=False, **kwargs):
+    """勤怠記録の保存時に該当月の月次集計を更新"""
+    if raw:
+        return
+    summary.refresh([(instance.user_id, instance.date)])
+
+
+@receiver(post_delete, sender=AttendanceRecord)
+def refresh_monthly_summary_on_record_delete(sender, instance, **kwargs):
+    """勤怠記録の削除時に該当月の月次集計を更新"""
+    summary.refresh([(instance.user_id, instance.date)])
+
+
+@receiver(post_save, sender=User)
+def invalidate_dashboard_on_user_save(sender, instance, update_fields=None, **kwargs):
+    """ユーザー変更時にユーザー一覧とダッシュボードを作り直す"""
+    # ログイン日時のみの更新は表示に影響しない
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    users.invalidate()
+    dashboard.invalidate(timezone.now().date())
+
+
+@receiver(post_delete, sender=User)
+def invalidate_dashboard_on_user_delete(sender, instance, **kwargs):
+    """ユーザー削除時はユーザー一覧とダッシュボードを作り直す"""
+    users.invalidate()
+    dashboard.invalidate(timezone.now().date())
+
+
+@receiver(post_save, sender=Team)
+@receiver(post_delete, sender=Team)
+@receiver(post_save, sender=TeamMembership)
+@receiver(post_delete, sender=TeamMembership)
+def invalidate_dashboard_on_team_change(sender, **kwargs):
+    """チーム・所属の変更時はユーザー一覧（所属チーム）とダッシュボードを作り直す"""
+    users.invalidate()
+    dashboard.invalidate(timezone.now().date())
+
+
+@receiver(connection_created)
+def install_query_timer_on_connect(sender, connection, **kwargs):
+    """データベース接続ごとにリクエストのクエリ計測を登録"""
+    instrumentation.install_query_timer(connection)
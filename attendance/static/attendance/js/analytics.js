@@ -0,0 +1,8 @@
+// 分布の棒の高さを最大値に対する比率で設定
+document.querySelectorAll('.distribution').forEach(container => {
+    const counts = container.dataset.distribution.split(',').map(Number);
+    const max = Math.max(...counts, 1);
+    container.querySelectorAll('.distribution-bar span').forEach((bar, index) => {
+        bar.style.height = `${counts[index] / max * 90}%`;
+    });
+});
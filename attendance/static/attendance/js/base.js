@@ -0,0 +1,7 @@
+// フォーム送信時のローディング表示
+document.querySelectorAll('form').forEach(form => {
+    form.addEventListener('submit', function() {
+        document.querySelector('.loading-overlay')?.classList.add('active');
+        document.querySelector('.loading-spinner')?.classList.add('active');
+    });
+});
@@ -0,0 +1,58 @@
+// 更新配信の URL（ASGI で動作している場合のみ）と再読み込みの間隔
+const { streamUrl, pollSeconds } = document.currentScript.dataset;
+
+// 最終更新時刻を表示
+function updateLastUpdatedTime() {
+    const now = new Date();
+    const timeString = now.toLocaleTimeString('ja-JP');
+    document.getElementById('last-updated-time').textContent = timeString;
+}
+
+// ページ読み込み時と定期的に更新時刻を更新
+updateLastUpdatedTime();
+setInterval(updateLastUpdatedTime, 1000);
+
+// 打刻の差分を受信して該当行と集計を更新（ページ全体は再読み込みしない）
+const statusBadgeClasses = {
+    clocked_in: 'badge-clock-in',
+    on_break: 'badge-on-break',
+    clocked_out: 'badge-clock-out',
+    not_clocked: 'badge-not-clocked',
+};
+
+function applyStatusDelta(delta) {
+    const row = document.querySelector(`tr[data-user-id="${delta.user_id}"]`);
+    if (!row) {
+        // 表示されていないユーザーの場合は一覧を取り直す
+        location.reload();
+        return;
+    }
+
+    // 状態バッジ
+    const badge = document.createElement('span');
+    badge.className = `status-badge ${statusBadgeClasses[delta.status_code] || 'badge-not-clocked'}`;
+    badge.textContent = delta.status;
+    row.querySelector('[data-field="status"]').replaceChildren(badge);
+
+    // 打刻時刻と実働時間
+    ['clock_in_time', 'clock_out_time', 'break_start_time', 'break_end_time', 'total_work'].forEach(field => {
+        row.querySelector(`[data-field="${field}"]`).textContent = delta[field] || '-';
+    });
+
+    // 集計
+    Object.entries(delta.counters).forEach(([key, value]) => {
+        const counter = document.querySelector(`[data-counter="${key}"]`);
+        if (counter) {
+            counter.textContent = value;
+        }
+    });
+}
+
+if (streamUrl && window.EventSource) {
+    const stream = new EventSource(streamUrl);
+    stream.addEventListener('status', event => applyStatusDelta(JSON.parse(event.data)));
+    stream.addEventListener('reload', () => location.reload());
+} else {
+    // 配信を使えない場合は定期的に再読み込み（変更がなければ 304 で本文は送られない）
+    setTimeout(() => location.reload(), Number(pollSeconds) * 1000);
+}
@@ -0,0 +1,46 @@
+// エクスポート: ジョブを登録し、完了するまで進捗を表示してからダウンロード
+document.querySelectorAll('[data-export-job]').forEach(link => {
+    const label = link.textContent.trim();
+    const csrfToken = document.querySelector('.export-button-group [name="csrfmiddlewaretoken"]').value;
+
+    const poll = job => {
+        if (job.state === 'done') {
+            link.textContent = label;
+            link.classList.remove('disabled');
+            window.location.href = job.download_url;
+            return;
+        }
+        if (job.state === 'failed') {
+            link.textContent = `${label}（失敗）`;
+            link.classList.remove('disabled');
+            return;
+        }
+        link.textContent = `${label} ${Math.floor(job.progress * 100)}%`;
+        setTimeout(() => {
+            fetch(job.status_url).then(response => response.json()).then(poll);
+        }, 1000);
+    };
+
+    link.addEventListener('click', event => {
+        event.preventDefault();
+        if (link.classList.contains('disabled')) {
+            return;
+        }
+        link.classList.add('disabled');
+        link.textContent = `${label} 0%`;
+        fetch(link.dataset.exportJob, {method: 'POST', headers: {'X-CSRFToken': csrfToken}})
+            .then(response => {
+                if (!response.ok) {
+                    throw new Error(response.statusText);
+                }
+                return response.json();
+            })
+            .then(poll)
+            .catch(() => {
+                // ジョブを登録できない場合はその場で作成する
+                link.classList.remove('disabled');
+                link.textContent = label;
+                window.location.href = link.href;
+            });
+    });
+});
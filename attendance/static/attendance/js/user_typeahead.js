@@ -0,0 +1,35 @@
+// ユーザー検索入力の初期化（ページ内で1回のみ定義）
+window.initUserTypeahead = window.initUserTypeahead || function (container) {
+    const hidden = container.querySelector('.user-typeahead-value');
+    const input = container.querySelector('input[type="text"]');
+    const datalist = container.querySelector('datalist');
+    let timer = null;
+
+    input.addEventListener('input', () => {
+        // 候補から選ばれた場合はユーザーIDを設定
+        const selected = Array.from(datalist.options).find(option => option.value === input.value);
+        hidden.value = selected ? selected.dataset.id : '';
+
+        clearTimeout(timer);
+        timer = setTimeout(() => {
+            if (selected) {
+                return;
+            }
+            const url = `${container.dataset.searchUrl}?q=${encodeURIComponent(input.value)}`;
+            fetch(url)
+                .then(response => response.json())
+                .then(data => {
+                    datalist.replaceChildren(...data.results.map(user => {
+                        const option = document.createElement('option');
+                        option.value = `${user.full_name} (${user.username})`;
+                        option.dataset.id = user.id;
+                        return option;
+                    }));
+                });
+        }, 150);
+    });
+};
+document.querySelectorAll('.user-typeahead:not([data-ready])').forEach(container => {
+    container.dataset.ready = '1';
+    window.initUserTypeahead(container);
+});
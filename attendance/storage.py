@@ -0,0 +1,53 @@
+"""静的ファイルのストレージ
+
+collectstatic で内容のハッシュを含むファイル名（ManifestStaticFilesStorage）に加えて、
+圧縮の効くファイルの gzip 版（.gz）と brotli 版（.br、brotli パッケージがある場合のみ）を作成する。
+圧縮版は Web サーバー（nginx の gzip_static / brotli_static 等）がそのまま配信する。
+"""
+import gzip
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.base import ContentFile
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# 圧縮するファイルの拡張子
+COMPRESSIBLE_EXTENSIONS = ('.css', '.js', '.svg', '.json', '.map', '.txt', '.html', '.xml')
+
+# これより小さいファイルは圧縮しない（バイト）
+MIN_COMPRESS_SIZE = 256
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """ハッシュ付きのファイル名と gzip / brotli の圧縮版を作成する静的ファイルストレージ"""
+
+    def post_process(self, paths, dry_run=False, **options):
+        yield from super().post_process(paths, dry_run=dry_run, **options)
+        if dry_run:
+            return
+
+        for name in set(self.hashed_files.values()):
+            if name.endswith(COMPRESSIBLE_EXTENSIONS):
+                self._compress(name)
+
+    def _compress(self, name):
+        with self.open(name) as f:
+            content = f.read()
+        if len(content) < MIN_COMPRESS_SIZE:
+            return
+
+        # 同じ内容からは同じ圧縮結果になるよう、gzip のヘッダーの日時は固定する
+        variants = [('.gz', gzip.compress(content, compresslevel=9, mtime=0))]
+        if brotli is not None:
+            variants.append(('.br', brotli.compress(content)))
+
+        for suffix, compressed in variants:
+            # 小さくならない場合は作成しない
+            if len(compressed) >= len(content):
+                continue
+            if self.exists(name + suffix):
+                self.delete(name + suffix)
+            self._save(name + suffix, ContentFile(compressed))
@@ -0,0 +1,171 @@
+"""月次勤怠集計（MonthlyAttendanceSummary）の更新
+
+勤怠記録が保存・削除されると、該当する (ユーザー, 月) の行だけを
+その月の勤怠記録（最大31行）から集計し直して upsert する。
+集計は差分の加減算ではなく対象月の再集計のため、編集・削除・一括更新のいずれでも
+結果が全件再構築と一致する。アーカイブ済みの月は ArchivedAttendanceRecord の行も集計する。
+"""
+import heapq
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+
+from . import archive
+from .models import ArchivedAttendanceRecord, AttendanceRecord, MonthlyAttendanceSummary
+
+# 集計に使う勤怠記録の列
+RECORD_COLUMNS = (
+    'user_id',
+    'date',
+    'clock_in_time',
+    'clock_out_time',
+    'break_start_time',
+    'break_end_time',
+    'total_work_time',
+    'total_break_time',
+)
+
+SUMMARY_FIELDS = [
+    'record_count',
+    'days_worked',
+    'total_work_time',
+    'total_break_time',
+    'first_punch_at',
+    'last_punch_at',
+    'updated_at',
+]
+
+# 全件再構築で一度に書き込む行数
+REBUILD_BATCH_SIZE = 1000
+
+
+def month_start(value):
+    """日付をその月の月初日に変換"""
+    return value.replace(day=1)
+
+
+def next_month(value):
+    """翌月の月初日"""
+    return date(value.year + value.month // 12, value.month % 12 + 1, 1)
+
+
+def _punches(row):
+    """勤怠記録1行の打刻日時（UTC）"""
+    record_date = row[1]
+    return [datetime.combine(record_date, value, tzinfo=dt_timezone.utc) for value in row[2:6] if value is not None]
+
+
+def _summarize(user_id, month, rows):
+    """同じ (ユーザー, 月) の勤怠記録の行から集計行を作成"""
+    summary = MonthlyAttendanceSummary(
+        user_id=user_id,
+        month=month,
+        total_work_time=timedelta(0),
+        total_break_time=timedelta(0),
+    )
+    punches = []
+    for row in rows:
+        summary.record_count += 1
+        if row[2] is not None:
+            summary.days_worked += 1
+        if row[6]:
+            summary.total_work_time += row[6]
+        if row[7]:
+            summary.total_break_time += row[7]
+        punches.extend(_punches(row))
+    if punches:
+        summary.first_punch_at = min(punches)
+        summary.last_punch_at = max(punches)
+    return summary
+
+
+def _upsert(summaries):
+    MonthlyAttendanceSummary.objects.bulk_create(
+        summaries,
+        update_conflicts=True,
+        unique_fields=['user', 'month'],
+        update_fields=SUMMARY_FIELDS,
+    )
+
+
+def refresh(keys):
+    """(ユーザーID, 日付) の組に該当する月の集計を作り直す
+
+    対象ユーザー・期間の勤怠記録を1回で取得し、記録がなくなった月の集計は削除する。
+    """
+    months = {(user_id, month_start(record_date)) for user_id, record_date in keys}
+    if not months:
+        return 0
+
+    user_ids = {user_id for user_id, _ in months}
+    first = min(month for _, month in months)
+    last = max(month for _, month in months)
+
+    sources = [AttendanceRecord]
+    if archive.includes(first):
+        sources.append(ArchivedAttendanceRecord)
+
+    grouped = defaultdict(list)
+    for model in sources:
+        rows = model.objects.filter(
+            user_id__in=user_ids,
+            date__gte=first,
+            date__lt=next_month(last),
+        ).order_by().values_list(*RECORD_COLUMNS)
+        for row in rows:
+            key = (row[0], month_start(row[1]))
+            if key in months:
+                grouped[key].append(row)
+
+    summaries = [_summarize(user_id, month, grouped[user_id, month]) for user_id, month in months if (user_id, month) in grouped]
+    emptied = months - grouped.keys()
+    if not emptied:
+        # upsert のみの場合は1文で完結するため、トランザクション（セーブポイント）を作らない
+        if summaries:
+            _upsert(summaries)
+        return len(summaries)
+
+    with transaction.atomic():
+        if summaries:
+            _upsert(summaries)
+        for user_id, month in emptied:
+            MonthlyAttendanceSummary.objects.filter(user_id=user_id, month=month).delete()
+    return len(summaries)
+
+
+def rebuild():
+    """月次集計を全件作り直す
+
+    勤怠記録とアーカイブを (ユーザー, 日付) 順に逐次読み込んで併合し、(ユーザー, 月) が変わるごとに集計行を確定する。
+    """
+    rows = heapq.merge(
+        *(
+            model.objects.order_by('user_id', 'date').values_list(*RECORD_COLUMNS).iterator(chunk_size=REBUILD_BATCH_SIZE)
+            for model in (AttendanceRecord, ArchivedAttendanceRecord)
+        ),
+        key=lambda row: (row[0], row[1]),
+    )
+
+    count = 0
+    batch = []
+    current = None
+    current_rows = []
+    with transaction.atomic():
+        MonthlyAttendanceSummary.objects.all().delete()
+        for row in rows:
+            key = (row[0], month_start(row[1]))
+            if key != current:
+                if current_rows:
+                    batch.append(_summarize(*current, current_rows))
+                current, current_rows = key, []
+            current_rows.append(row)
+            if len(batch) >= REBUILD_BATCH_SIZE:
+                MonthlyAttendanceSummary.objects.bulk_create(batch)
+                count += len(batch)
+                batch = []
+        if current_rows:
+            batch.append(_summarize(*current, current_rows))
+        MonthlyAttendanceSummary.objects.bulk_create(batch)
+        count += len(batch)
+    return count
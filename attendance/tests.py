@@ -1,3 +1,1267 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from unittest.mock import patch
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.forms.forms import NON_FIELD_ERRORS
+from django.http import QueryDict
+from django.test import Client, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from reportlab.platypus import PageBreak, Table
+
+from . import archive, benchmark, dashboard, exports, filters, importer, instrumentation, kiosk, pdf, projection, summary, users, views
+from .admin import EstimatedCountPaginator
+from .filters import ReportFilter
+from .models import (
+    STATUS_CLOCKED_IN,
+    STATUS_NOT_CLOCKED,
+    ArchivedAttendanceRecord,
+    AttendanceRecord,
+    ClockEvent,
+    KioskCredential,
+    MonthlyAttendanceSummary,
+    Team,
+    TeamMembership,
+)
+from .punch import punch
+from .views import _summarize_months, _summarize_records
+
+
+def _at(day, hour, minute=0):
+    """UTC の打刻日時"""
+    return datetime.combine(day, time(hour, minute), tzinfo=dt_timezone.utc)
+
+
+def _event(user, action, timestamp, source='kiosk'):
+    return ClockEvent(user=user, event_type=ClockEvent.ACTION_TYPES[action], timestamp=timestamp, source=source)
+
+
+class QueryBudgetTests(TestCase):
+    """主要な画面のクエリ数が上限以内で、データ量に比例して増えないこと（N+1 の検出）"""
+
+    def _measure(self, dataset):
+        results = benchmark.run(self.client, dataset, repeat=0, range_days=14)
+        return {result['view']: result for result in results}
+
+    def test_query_counts_do_not_grow_with_data(self):
+        small = benchmark.seed(3, 14, prefix='small')
+        small_results = self._measure(small)
+
+        large = benchmark.seed(12, 14, prefix='large', seed=1)
+        large_results = self._measure(large)
+
+        for name, budget in benchmark.QUERY_BUDGETS.items():
+            with self.subTest(view=name):
+                self.assertEqual(small_results[name]['status'] // 100, 2 if name != 'clock_action' else 3)
+                self.assertLessEqual(large_results[name]['queries'], budget)
+                self.assertEqual(large_results[name]['queries'], small_results[name]['queries'])
+
+        # 環境変数で指定した場合は計測結果を保存
+        output = os.environ.get('ATTENDANCE_BENCHMARK_OUTPUT')
+        if output:
+            benchmark.write_results(output, [(small, list(small_results.values())), (large, list(large_results.values()))])
+
+
+class PunchTests(TestCase):
+    """打刻の状態遷移と二重打刻"""
+
+    day = date(2025, 1, 15)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('taro', first_name='太郎', last_name='山田')
+
+    def _record(self):
+        return AttendanceRecord.objects.get(user=self.user, date=self.day)
+
+    def test_full_day(self):
+        for action, hour in [('clock_in', 9), ('break_start', 12), ('break_end', 13), ('clock_out', 18)]:
+            with self.subTest(action=action):
+                self.assertTrue(punch(self.user, action, now=_at(self.day, hour)).success)
+
+        record = self._record()
+        self.assertEqual(record.clock_in_time, time(9))
+        self.assertEqual(record.clock_out_time, time(18))
+        self.assertEqual(record.total_break_time, timedelta(hours=1))
+        self.assertEqual(record.total_work_time, timedelta(hours=8))
+        self.assertEqual(ClockEvent.objects.filter(user=self.user).count(), 4)
+
+    def test_double_clock_in_is_rejected_without_writing(self):
+        punch(self.user, 'clock_in', now=_at(self.day, 9))
+        updated_at = self._record().updated_at
+
+        result = punch(self.user, 'clock_in', now=_at(self.day, 9, 5))
+        self.assertFalse(result.success)
+        self.assertIn('既に出勤しています', result.message)
+        self.assertEqual(self._record().clock_in_time, time(9))
+        self.assertEqual(self._record().updated_at, updated_at)
+        self.assertEqual(ClockEvent.objects.filter(user=self.user).count(), 1)
+
+    def test_double_clock_out_is_rejected(self):
+        punch(self.user, 'clock_in', now=_at(self.day, 9))
+        punch(self.user, 'clock_out', now=_at(self.day, 18))
+
+        result = punch(self.user, 'clock_out', now=_at(self.day, 19))
+        self.assertFalse(result.success)
+        self.assertIn('既に退勤しています', result.message)
+        self.assertEqual(self._record().clock_out_time, time(18))
+
+    def test_clock_in_after_clock_out_reopens(self):
+        punch(self.user, 'clock_in', now=_at(self.day, 9))
+        punch(self.user, 'clock_out', now=_at(self.day, 18))
+
+        self.assertTrue(punch(self.user, 'clock_in', now=_at(self.day, 19)).success)
+        record = self._record()
+        self.assertEqual(record.clock_in_time, time(9))
+        self.assertIsNone(record.clock_out_time)
+
+    def test_rejected_without_record(self):
+        for action, message in [('clock_out', '出勤時刻が記録されていません。'), ('break_end', '休憩中ではありません。')]:
+            with self.subTest(action=action):
+                result = punch(self.user, action, now=_at(self.day, 9))
+                self.assertFalse(result.success)
+                self.assertEqual(result.message, message)
+        self.assertFalse(AttendanceRecord.objects.filter(user=self.user).exists())
+        self.assertFalse(ClockEvent.objects.exists())
+
+
+class ProjectionTests(TestCase):
+    """打刻イベントの一括登録と勤怠記録への射影"""
+
+    day = date(2025, 1, 15)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('hanako')
+
+    def test_ingest_builds_record(self):
+        events = [_event(self.user, 'clock_in', _at(self.day, 9)), _event(self.user, 'clock_out', _at(self.day, 18))]
+        self.assertEqual(projection.ingest(events), 1)
+
+        record = AttendanceRecord.objects.get(user=self.user, date=self.day)
+        self.assertEqual((record.clock_in_time, record.clock_out_time), (time(9), time(18)))
+
+    def test_resent_events_are_ignored(self):
+        projection.ingest([_event(self.user, 'clock_in', _at(self.day, 9))])
+        projection.ingest([_event(self.user, 'clock_in', _at(self.day, 9))])
+
+        self.assertEqual(ClockEvent.objects.filter(user=self.user).count(), 1)
+        self.assertEqual(AttendanceRecord.objects.get(user=self.user, date=self.day).clock_in_time, time(9))
+
+    def test_late_event_keeps_imported_fields(self):
+        AttendanceRecord.objects.create(
+            user=self.user, date=self.day,
+            clock_in_time=time(8, 30), break_start_time=time(12), break_end_time=time(13),
+        )
+        projection.ingest([_event(self.user, 'clock_out', _at(self.day, 17, 30))])
+
+        record = AttendanceRecord.objects.get(user=self.user, date=self.day)
+        self.assertEqual(record.clock_in_time, time(8, 30))
+        self.assertEqual((record.break_start_time, record.break_end_time), (time(12), time(13)))
+        self.assertEqual(record.clock_out_time, time(17, 30))
+
+    def test_replay_matches_punch(self):
+        actions = [('clock_in', 9), ('break_start', 12), ('break_end', 13), ('clock_out', 18)]
+        for action, hour in actions:
+            punch(self.user, action, now=_at(self.day, hour))
+        punched = AttendanceRecord.objects.get(user=self.user, date=self.day)
+
+        replayed = projection.replay(AttendanceRecord(), ClockEvent.objects.filter(user=self.user))
+        for name in projection.CLOCK_FIELDS:
+            self.assertEqual(getattr(replayed, name), getattr(punched, name))
+
+    def test_rebuild_leaves_records_without_events(self):
+        AttendanceRecord.objects.create(user=self.user, date=self.day, clock_in_time=time(8))
+        self.assertEqual(projection.rebuild_records([(self.user.pk, self.day)]), 0)
+        self.assertEqual(AttendanceRecord.objects.get(user=self.user, date=self.day).clock_in_time, time(8))
+
+
+class KioskTests(TestCase):
+    """打刻端末の本人確認と失敗回数の制限"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('kiosk', password='password')
+        credential = KioskCredential(user=self.user)
+        credential.set_pin('1234')
+        credential.save()
+
+    @override_settings(ATTENDANCE_KIOSK_MAX_ATTEMPTS=3)
+    def test_lockout_after_max_attempts(self):
+        for _ in range(3):
+            self.assertFalse(kiosk.authenticate(self.user, '0000'))
+        with self.assertRaises(kiosk.TooManyAttempts):
+            kiosk.authenticate(self.user, '1234')
+
+    @override_settings(ATTENDANCE_KIOSK_MAX_ATTEMPTS=3)
+    def test_success_resets_attempts(self):
+        for _ in range(2):
+            kiosk.authenticate(self.user, '0000')
+        self.assertTrue(kiosk.authenticate(self.user, '1234'))
+        for _ in range(2):
+            kiosk.authenticate(self.user, '0000')
+        self.assertTrue(kiosk.authenticate(self.user, '1234'))
+
+    def test_pin_takes_precedence_over_password(self):
+        self.assertTrue(kiosk.authenticate(self.user, '1234'))
+        self.assertFalse(kiosk.authenticate(self.user, 'password'))
+
+
+class ArchiveTests(TestCase):
+    """アーカイブとレポートの併合"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('archived')
+        self.cutoff = date(2025, 2, 1)
+        for day in (date(2025, 1, 30), date(2025, 1, 31), date(2025, 2, 1), date(2025, 2, 2)):
+            AttendanceRecord.objects.create(
+                user=self.user, date=day, clock_in_time=time(9), clock_out_time=time(17, day.day % 3),
+            )
+
+    def _report(self):
+        report_filter = ReportFilter(QueryDict('start_date=2025-01-01&end_date=2025-02-28'))
+        return list(report_filter.rows('csv')), _summarize_records(report_filter.base_querysets())
+
+    def test_report_is_unchanged_by_archiving(self):
+        rows, totals = self._report()
+        self.assertFalse(archive.includes(date(2025, 1, 1)))
+
+        self.assertEqual(archive.archive(self.cutoff, batch_size=1), 2)
+        self.assertEqual(ArchivedAttendanceRecord.objects.count(), 2)
+        self.assertFalse(AttendanceRecord.objects.filter(date__lt=self.cutoff).exists())
+        self.assertTrue(archive.includes(date(2025, 1, 1)))
+        self.assertFalse(archive.includes(self.cutoff))
+
+        self.assertEqual(self._report(), (rows, totals))
+
+    def test_archiving_keeps_monthly_summary(self):
+        before = list(MonthlyAttendanceSummary.objects.values_list('month', 'record_count', 'total_work_time'))
+        archive.archive(self.cutoff)
+        after = list(MonthlyAttendanceSummary.objects.values_list('month', 'record_count', 'total_work_time'))
+        self.assertEqual(after, before)
+
+    def test_current_month_is_not_archived(self):
+        with self.assertRaises(ValueError):
+            archive.archive(archive.current_month_start() + timedelta(days=31))
+
+    def test_late_event_restores_archived_record(self):
+        archive.archive(self.cutoff)
+        projection.ingest([_event(self.user, 'clock_out', _at(date(2025, 1, 31), 19))])
+
+        record = AttendanceRecord.objects.get(user=self.user, date=date(2025, 1, 31))
+        self.assertEqual((record.clock_in_time, record.clock_out_time), (time(9), time(19)))
+        self.assertFalse(ArchivedAttendanceRecord.objects.filter(date=date(2025, 1, 31)).exists())
+
+
+class ImporterTests(TestCase):
+    """CSV の取り込みとチェックポイントからの再開"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('imported')
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+        self.path = os.path.join(self.directory.name, 'records.csv')
+        self.checkpoint_path = os.path.join(self.directory.name, 'records.checkpoint')
+        with open(self.path, 'w', encoding='utf-8') as f:
+            f.write('username,date,clock_in,clock_out,break_start,break_end\n')
+            for day in range(1, 5):
+                f.write(f'imported,2025-01-{day:02d},09:00,18:00,12:00,13:00\n')
+            f.write('unknown,2025-01-05,09:00,18:00,,\n')
+
+    def test_resume_from_checkpoint(self):
+        def interrupt(result):
+            raise KeyboardInterrupt
+
+        with self.assertRaises(KeyboardInterrupt):
+            importer.import_csv(self.path, self.checkpoint_path, batch_size=2, progress=interrupt)
+        self.assertEqual(importer.Checkpoint(self.checkpoint_path, self.path).load(), 2)
+        self.assertEqual(AttendanceRecord.objects.count(), 2)
+
+        result = importer.import_csv(self.path, self.checkpoint_path, batch_size=2)
+        self.assertEqual(result.resumed_from, 2)
+        self.assertEqual((result.rows, result.imported, result.skipped), (5, 2, 1))
+        self.assertIn('unknown', result.errors[0])
+        self.assertFalse(os.path.exists(self.checkpoint_path))
+
+        self.assertEqual(AttendanceRecord.objects.filter(user=self.user).count(), 4)
+        record = AttendanceRecord.objects.get(user=self.user, date=date(2025, 1, 4))
+        self.assertEqual(record.total_work_time, timedelta(hours=8))
+        self.assertEqual(MonthlyAttendanceSummary.objects.get(user=self.user).record_count, 4)
+
+    def test_summaries_refreshed_per_batch(self):
+        other = User.objects.create_user('untouched')
+        AttendanceRecord.objects.create(user=other, date=date(2024, 12, 2), clock_in_time=time(9), clock_out_time=time(17))
+
+        def interrupt(result):
+            raise KeyboardInterrupt
+
+        with patch('attendance.summary.rebuild') as rebuild, self.assertRaises(KeyboardInterrupt):
+            importer.import_csv(self.path, self.checkpoint_path, batch_size=2, progress=interrupt)
+        rebuild.assert_not_called()
+
+        # 確定済みのバッチの月は集計済み、取り込みと関係のない集計はそのまま
+        imported = MonthlyAttendanceSummary.objects.get(user=self.user, month=date(2025, 1, 1))
+        self.assertEqual((imported.record_count, imported.total_work_time), (2, timedelta(hours=16)))
+        self.assertEqual(MonthlyAttendanceSummary.objects.get(user=other).record_count, 1)
+
+    def test_checkpoint_of_other_file_is_ignored(self):
+        importer.Checkpoint(self.checkpoint_path, os.path.join(self.directory.name, 'other.csv')).save(3)
+        result = importer.import_csv(self.path, self.checkpoint_path)
+        self.assertEqual((result.resumed_from, result.imported), (0, 4))
+
+    def test_reimport_is_idempotent(self):
+        importer.import_csv(self.path)
+        importer.import_csv(self.path)
+        self.assertEqual(AttendanceRecord.objects.filter(user=self.user).count(), 4)
+
+
+class ReportFilterTests(TestCase):
+    """レポートの検索条件の検証"""
+
+    def _filter(self, querystring):
+        return ReportFilter(QueryDict(querystring))
+
+    def test_default_range(self):
+        report_filter = self._filter('')
+        self.assertTrue(report_filter.is_valid())
+        self.assertEqual(report_filter.end_date, timezone.localdate())
+        self.assertEqual(report_filter.start_date, timezone.localdate() - timedelta(days=30))
+
+    def test_start_after_end(self):
+        report_filter = self._filter('start_date=2025-02-01&end_date=2025-01-01')
+        self.assertFalse(report_filter.is_valid())
+        self.assertTrue(report_filter.form.has_error(NON_FIELD_ERRORS, 'invalid_range'))
+        self.assertEqual(report_filter.querystring(), '')
+        self.assertFalse(report_filter.base_queryset().exists())
+
+    def test_range_too_long(self):
+        report_filter = self._filter('start_date=2024-01-01&end_date=2025-01-31')
+        self.assertFalse(report_filter.is_valid())
+        self.assertTrue(report_filter.form.has_error(NON_FIELD_ERRORS, 'range_too_long'))
+
+    def test_unknown_team(self):
+        report_filter = self._filter('team=999')
+        self.assertFalse(report_filter.is_valid())
+        self.assertTrue(report_filter.form.has_error('team'))
+        self.assertTrue(report_filter.errors[0].startswith('チーム: '))
+
+    def test_querystring_is_normalized(self):
+        report_filter = self._filter('end_date=2025-01-31&page=3&start_date=2025-01-01')
+        self.assertTrue(report_filter.is_valid())
+        self.assertEqual(report_filter.querystring(), 'start_date=2025-01-01&end_date=2025-01-31')
+
+
+class MonthlySummaryTests(TestCase):
+    """月次集計と勤怠記録の合計の一致"""
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f'summary{index}') for index in range(2)]
+
+    def _assert_matches_records(self):
+        expected = {}
+        for record in AttendanceRecord.objects.all():
+            key = (record.user_id, summary.month_start(record.date))
+            totals = expected.setdefault(key, [0, 0, timedelta(0), timedelta(0)])
+            totals[0] += 1
+            totals[1] += record.clock_in_time is not None
+            totals[2] += record.total_work_time or timedelta(0)
+            totals[3] += record.total_break_time or timedelta(0)
+
+        actual = {
+            (row.user_id, row.month): [row.record_count, row.days_worked, row.total_work_time, row.total_break_time]
+            for row in MonthlyAttendanceSummary.objects.all()
+        }
+        self.assertEqual(actual, expected)
+
+    def test_summary_follows_record_changes(self):
+        first, second = self.users
+        AttendanceRecord.objects.create(user=first, date=date(2025, 1, 31), clock_in_time=time(9), clock_out_time=time(18))
+        AttendanceRecord.objects.create(
+            user=first, date=date(2025, 2, 1), clock_in_time=time(9), clock_out_time=time(18),
+            break_start_time=time(12), break_end_time=time(12, 45),
+        )
+        removed = AttendanceRecord.objects.create(user=second, date=date(2025, 2, 3), clock_in_time=time(10))
+        AttendanceRecord.objects.create(user=second, date=date(2025, 3, 3))
+        self._assert_matches_records()
+
+        record = AttendanceRecord.objects.get(user=first, date=date(2025, 1, 31))
+        record.clock_out_time = time(20)
+        record.save()
+        removed.delete()
+        punch(second, 'clock_in', now=_at(date(2025, 3, 4), 9))
+        punch(second, 'clock_out', now=_at(date(2025, 3, 4), 15))
+        self._assert_matches_records()
+        self.assertFalse(MonthlyAttendanceSummary.objects.filter(user=second, month=date(2025, 2, 1)).exists())
+
+        fields = ['user_id', 'month', *(name for name in summary.SUMMARY_FIELDS if name != 'updated_at')]
+        rows = list(MonthlyAttendanceSummary.objects.order_by('user_id', 'month').values(*fields))
+        summary.rebuild()
+        self.assertEqual(list(MonthlyAttendanceSummary.objects.order_by('user_id', 'month').values(*fields)), rows)
+
+    def test_whole_month_report_matches_records(self):
+        for day in range(1, 6):
+            for user in self.users:
+                AttendanceRecord.objects.create(
+                    user=user, date=date(2025, 1, day), clock_in_time=time(9), clock_out_time=time(17, day * 7),
+                    break_start_time=time(12), break_end_time=time(12, 30),
+                )
+
+        report_filter = ReportFilter(QueryDict('start_date=2025-01-01&end_date=2025-01-31'))
+        self.assertTrue(report_filter.covers_whole_months())
+        self.assertEqual(
+            _summarize_months(report_filter.monthly_summaries()),
+            _summarize_records(report_filter.base_querysets()),
+        )
+
+
+class CsvExportTests(TestCase):
+    """CSV エクスポートのストリーミング"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('csv', first_name='花子', last_name='佐藤')
+        for day in range(1, 6):
+            AttendanceRecord.objects.create(
+                user=self.user, date=date(2025, 1, day), clock_in_time=time(9), clock_out_time=time(18) if day != 5 else None,
+            )
+
+    def _export(self, querystring='start_date=2025-01-01&end_date=2025-01-31'):
+        return self.client.get(f'/reports/export/csv/?{querystring}')
+
+    def test_streams_rows_with_single_bom(self):
+        with patch('attendance.views.CSV_EXPORT_CHUNK_ROWS', 2):
+            response = self._export()
+            self.assertTrue(response.streaming)
+            chunks = list(response.streaming_content)
+
+        # BOM・見出し・2行ずつの3チャンク
+        self.assertEqual(chunks[0], '\ufeff'.encode('utf-8'))
+        self.assertEqual(len(chunks), 5)
+        content = b''.join(chunks).decode('utf-8')
+        self.assertEqual(content.count('\ufeff'), 1)
+
+        lines = content.lstrip('\ufeff').splitlines()
+        self.assertEqual(lines[0].split(',')[:3], ['ユーザー', 'ユーザー名', '日付'])
+        self.assertEqual(len(lines), 6)
+        self.assertEqual(lines[1], '花子 佐藤,csv,2025-01-05,09:00:00,-,-,-,-,-')
+        self.assertEqual(lines[2], '花子 佐藤,csv,2025-01-04,09:00:00,18:00:00,-,-,09:00,-')
+
+    def test_invalid_filter(self):
+        response = self._export('start_date=2025-02-01&end_date=2025-01-01')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('開始日は終了日以前', response.content.decode('utf-8'))
+
+
+class PdfReportTests(TestCase):
+    """PDF レポートのページ分割"""
+
+    def _tables(self, count):
+        rows = ([f'user{index}', 'name', '2025-01-01', '09:00', '18:00', '9:00'] for index in range(count))
+        return list(pdf._iter_tables(rows, pdf.setup()))
+
+    def test_rows_are_split_into_pages(self):
+        count = pdf.FIRST_PAGE_ROWS + pdf.ROWS_PER_PAGE + 1
+        elements = self._tables(count)
+
+        tables = [element for element in elements if isinstance(element, Table)]
+        self.assertEqual([len(table._cellvalues) - 1 for table in tables], [pdf.FIRST_PAGE_ROWS, pdf.ROWS_PER_PAGE, 1])
+        self.assertEqual(sum(isinstance(element, PageBreak) for element in elements), 2)
+        for table in tables:
+            self.assertEqual(table._cellvalues[0], pdf.TABLE_HEADER)
+
+    def test_empty_report_has_header(self):
+        elements = self._tables(0)
+        self.assertEqual(len(elements), 1)
+        self.assertEqual(elements[0]._cellvalues, [pdf.TABLE_HEADER])
+
+    def test_export_is_not_truncated(self):
+        user = User.objects.create_user('pdf')
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(user=user, date=date(2025, 1, 1) + timedelta(days=day), clock_in_time=time(9))
+            for day in range(pdf.FIRST_PAGE_ROWS + 10)
+        ])
+
+        response = self.client.get('/reports/export/pdf/?start_date=2025-01-01&end_date=2025-03-31')
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response.content.startswith(b'%PDF'))
+        self.assertEqual(response.content.count(b'/Type /Page\n'), 2)
+
+
+class ReportPaginationTests(TestCase):
+    """レポート画面のキーセットページネーション"""
+
+    def setUp(self):
+        cache.clear()
+        users = [User.objects.create_user(f'page{index}') for index in range(3)]
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(user=user, date=date(2025, 1, 1) + timedelta(days=day), clock_in_time=time(9), clock_out_time=time(17))
+            for day in range(40)
+            for user in users
+        ])
+        summary.rebuild()
+        self.expected = list(AttendanceRecord.objects.order_by('-date', 'user_id').values_list('date', 'user_id'))
+
+    def _page(self, **params):
+        response = self.client.get('/reports/', {'start_date': '2025-01-01', 'end_date': '2025-02-28', **params})
+        self.assertEqual(response.status_code, 200)
+        return response.context
+
+    def _keys(self, context):
+        return [(record.date, record.user_id) for record in context['records']]
+
+    def test_pages_follow_cursors(self):
+        pages, params = [], {}
+        while True:
+            context = self._page(**params)
+            pages.append((params, self._keys(context)))
+            # 合計は表示中のページではなく期間全体
+            self.assertEqual(context['summary']['record_count'], 120)
+            if not context['page']['has_next']:
+                break
+            params = {'after': context['page']['next_cursor']}
+
+        self.assertEqual([len(keys) for _, keys in pages], [50, 50, 20])
+        self.assertEqual([key for _, keys in pages for key in keys], self.expected)
+
+        # 最後のページから前のページへ戻る
+        context = self._page(before=self._page(**pages[2][0])['page']['prev_cursor'])
+        self.assertEqual(self._keys(context), pages[1][1])
+        self.assertTrue(context['page']['has_prev'])
+        self.assertTrue(context['page']['has_next'])
+
+    def test_invalid_cursor_starts_from_first_page(self):
+        context = self._page(after='not-a-cursor')
+        self.assertEqual(self._keys(context), self.expected[:50])
+        self.assertFalse(context['page']['has_prev'])
+
+
+class DashboardSnapshotTests(TestCase):
+    """ダッシュボードのスナップショットのキャッシュと無効化"""
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.user = User.objects.create_user('snapshot')
+
+    def _status(self, snapshot):
+        return {item['user_id']: item['status_code'] for item in snapshot['user_attendance_list']}[self.user.pk]
+
+    def test_snapshot_is_cached(self):
+        with self.assertNumQueries(1):
+            first = dashboard.get_snapshot(self.today)
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard.get_snapshot(self.today), first)
+
+    def test_punch_invalidates_after_commit(self):
+        before = dashboard.get_snapshot(self.today)
+        self.assertEqual(self._status(before), STATUS_NOT_CLOCKED)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            punch(self.user, 'clock_in')
+            # コミット前は無効化しない（コミット前のデータで作り直さない）
+            self.assertEqual(dashboard.get_snapshot(self.today)['version'], before['version'])
+
+        after = dashboard.get_snapshot(self.today)
+        self.assertEqual(self._status(after), STATUS_CLOCKED_IN)
+        self.assertNotEqual(after['version'], before['version'])
+
+    def test_invalidation_covers_teams(self):
+        team = Team.objects.create(name='開発')
+        TeamMembership.objects.create(team=team, user=self.user)
+        dashboard.get_snapshot(self.today, team.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            punch(self.user, 'clock_in')
+        self.assertEqual(self._status(dashboard.get_snapshot(self.today, team.pk)), STATUS_CLOCKED_IN)
+
+    def test_rebuilt_snapshot_keeps_version(self):
+        version = dashboard.get_snapshot(self.today)['version']
+        with self.captureOnCommitCallbacks(execute=True):
+            dashboard.invalidate(self.today)
+        self.assertEqual(dashboard.get_snapshot(self.today)['version'], version)
+
+
+class DashboardCounterTests(TestCase):
+    """ダッシュボードの行と統計情報（ウィンドウ関数）の1クエリでの集計"""
+
+    def setUp(self):
+        self.today = timezone.now().date()
+        states = {
+            'not_clocked': {},
+            'on_break': {'clock_in_time': time(9), 'break_start_time': time(12)},
+            'clocked_in': {'clock_in_time': time(9), 'break_start_time': time(12), 'break_end_time': time(13)},
+            'clocked_out': {'clock_in_time': time(9), 'clock_out_time': time(18)},
+        }
+        self.users = {}
+        for name, fields in states.items():
+            self.users[name] = User.objects.create_user(name)
+            if fields:
+                AttendanceRecord.objects.create(user=self.users[name], date=self.today, **fields)
+        # 別の日の記録は数えない
+        AttendanceRecord.objects.create(user=self.users['not_clocked'], date=self.today - timedelta(days=1), clock_in_time=time(9))
+        User.objects.create_user('inactive', is_active=False)
+
+    def test_counters_in_one_query(self):
+        with self.assertNumQueries(1):
+            snapshot = dashboard.build_snapshot(self.today)
+
+        self.assertEqual(
+            {item['username']: item['status_code'] for item in snapshot['user_attendance_list']},
+            {name: name for name in self.users},
+        )
+        # 出勤中には休憩中も含む
+        self.assertEqual(
+            [snapshot[key] for key in dashboard.COUNTER_KEYS],
+            [2, 1, 1, 1],
+        )
+
+    def test_status_matches_record(self):
+        records = AttendanceRecord.objects.filter(date=self.today).select_related('user')
+        snapshot = dashboard.build_snapshot(self.today)
+        status_codes = {item['user_id']: item['status_code'] for item in snapshot['user_attendance_list']}
+        for record in records:
+            with self.subTest(user=record.user.username):
+                self.assertEqual(status_codes[record.user_id], record.get_status_code())
+
+    def test_team_counters(self):
+        team = Team.objects.create(name='営業')
+        TeamMembership.objects.create(team=team, user=self.users['on_break'])
+        TeamMembership.objects.create(team=team, user=self.users['not_clocked'])
+
+        snapshot = dashboard.build_snapshot(self.today, team.pk)
+        self.assertEqual(len(snapshot['user_attendance_list']), 2)
+        self.assertEqual([snapshot[key] for key in dashboard.COUNTER_KEYS], [1, 1, 0, 1])
+
+    def test_empty_team(self):
+        team = Team.objects.create(name='総務')
+        snapshot = dashboard.build_snapshot(self.today, team.pk)
+        self.assertEqual([snapshot[key] for key in dashboard.COUNTER_KEYS], [0, 0, 0, 0])
+
+
+class DashboardStreamTests(TestCase):
+    """ダッシュボードの更新配信（ASGI の場合のみ）"""
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.user = User.objects.create_user('stream')
+
+    def test_disabled_under_wsgi(self):
+        response = self.client.get('/dashboard/')
+        self.assertFalse(response.context['stream_enabled'])
+        self.assertNotContains(response, 'data-stream-url')
+        self.assertContains(response, f'data-poll-seconds="{views.DASHBOARD_POLL_SECONDS}"')
+        self.assertEqual(self.client.get('/dashboard/stream/').status_code, 204)
+
+    async def test_enabled_under_asgi(self):
+        response = await self.async_client.get('/dashboard/')
+        self.assertTrue(response.context['stream_enabled'])
+        self.assertContains(response, 'data-stream-url="/dashboard/stream/"')
+
+        response = await self.async_client.get('/dashboard/stream/')
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        await stream.aclose()
+
+    async def test_punch_in_other_process_is_streamed(self):
+        stream = views._iter_dashboard_events(self.today)
+        self.assertEqual(await anext(stream), 'retry: 3000\n\n')
+
+        # 他のプロセスでの打刻（このプロセスへの配信はなく、共有キャッシュの世代のみ更新される）
+        def punch_elsewhere():
+            with patch('attendance.events.has_subscribers', return_value=False):
+                with self.captureOnCommitCallbacks(execute=True):
+                    punch(self.user, 'clock_in')
+
+        await sync_to_async(punch_elsewhere)()
+        with patch('attendance.views.DASHBOARD_STREAM_SYNC_SECONDS', 0.01):
+            message = await anext(stream)
+        await stream.aclose()
+
+        self.assertTrue(message.startswith('event: status\n'))
+        delta = json.loads(message.split('data: ', 1)[1])
+        self.assertEqual((delta['user_id'], delta['status_code']), (self.user.pk, STATUS_CLOCKED_IN))
+        self.assertEqual(delta['counters']['total_clocked_in'], 1)
+
+    def test_changed_deltas(self):
+        previous = dashboard.build_snapshot(self.today)
+        self.assertEqual(dashboard.changed_deltas(previous, dashboard.build_snapshot(self.today)), [])
+
+        other = User.objects.create_user('other')
+        AttendanceRecord.objects.create(user=other, date=self.today, clock_in_time=time(9))
+        latest = dashboard.build_snapshot(self.today)
+        self.assertEqual([delta['user_id'] for delta in dashboard.changed_deltas(previous, latest)], [other.pk])
+
+        # 一覧から外れたユーザーは差分で表せない
+        other.is_active = False
+        other.save()
+        self.assertIsNone(dashboard.changed_deltas(latest, dashboard.build_snapshot(self.today)))
+
+
+class ProjectionCorrectionTests(TestCase):
+    """遅れて届いた打刻で管理画面での修正を上書きしないこと"""
+
+    day = date(2025, 1, 15)
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('corrected')
+        projection.ingest([_event(self.user, 'clock_in', _at(self.day, 9)), _event(self.user, 'break_start', _at(self.day, 12))])
+
+        # 管理画面で出勤時刻と休憩開始時刻を修正
+        record = AttendanceRecord.objects.get(user=self.user, date=self.day)
+        record.clock_in_time = time(8, 45)
+        record.break_start_time = time(11, 50)
+        record.save()
+
+    def _record(self):
+        return AttendanceRecord.objects.get(user=self.user, date=self.day)
+
+    def test_late_event_keeps_corrections(self):
+        projection.ingest([_event(self.user, 'break_end', _at(self.day, 13)), _event(self.user, 'clock_out', _at(self.day, 18))])
+
+        record = self._record()
+        self.assertEqual((record.clock_in_time, record.break_start_time), (time(8, 45), time(11, 50)))
+        self.assertEqual((record.break_end_time, record.clock_out_time), (time(13), time(18)))
+
+    def test_resent_events_change_nothing(self):
+        updated_at = self._record().updated_at
+        self.assertEqual(projection.ingest([_event(self.user, 'clock_in', _at(self.day, 9))]), 0)
+        self.assertEqual(self._record().clock_in_time, time(8, 45))
+        self.assertEqual(self._record().updated_at, updated_at)
+
+    def test_new_event_overrides_its_own_field(self):
+        # 退勤後の出勤は退勤時刻をクリアする（新しいイベントで値が変わる列のみ）
+        projection.ingest([_event(self.user, 'clock_out', _at(self.day, 17)), _event(self.user, 'clock_in', _at(self.day, 19))])
+
+        record = self._record()
+        self.assertEqual(record.clock_in_time, time(8, 45))
+        self.assertIsNone(record.clock_out_time)
+
+    def test_full_rebuild_applies_all_events(self):
+        projection.rebuild_records([(self.user.pk, self.day)])
+        self.assertEqual((self._record().clock_in_time, self._record().break_start_time), (time(9), time(12)))
+
+
+class PunchApiTests(TestCase):
+    """打刻 API（セッション・CSRF トークンなしの1リクエストでの打刻）"""
+
+    def setUp(self):
+        cache.clear()
+        self.client = Client(enforce_csrf_checks=True)
+        self.user = User.objects.create_user('api', password='password', first_name='一郎')
+        credential = KioskCredential(user=self.user)
+        credential.set_pin('2468')
+        credential.save()
+
+    def _post(self, **data):
+        return self.client.post('/api/punch/', json.dumps(data), content_type='application/json')
+
+    def test_punch_without_session_or_csrf_cookie(self):
+        response = self._post(user=self.user.pk, password='2468', action='clock_in')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('csrftoken', self.client.cookies)
+
+        payload = response.json()
+        self.assertTrue(payload['success'])
+        self.assertEqual(payload['status_code'], STATUS_CLOCKED_IN)
+        self.assertTrue(AttendanceRecord.objects.filter(user=self.user).exists())
+        self.assertEqual(ClockEvent.objects.get(user=self.user).source, 'api')
+
+    def test_double_punch_is_reported(self):
+        self._post(user=self.user.pk, password='2468', action='clock_in')
+        payload = self._post(user=self.user.pk, password='2468', action='clock_in').json()
+        self.assertFalse(payload['success'])
+        self.assertIn('既に出勤しています', payload['message'])
+
+    def test_wrong_pin(self):
+        response = self._post(user=self.user.pk, password='0000', action='clock_in')
+        self.assertEqual(response.status_code, 401)
+        self.assertFalse(AttendanceRecord.objects.exists())
+
+    @override_settings(ATTENDANCE_KIOSK_MAX_ATTEMPTS=2)
+    def test_lockout(self):
+        for _ in range(2):
+            self._post(user=self.user.pk, password='0000', action='clock_in')
+        self.assertEqual(self._post(user=self.user.pk, password='2468', action='clock_in').status_code, 429)
+
+    def test_malformed_request(self):
+        response = self.client.post('/api/punch/', '[1, 2]', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(self._post(user=self.user.pk, password='2468', action='lunch').status_code, 400)
+        self.assertEqual(self.client.get('/api/punch/').status_code, 405)
+
+
+class UserSearchTests(TestCase):
+    """ユーザー一覧のキャッシュと前方一致検索"""
+
+    def setUp(self):
+        cache.clear()
+        for index in range(120):
+            User.objects.create_user(f'member{index:03d}', first_name='太郎', last_name=f'社員{index:03d}')
+        User.objects.create_user('yamada', first_name='Ｈａｎａｋｏ', last_name='山田')
+        User.objects.create_user('retired', is_active=False)
+
+    def _search(self, **params):
+        return self.client.get('/api/users/', params).json()['results']
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self._search(q='member')), users.SEARCH_LIMIT)
+        self.assertEqual(len(self._search(q='member', limit='1000')), users.SEARCH_MAX_LIMIT)
+        self.assertEqual(len(self._search(q='member', limit='-1')), 1)
+        self.assertEqual(len(self._search(q='member', limit='0')), 1)
+        self.assertEqual(len(self._search(q='member', limit='many')), users.SEARCH_LIMIT)
+
+    def test_prefix_search(self):
+        self.assertEqual([user['username'] for user in self._search(q='hanako')], ['yamada'])
+        self.assertEqual([user['username'] for user in self._search(q='山田')], ['yamada'])
+        self.assertEqual([user['username'] for user in self._search(q='member11', limit='100')], [f'member{index}' for index in range(110, 120)])
+        self.assertEqual(self._search(q='retired'), [])
+
+    def test_version_changes_only_on_commit(self):
+        version = users.version()
+        self.assertEqual(users.version(), version)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            User.objects.create_user('newcomer')
+            self.assertEqual(users.version(), version)
+        self.assertNotEqual(users.version(), version)
+        self.assertEqual([user['username'] for user in users.search('newcomer')], ['newcomer'])
+
+    def test_cached_list_needs_no_queries(self):
+        user_id = User.objects.get(username='yamada').pk
+        users.active_users()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(users.search('member')), users.SEARCH_LIMIT)
+            self.assertEqual(users.get(user_id)['full_name'], 'Ｈａｎａｋｏ 山田')
+
+
+class RequestTimingTests(TestCase):
+    """リクエストの計測（Server-Timing・低速リクエストのログ・ビューごとの百分位数）"""
+
+    def setUp(self):
+        cache.clear()
+        instrumentation.metrics.clear()
+        user = User.objects.create_user('timed')
+        AttendanceRecord.objects.create(user=user, date=date(2025, 1, 6), clock_in_time=time(9), clock_out_time=time(18))
+
+    def _server_timing(self, response):
+        entries = {}
+        for entry in response['Server-Timing'].split(', '):
+            name, *params = entry.split(';')
+            entries[name] = dict(param.split('=', 1) for param in params)
+        return entries
+
+    def _queries(self, response):
+        return int(self._server_timing(response)['db']['desc'].strip('"').split()[0])
+
+    def test_sync_request(self):
+        with CaptureQueriesContext(connection) as captured:
+            response = self.client.get('/reports/?start_date=2025-01-01&end_date=2025-01-31')
+        timings = self._server_timing(response)
+        self.assertEqual(self._queries(response), len(captured))
+        self.assertGreater(float(timings['db']['dur']), 0)
+        self.assertIn('template', timings)
+        self.assertIn('total', timings)
+
+    async def test_async_request_counts_queries(self):
+        # ASGI では同期ビューは別スレッドで実行される
+        response = await self.async_client.get('/reports/?start_date=2025-01-01&end_date=2025-01-31')
+        self.assertGreater(self._queries(response), 0)
+        self.assertGreater(float(self._server_timing(response)['db']['dur']), 0)
+
+    @override_settings(ATTENDANCE_SLOW_REQUEST_MS=0)
+    def test_slow_request_log(self):
+        with self.assertLogs('attendance.slow_requests', 'WARNING') as logs:
+            self.client.get('/reports/?start_date=2025-01-01&end_date=2025-01-31')
+        entry = json.loads(logs.records[0].getMessage())
+        self.assertEqual((entry['view'], entry['status']), ('attendance:reports', 200))
+        self.assertGreater(entry['queries'], 0)
+
+    def test_metrics_for_staff_only(self):
+        self.client.get('/api/users/')
+        self.assertEqual(self.client.get('/metrics/').status_code, 302)
+
+        staff = User.objects.create_user('staff', is_staff=True)
+        self.client.force_login(staff)
+        views_metrics = self.client.get('/metrics/').json()['views']
+        self.assertEqual(views_metrics['attendance:user_search']['count'], 1)
+        self.assertEqual(set(views_metrics['attendance:user_search']['total_ms']), {'p50', 'p90', 'p99'})
+
+
+class AnalyticsTests(TestCase):
+    """残業・出勤時刻・遅刻・週あたりの労働時間の分析"""
+
+    def setUp(self):
+        cache.clear()
+        self.first = User.objects.create_user('first', first_name='A')
+        self.second = User.objects.create_user('second', first_name='B')
+        for user, day, clock_in, clock_out in [
+            (self.first, date(2025, 1, 6), time(8, 50), time(18, 50)),
+            (self.first, date(2025, 1, 7), time(9, 30), time(17, 30)),
+            (self.first, date(2025, 1, 8), time(9), None),
+            (self.first, date(2025, 1, 13), time(9, 10), time(17, 10)),
+            (self.second, date(2025, 1, 6), time(7), time(20)),
+        ]:
+            AttendanceRecord.objects.create(user=user, date=day, clock_in_time=clock_in, clock_out_time=clock_out)
+        AttendanceRecord.objects.filter(user=self.second).update(break_start_time=time(12), break_end_time=time(13))
+        # 出勤していない日は集計しない
+        AttendanceRecord.objects.create(user=self.second, date=date(2025, 1, 7))
+
+    def _analyze(self, querystring='start_date=2025-01-01&end_date=2025-01-31'):
+        return self.client.get(f'/reports/analytics/json/?{querystring}')
+
+    def test_per_user_totals(self):
+        result = self._analyze().json()
+        first, second = result['users']
+        self.assertEqual(
+            {key: first[key] for key in (
+                'username', 'days_worked', 'work_hours', 'overtime_hours', 'overtime_days', 'average_clock_in',
+                'late_count', 'late_rate', 'weeks_worked', 'weekly_hours_mean', 'weekly_hours_max', 'weekly_distribution',
+            )},
+            {
+                'username': 'first', 'days_worked': 4, 'work_hours': 26.0, 'overtime_hours': 2.0, 'overtime_days': 1,
+                'average_clock_in': '09:07', 'late_count': 2, 'late_rate': 0.5, 'weeks_worked': 2,
+                'weekly_hours_mean': 13.0, 'weekly_hours_max': 18.0, 'weekly_distribution': [2, 0, 0, 0, 0, 0],
+            },
+        )
+        self.assertEqual((second['work_hours'], second['overtime_hours'], second['late_count']), (12.0, 4.0, 0))
+        self.assertEqual(result['weekly_distribution'], [3, 0, 0, 0, 0, 0])
+
+    @override_settings(ATTENDANCE_LATE_AFTER='09:15', ATTENDANCE_STANDARD_DAILY_HOURS=7)
+    def test_settings(self):
+        first = self._analyze().json()['users'][0]
+        self.assertEqual((first['late_count'], first['overtime_days'], first['overtime_hours']), (1, 3, 5.0))
+
+    def test_filters_and_errors(self):
+        result = self._analyze(f'start_date=2025-01-01&end_date=2025-01-31&user={self.second.pk}').json()
+        self.assertEqual([row['username'] for row in result['users']], ['second'])
+        self.assertEqual(self._analyze('start_date=2024-12-01&end_date=2024-12-31').json()['users'], [])
+        self.assertEqual(self._analyze('start_date=2025-02-01&end_date=2025-01-01').status_code, 400)
+
+    def test_page(self):
+        response = self.client.get('/reports/analytics/?start_date=2025-01-01&end_date=2025-01-31')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.context['analytics']['users']), 2)
+
+
+class AdminTests(TestCase):
+    """管理画面の件数の推定と一括操作"""
+
+    changelist_url = '/admin/attendance/attendancerecord/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('worker')
+        for day in range(1, 11):
+            AttendanceRecord.objects.create(
+                user=self.user, date=date(2025, 1, day), clock_in_time=time(9), clock_out_time=time(18),
+                break_start_time=time(12), break_end_time=time(13),
+            )
+        self.client.force_login(User.objects.create_superuser('admin'))
+
+    @patch('attendance.admin.ESTIMATED_COUNT_THRESHOLD', 5)
+    def test_estimated_count_for_unfiltered_list(self):
+        AttendanceRecord.objects.filter(date=date(2025, 1, 5)).delete()
+
+        # 絞り込みがなければ推定値（rowid の範囲）、絞り込みがあれば COUNT(*)
+        self.assertEqual(EstimatedCountPaginator(AttendanceRecord.objects.all(), 5).count, 10)
+        self.assertEqual(EstimatedCountPaginator(AttendanceRecord.objects.filter(user=self.user), 5).count, 9)
+        with patch('attendance.admin.ESTIMATED_COUNT_THRESHOLD', 100):
+            self.assertEqual(EstimatedCountPaginator(AttendanceRecord.objects.all(), 5).count, 9)
+
+    def test_changelists(self):
+        response = self.client.get(self.changelist_url, {'user__id__exact': self.user.pk, 'date__year': 2025})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['cl'].result_count, 10)
+        self.assertEqual(self.client.get(self.changelist_url, {'user__id__exact': 'x'}).status_code, 302)
+        for model in ('clockevent', 'archivedattendancerecord', 'monthlyattendancesummary', 'team'):
+            with self.subTest(model=model):
+                self.assertEqual(self.client.get(f'/admin/attendance/{model}/').status_code, 200)
+
+    def _action(self, action, records):
+        return self.client.post(self.changelist_url, {
+            'action': action,
+            '_selected_action': [record.pk for record in records],
+        })
+
+    def test_clear_break(self):
+        records = list(AttendanceRecord.objects.filter(date__lte=date(2025, 1, 3)))
+        with self.captureOnCommitCallbacks(execute=True):
+            self._action('clear_break', records)
+
+        for record in AttendanceRecord.objects.filter(date__lte=date(2025, 1, 3)):
+            self.assertIsNone(record.break_start_time)
+            self.assertEqual((record.total_break_time, record.total_work_time), (timedelta(0), timedelta(hours=9)))
+        month = MonthlyAttendanceSummary.objects.get(user=self.user)
+        self.assertEqual(month.total_work_time, timedelta(hours=3 * 9 + 7 * 8))
+
+    def test_clear_clock_out(self):
+        record = AttendanceRecord.objects.get(date=date(2025, 1, 10))
+        self._action('clear_clock_out', [record])
+        record.refresh_from_db()
+        self.assertIsNone(record.clock_out_time)
+        self.assertIsNone(record.total_work_time)
+        self.assertEqual(MonthlyAttendanceSummary.objects.get(user=self.user).total_work_time, timedelta(hours=9 * 8))
+
+    def test_recalculate_summaries(self):
+        MonthlyAttendanceSummary.objects.filter(user=self.user).update(record_count=0, total_work_time=timedelta(0))
+        self._action('recalculate_summaries', AttendanceRecord.objects.filter(date=date(2025, 1, 1)))
+
+        month = MonthlyAttendanceSummary.objects.get(user=self.user)
+        self.assertEqual((month.record_count, month.total_work_time), (10, timedelta(hours=80)))
+
+
+class ArchiveBatchTests(TestCase):
+    """アーカイブのバッチがデータベースのパラメータ数の上限を超えないこと"""
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('batched')
+        AttendanceRecord.objects.bulk_create([
+            AttendanceRecord(user=self.user, date=date(2025, 1, 1) + timedelta(days=day), clock_in_time=time(9))
+            for day in range(10)
+        ])
+
+    def _deletes(self, captured, table):
+        return [query['sql'] for query in captured if query['sql'].startswith(f'DELETE FROM "{table}"')]
+
+    def test_deletes_are_chunked(self):
+        with patch.object(connection.features, 'max_query_params', 3):
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(archive.archive(date(2025, 2, 1)), 10)
+            self.assertEqual(len(self._deletes(captured, AttendanceRecord._meta.db_table)), 4)
+
+            with CaptureQueriesContext(connection) as captured:
+                self.assertEqual(archive.discard((self.user.pk, date(2025, 1, 1) + timedelta(days=day)) for day in range(10)), 10)
+            self.assertEqual(len(self._deletes(captured, ArchivedAttendanceRecord._meta.db_table)), 4)
+
+        self.assertFalse(AttendanceRecord.objects.exists())
+        self.assertFalse(ArchivedAttendanceRecord.objects.exists())
+
+
+class ArchiveMergeOrderTests(TestCase):
+    """稼働テーブルとアーカイブの同じ日付の行の併合順"""
+
+    day = date(2025, 1, 31)
+
+    def setUp(self):
+        cache.clear()
+        self.users = [User.objects.create_user(f'merged{index}') for index in range(3)]
+        for user in self.users:
+            AttendanceRecord.objects.create(user=user, date=self.day, clock_in_time=time(9), clock_out_time=time(17))
+            AttendanceRecord.objects.create(user=user, date=self.day - timedelta(days=1), clock_in_time=time(9))
+        archive.archive(date(2025, 2, 1))
+        # 遅れて届いた打刻で一部の記録だけ稼働テーブルへ戻る
+        projection.ingest([_event(self.users[2], 'clock_out', _at(self.day, 18))])
+        projection.ingest([_event(self.users[1], 'clock_out', _at(self.day - timedelta(days=1), 18))])
+
+    def test_rows_follow_date_and_user_order(self):
+        self.assertEqual(AttendanceRecord.objects.count(), 2)
+        report_filter = ReportFilter(QueryDict('start_date=2025-01-01&end_date=2025-01-31'))
+        for output in ('csv', 'pdf'):
+            with self.subTest(output=output):
+                username_index = filters.EXPORT_COLUMNS[output].index('user__username')
+                date_index = filters.EXPORT_COLUMNS[output].index('date')
+                rows = list(report_filter.rows(output))
+                self.assertEqual(len(rows[0]), len(filters.EXPORT_COLUMNS[output]))
+                self.assertEqual(
+                    [(row[date_index], row[username_index]) for row in rows],
+                    [(record_date, user.username) for record_date in (self.day, self.day - timedelta(days=1)) for user in self.users],
+                )
+
+
+class ExportJobTests(TestCase):
+    """バックグラウンドのエクスポート（ATTENDANCE_EXPORT_WORKERS=0 でその場で作成）"""
+
+    query = 'start_date=2025-01-01&end_date=2025-01-31'
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings_override = override_settings(ATTENDANCE_EXPORT_DIR=directory.name, ATTENDANCE_EXPORT_WORKERS=0)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.user = User.objects.create_user('exported')
+        for day in range(1, 4):
+            AttendanceRecord.objects.create(user=self.user, date=date(2025, 1, day), clock_in_time=time(9), clock_out_time=time(18))
+
+    def _submit(self, output='csv', query=None):
+        return self.client.post(f'/reports/export/{output}/jobs/?{query or self.query}')
+
+    def test_job_matches_direct_export(self):
+        response = self._submit()
+        self.assertEqual(response.status_code, 200)
+        job = response.json()
+        self.assertEqual((job['state'], job['rows'], job['total'], job['progress']), ('done', 3, 3, 1.0))
+        self.assertEqual(self.client.get(job['status_url']).json()['state'], 'done')
+
+        download = self.client.get(job['download_url'])
+        self.assertEqual(download['Content-Disposition'], 'attachment; filename="attendance_report.csv"')
+        direct = self.client.get(f'/reports/export/csv/?{self.query}')
+        self.assertEqual(b''.join(download.streaming_content), b''.join(direct.streaming_content))
+
+    def test_finished_job_is_reused_until_records_change(self):
+        first = self._submit().json()
+        with patch('attendance.exports.render') as render:
+            # 検索条件の順序が違っても同じジョブ
+            self.assertEqual(self._submit(query='end_date=2025-01-31&start_date=2025-01-01').json()['key'], first['key'])
+            render.assert_not_called()
+
+        AttendanceRecord.objects.create(user=self.user, date=date(2025, 1, 4), clock_in_time=time(9))
+        job = self._submit().json()
+        self.assertEqual((job['key'], job['rows']), (first['key'], 4))
+
+    def test_stale_running_job_is_resubmitted(self):
+        job = self._submit().json()
+        status_path, _ = exports._paths(job['key'], 'csv')
+        stale = {**exports.status(job['key'], 'csv'), 'state': exports.STATE_RUNNING, 'updated_at': 0}
+        exports._write_json(status_path, stale)
+
+        self.assertIsNone(exports.file_path(job['key'], 'csv'))
+        self.assertEqual(self.client.get(job['download_url']).status_code, 404)
+        self.assertEqual(self._submit().json()['state'], 'done')
+
+    def test_failed_job(self):
+        with patch('attendance.pdf.build_report', side_effect=RuntimeError('font missing')), self.assertLogs('attendance.exports', 'ERROR'):
+            job = self._submit('pdf').json()
+        self.assertEqual((job['state'], job['error'], job['download_url']), ('failed', 'font missing', None))
+        self.assertEqual(os.listdir(exports._settings()[0]), [f"{job['key']}.json"])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self._submit('xlsx').status_code, 404)
+        self.assertEqual(self._submit(query='start_date=2025-02-01&end_date=2025-01-01').status_code, 400)
+        self.assertEqual(self.client.get('/reports/export/csv/jobs/unknown/').status_code, 404)
+
+    def test_purge_expired_files(self):
+        job = self._submit().json()
+        self.assertEqual(exports.purge(), 0)
+        with override_settings(ATTENDANCE_EXPORT_RETENTION=-1):
+            self.assertEqual(exports.purge(), 2)
+        self.assertIsNone(exports.status(job['key'], 'csv'))
+
+
+class ConditionalGetTests(TestCase):
+    """ダッシュボード・レポートの条件付き GET と圧縮"""
+
+    query = 'start_date=2025-01-01&end_date=2025-01-31'
+    reports_url = f'/reports/?{query}'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('conditional')
+        AttendanceRecord.objects.create(user=self.user, date=date(2025, 1, 6), clock_in_time=time(9))
+
+    def _revalidate(self, url, response):
+        return self.client.get(url, headers={'if-none-match': response['ETag']})
+
+    def test_dashboard(self):
+        response = self.client.get('/dashboard/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('no-cache', response['Cache-Control'])
+        self.assertEqual(self._revalidate('/dashboard/', response).status_code, 304)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            punch(self.user, 'clock_in')
+        changed = self._revalidate('/dashboard/', response)
+        self.assertEqual(changed.status_code, 200)
+        self.assertNotEqual(changed['ETag'], response['ETag'])
+
+    def test_reports(self):
+        response = self.client.get(self.reports_url)
+        self.assertIn('Last-Modified', response)
+        self.assertEqual(self._revalidate(self.reports_url, response).status_code, 304)
+        # 表示位置が違えば別の検証子
+        self.assertEqual(self._revalidate(f'{self.reports_url}&after=2025-01-06_{self.user.pk}', response).status_code, 200)
+
+        record = AttendanceRecord.objects.get(user=self.user)
+        record.clock_out_time = time(18)
+        record.save()
+        self.assertEqual(self._revalidate(self.reports_url, response).status_code, 200)
+
+    def test_pending_messages_are_rendered(self):
+        response = self.client.get('/dashboard/')
+        self.client.get('/clear/')
+        revalidated = self._revalidate('/dashboard/', response)
+        self.assertEqual(revalidated.status_code, 200)
+        self.assertContains(revalidated, '選択がリセットされました。')
+
+    def test_gzip_skips_streaming_responses(self):
+        page = self.client.get(self.reports_url, headers={'accept-encoding': 'gzip'})
+        self.assertEqual(page['Content-Encoding'], 'gzip')
+
+        export = self.client.get(f'/reports/export/csv/?{self.query}', headers={'accept-encoding': 'gzip'})
+        self.assertTrue(export.streaming)
+        self.assertNotIn('Content-Encoding', export)
+        self.assertTrue(b''.join(export.streaming_content).startswith('\ufeff'.encode('utf-8')))
+
+    async def test_gzip_skips_event_stream(self):
+        response = await self.async_client.get('/dashboard/stream/', headers={'accept-encoding': 'gzip'})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        self.assertNotIn('Content-Encoding', response)
+        await aiter(response.streaming_content).aclose()
+
+
+class TeamScopeTests(TestCase):
+    """チームでのダッシュボード・レポートの絞り込み"""
+
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.now().date()
+        self.team = Team.objects.create(name='開発')
+        self.other_team = Team.objects.create(name='営業')
+        self.member = User.objects.create_user('member')
+        self.outsider = User.objects.create_user('outsider')
+        self.unassigned = User.objects.create_user('unassigned')
+        TeamMembership.objects.create(team=self.team, user=self.member)
+        TeamMembership.objects.create(team=self.other_team, user=self.outsider)
+        for user in (self.member, self.outsider, self.unassigned):
+            AttendanceRecord.objects.create(user=user, date=date(2025, 1, 6), clock_in_time=time(9), clock_out_time=time(17))
+
+    def test_dashboard(self):
+        response = self.client.get('/dashboard/', {'team': self.team.pk})
+        self.assertEqual([item['username'] for item in response.context['user_attendance_list']], ['member'])
+        self.assertEqual(response.context['team']['name'], '開発')
+        self.assertEqual(len(self.client.get('/dashboard/').context['user_attendance_list']), 3)
+
+        for team in ('999', 'abc'):
+            with self.subTest(team=team):
+                self.assertEqual(self.client.get('/dashboard/', {'team': team}).status_code, 404)
+
+    def test_reports_and_exports(self):
+        query = f'start_date=2025-01-01&end_date=2025-01-31&team={self.team.pk}'
+        response = self.client.get(f'/reports/?{query}')
+        self.assertEqual([record.user_id for record in response.context['records']], [self.member.pk])
+        self.assertEqual([row['user_id'] for row in response.context['summary']['per_user']], [self.member.pk])
+
+        # 月単位でない期間は勤怠記録から集計
+        response = self.client.get(f'/reports/?start_date=2025-01-01&end_date=2025-01-20&team={self.team.pk}')
+        self.assertEqual([row['user_id'] for row in response.context['summary']['per_user']], [self.member.pk])
+
+        lines = b''.join(self.client.get(f'/reports/export/csv/?{query}').streaming_content).decode('utf-8').splitlines()
+        self.assertEqual([line.split(',')[1] for line in lines[1:]], ['member'])
+        self.assertEqual([row['username'] for row in self.client.get(f'/reports/analytics/json/?{query}').json()['users']], ['member'])
+
+    def test_team_changes_invalidate(self):
+        self.assertEqual([team['name'] for team in users.teams()], ['営業', '開発'])
+        with self.captureOnCommitCallbacks(execute=True):
+            TeamMembership.objects.filter(user=self.outsider).update(team=self.team)
+            TeamMembership.objects.get(user=self.outsider).save()
+            Team.objects.create(name='総務')
+        self.assertEqual([team['name'] for team in users.teams()], ['営業', '総務', '開発'])
+        self.assertEqual(users.get(self.outsider.pk)['team_id'], self.team.pk)
+
+        snapshot = dashboard.get_snapshot(self.today, self.team.pk)
+        self.assertEqual({item['username'] for item in snapshot['user_attendance_list']}, {'member', 'outsider'})
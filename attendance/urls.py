@@ -8,8 +8,18 @@ urlpatterns = [
     path('action/', views.action_selection, name='action_selection'),
     path('clock/<int:user_id>/<str:action>/', views.clock_action, name='clock_action'),
     path('dashboard/', views.dashboard, name='dashboard'),
+    path('dashboard/stream/', views.dashboard_stream, name='dashboard_stream'),
     path('clear/', views.clear_session, name='clear_session'),
     path('reports/', views.reports, name='reports'),
+    path('reports/analytics/', views.report_analytics, name='report_analytics'),
+    path('reports/analytics/json/', views.report_analytics_json, name='report_analytics_json'),
     path('reports/export/csv/', views.report_export_csv, name='report_export_csv'),
     path('reports/export/pdf/', views.report_export_pdf, name='report_export_pdf'),
+    path('reports/export/<str:output>/jobs/', views.report_export_job, name='report_export_job'),
+    path('reports/export/<str:output>/jobs/<slug:key>/', views.report_export_job_status, name='report_export_job_status'),
+    path('reports/export/<str:output>/jobs/<slug:key>/download/', views.report_export_job_download, name='report_export_job_download'),
+    path('metrics/', views.metrics, name='metrics'),
+    path('api/users/', views.user_search, name='user_search'),
+    path('api/punch/', views.punch_api, name='punch_api'),
+    path('api/clock-events/', views.clock_events_ingest, name='clock_events_ingest'),
 ]
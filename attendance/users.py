@@ -0,0 +1,180 @@
+"""アクティブユーザーの一覧と前方一致検索
+
+アクティブユーザーの一覧は Django のキャッシュ（全ワーカーで共有するもの。settings.CACHES）に保存し、
+User の変更時にシグナルから無効化する。各プロセスは一覧と検索用のソート済み索引をメモリに持ち、キャッシュ上の
+バージョンが変わった場合のみ作り直すため、通常のリクエストでは小さなキャッシュ参照1回で済む。
+各ユーザーの所属チームとチームの一覧も同じバージョンで保持する（チーム・所属の変更時も無効化する）。
+"""
+import threading
+import unicodedata
+import uuid
+from bisect import bisect_left
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_CACHE_KEY = 'attendance:active_users:version'
+USERS_CACHE_KEY = 'attendance:active_users:{version}'
+TEAMS_CACHE_KEY = 'attendance:teams:{version}'
+
+# 一覧の保持期間（秒）。無効化後の古い一覧はこの期間で破棄される
+USERS_CACHE_TIMEOUT = 60 * 60 * 24
+
+# バージョンの保持期間（無期限）。変更時はコミット後に必ず無効化するため期限で更新する必要はなく、
+# 更新すると各プロセスの一覧の再構築と、バージョンを含む画面の検証子（ETag）の変更が起きる
+VERSION_CACHE_TIMEOUT = None
+
+# 検索結果の既定件数と上限
+SEARCH_LIMIT = 20
+SEARCH_MAX_LIMIT = 100
+
+# プロセス内の一覧と索引（更新時は辞書ごと差し替える）
+_lock = threading.Lock()
+_state = {'version': None}
+
+# プロセス内のチーム一覧（ユーザー一覧とは別に、同じバージョンで作り直す）
+_teams_state = {'version': None, 'teams': []}
+
+
+def normalize(text):
+    """検索用に正規化（全角・半角、大文字・小文字を区別しない）"""
+    return unicodedata.normalize('NFKC', text).casefold().replace(' ', '')
+
+
+def _fetch_users():
+    users = []
+    rows = User.objects.filter(is_active=True).order_by('last_name', 'first_name', 'id').values_list(
+        'id', 'username', 'first_name', 'last_name', 'team_membership__team_id',
+    )
+    for user_id, username, first_name, last_name, team_id in rows:
+        users.append({
+            'id': user_id,
+            'username': username,
+            'first_name': first_name,
+            'last_name': last_name,
+            'full_name': f'{first_name} {last_name}'.strip(),
+            'team_id': team_id,
+        })
+    return users
+
+
+def _build_index(users):
+    """(正規化したキー, 表示順, ユーザーID) のソート済みリスト"""
+    index = []
+    for position, user in enumerate(users):
+        keys = {
+            user['username'],
+            user['first_name'],
+            user['last_name'],
+            user['last_name'] + user['first_name'],
+            user['first_name'] + user['last_name'],
+        }
+        for key in keys:
+            key = normalize(key)
+            if key:
+                index.append((key, position, user['id']))
+    index.sort()
+    return index
+
+
+def _version():
+    """キャッシュ上のバージョン（無効化後の最初の参照で新しく発行する）"""
+    version = cache.get(VERSION_CACHE_KEY)
+    if version is None:
+        # 同時に発行した場合は先に保存されたものを使う
+        cache.add(VERSION_CACHE_KEY, uuid.uuid4().hex, VERSION_CACHE_TIMEOUT)
+        version = cache.get(VERSION_CACHE_KEY)
+    return version
+
+
+def _load():
+    """最新の一覧と索引を返す（キャッシュのバージョンが変わった場合のみ再構築）"""
+    global _state
+
+    version = _version()
+    state = _state
+    if version == state['version']:
+        return state
+
+    with _lock:
+        users_key = USERS_CACHE_KEY.format(version=version)
+        users = cache.get(users_key)
+        if users is None:
+            users = _fetch_users()
+            cache.set(users_key, users, USERS_CACHE_TIMEOUT)
+
+        state = {
+            'version': version,
+            'users': users,
+            'by_id': {user['id']: user for user in users},
+            'index': _build_index(users),
+        }
+        _state = state
+    return state
+
+
+def invalidate():
+    """一覧を無効化（全プロセスで次回参照時に作り直す）
+
+    トランザクション中の場合はコミット後に無効化する（コミット前のデータで作り直されないように）。
+    """
+    transaction.on_commit(lambda: cache.delete(VERSION_CACHE_KEY))
+
+
+def version():
+    """一覧のバージョン（ユーザー・チーム・所属が変更されると変わる）"""
+    return _version()
+
+
+def active_users():
+    """アクティブユーザーの一覧（姓・名順）"""
+    return _load()['users']
+
+
+def get(user_id):
+    """ユーザーIDから一覧の項目を取得（アクティブでない場合は None）"""
+    return _load()['by_id'].get(user_id)
+
+
+def teams():
+    """チームの一覧（名前順の {'id', 'name'}。ユーザー一覧は読み込まない）"""
+    global _teams_state
+    from .models import Team
+
+    version = _version()
+    state = _teams_state
+    if version == state['version']:
+        return state['teams']
+
+    key = TEAMS_CACHE_KEY.format(version=version)
+    team_list = cache.get(key)
+    if team_list is None:
+        team_list = list(Team.objects.order_by('name', 'id').values('id', 'name'))
+        cache.set(key, team_list, USERS_CACHE_TIMEOUT)
+    _teams_state = {'version': version, 'teams': team_list}
+    return team_list
+
+
+def get_team(team_id):
+    """チームIDから一覧の項目を取得（存在しない場合は None）"""
+    return next((team for team in teams() if team['id'] == team_id), None)
+
+
+def search(query, limit=SEARCH_LIMIT):
+    """ユーザー名・氏名の前方一致検索"""
+    state = _load()
+    prefix = normalize(query)
+    if not prefix:
+        return state['users'][:limit]
+
+    index = state['index']
+    found = {}
+    for key, position, user_id in index[bisect_left(index, (prefix,)):]:
+        if not key.startswith(prefix):
+            break
+        found.setdefault(user_id, position)
+
+    # 表示順（姓・名順）に並べ替えて返す
+    positions = sorted(found.values())[:limit]
+    return [state['users'][position] for position in positions]
@@ -1,11 +1,15 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.views.decorators.http import require_http_methods
+from django.views.decorators.csrf import csrf_exempt
+from django.contrib.admin.views.decorators import staff_member_required
 from django.utils import timezone
 from django.contrib import messages
-from datetime import datetime, date, time
+from django.http import StreamingHttpResponse
+from datetime import datetime, date, time, timedelta
 from .models import AttendanceRecord
 from .forms import ClockingForm, ActionSelectionForm
 from django.contrib.auth.models import User
+import csv
 import json
 
 
@@ -66,64 +70,20 @@ def action_selection(request):
 @require_http_methods(["GET"])
 def clock_action(request, user_id, action):
     """打刻処理"""
-    user = get_object_or_404(User, id=user_id)
-    today = timezone.now().date()
-    now = timezone.now().time()
+    from .punch import TRANSITIONS, punch
 
-    # 当日のレコードを取得または作成
-    record, created = AttendanceRecord.objects.get_or_create(
-        user=user,
-        date=today,
-    )
+    user = get_object_or_404(User, id=user_id)
 
-    try:
-        if action == 'clock_in':
-            if record.clock_out_time:
-                # 退勤済みの場合は退勤時刻をクリアして出勤中に戻す
-                record.clock_out_time = None
-                record.save()
-                messages.success(request, f"{user.get_full_name()}を出勤中に戻しました。")
-            elif record.clock_in_time:
-                messages.warning(request, f"{user.get_full_name()}は既に出勤しています。")
-            else:
-                record.clock_in_time = now
-                record.save()
-                messages.success(request, f"{user.get_full_name()}が出勤しました。({now.strftime('%H:%M:%S')})")
-
-        elif action == 'clock_out':
-            if not record.clock_in_time:
-                messages.warning(request, '出勤時刻が記録されていません。')
-            elif record.clock_out_time:
-                messages.warning(request, f'{user.get_full_name()}は既に退勤しています。')
-            else:
-                record.clock_out_time = now
-                record.save()
-                messages.success(request, f'{user.get_full_name()}が退勤しました。({now.strftime("%H:%M:%S")})')
-
-        elif action == 'break_start':
-            if not record.clock_in_time:
-                messages.warning(request, '出勤時刻が記録されていません。')
-            elif record.clock_out_time:
-                messages.warning(request, '既に退勤しています。')
-            elif record.break_start_time:
-                messages.warning(request, '既に休憩中です。')
-            else:
-                record.break_start_time = now
-                record.save()
-                messages.success(request, f'{user.get_full_name()}が休憩を開始しました。({now.strftime("%H:%M:%S")})')
-
-        elif action == 'break_end':
-            if not record.break_start_time:
-                messages.warning(request, '休憩中ではありません。')
-            elif record.break_end_time:
-                messages.warning(request, '既に休憩から戻っています。')
+    if action in TRANSITIONS:
+        try:
+            # 条件付き UPDATE による状態遷移（同時打刻でも取りこぼさない）
+            result = punch(user, action)
+            if result.success:
+                messages.success(request, result.message)
             else:
-                record.break_end_time = now
-                record.save()
-                messages.success(request, f'{user.get_full_name()}が休憩から戻りました。({now.strftime("%H:%M:%S")})')
-
-    except Exception as e:
-        messages.error(request, f'エラーが発生しました: {str(e)}')
+                messages.warning(request, result.message)
+        except Exception as e:
+            messages.error(request, f'エラーが発生しました: {str(e)}')
 
     # セッションをクリア
     request.session.pop('clock_user_id', None)
@@ -131,54 +91,215 @@ def clock_action(request, user_id, action):
     return redirect('attendance:index')
 
 
+def _punch_payload(user, result):
+    """打刻 API のレスポンス"""
+    from .models import STATUS_LABELS, STATUS_NOT_CLOCKED
+
+    record = result.record
+    status_code = record.get_status_code() if record else STATUS_NOT_CLOCKED
+    return {
+        'success': result.success,
+        'message': result.message,
+        'user': {'id': user.pk, 'username': user.username, 'full_name': user.get_full_name()},
+        'status_code': status_code,
+        'status': STATUS_LABELS[status_code],
+        'clock_in_time': record.clock_in_time.isoformat(timespec='seconds') if record and record.clock_in_time else None,
+        'clock_out_time': record.clock_out_time.isoformat(timespec='seconds') if record and record.clock_out_time else None,
+        'break_start_time': record.break_start_time.isoformat(timespec='seconds') if record and record.break_start_time else None,
+        'break_end_time': record.break_end_time.isoformat(timespec='seconds') if record and record.break_end_time else None,
+        'total_work_time': _format_hhmm(record.total_work_time) if record else '-',
+        'total_break_time': _format_hhmm(record.total_break_time) if record else '-',
+    }
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def punch_api(request):
+    """打刻 API - 認証と打刻を1回のリクエストで行う（セッションは使用しない）
+
+    JSON（またはフォーム形式）で {"user": ユーザーID, "password": PIN またはパスワード, "action": "clock_in"} を受け付ける。
+    リクエストごとに PIN（またはパスワード）で認証し、セッションの Cookie に依存しないため CSRF の検証は行わない。
+    """
+    from django.forms.forms import NON_FIELD_ERRORS
+    from django.http import JsonResponse
+    from .forms import PunchForm
+    from .punch import punch
+
+    if request.content_type == 'application/json':
+        try:
+            data = json.loads(request.body)
+            if not isinstance(data, dict):
+                raise ValueError
+        except ValueError:
+            return JsonResponse({'success': False, 'message': 'リクエストの形式が正しくありません。'}, status=400)
+    else:
+        data = request.POST
+
+    form = PunchForm(data)
+    if not form.is_valid():
+        if form.has_error(NON_FIELD_ERRORS, 'too_many_attempts'):
+            status = 429
+        elif form.has_error(NON_FIELD_ERRORS, 'invalid_password'):
+            status = 401
+        else:
+            status = 400
+        return JsonResponse({
+            'success': False,
+            'message': ' '.join(error for errors in form.errors.values() for error in errors),
+            'errors': form.errors,
+        }, status=status)
+
+    user = form.cleaned_data['user']
+    result = punch(user, form.cleaned_data['action'], source='api')
+    return JsonResponse(_punch_payload(user, result))
+
+
+def _conditional_response(request, etag, last_modified=None):
+    """検証子（ETag / Last-Modified）が一致する場合は 304 を返す
+
+    表示待ちのメッセージがある場合は画面に表示するため対象外とする。
+    """
+    from django.contrib.messages import get_messages
+    from django.utils.cache import get_conditional_response
+
+    if len(get_messages(request)):
+        return None
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def _set_validators(response, etag, last_modified=None):
+    """レスポンスに検証子を設定（ブラウザは毎回再検証する）"""
+    from django.utils.cache import patch_cache_control
+    from django.utils.http import http_date
+
+    response['ETag'] = etag
+    if last_modified:
+        response['Last-Modified'] = http_date(last_modified.timestamp())
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def _team_param(value):
+    """クエリパラメータのチームIDを整数に変換（未指定・不正な値の場合は None）"""
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+# ダッシュボードの更新配信を使えない場合に画面を再読み込みする間隔（秒）
+DASHBOARD_POLL_SECONDS = 60
+
+
+def _stream_enabled(request):
+    """更新配信（Server-Sent Events）を使えるか
+
+    WSGI では終わらない配信が応答を返さずにワーカーを占有するため、ASGI で動作している場合のみ使う。
+    """
+    from django.core.handlers.asgi import ASGIRequest
+
+    return isinstance(request, ASGIRequest)
+
+
 @require_http_methods(["GET"])
 def dashboard(request):
-    """ダッシュボード - 当日の全ユーザーの勤怠状況"""
+    """ダッシュボード - 当日の全ユーザー（?team= の場合はチームのメンバー）の勤怠状況"""
+    from django.http import Http404
+    from django.utils.http import quote_etag
+    from . import dashboard as dashboard_snapshot, users
+
     today = timezone.now().date()
 
-    # 全アクティブユーザーを取得
-    all_users = User.objects.filter(is_active=True).order_by('last_name', 'first_name')
-
-    # 当日の勤怠記録を取得
-    today_records = AttendanceRecord.objects.filter(date=today).select_related('user')
-    records_dict = {record.user_id: record for record in today_records}
-
-    # 各ユーザーと対応する勤怠記録を結合
-    user_attendance_list = []
-    for user in all_users:
-        record = records_dict.get(user.id)
-
-        # 実働時間を計算
-        total_work_hours = 0
-        total_work_minutes = 0
-        if record and record.total_work_time:
-            total_seconds = int(record.total_work_time.total_seconds())
-            total_work_hours = total_seconds // 3600
-            total_work_minutes = (total_seconds % 3600) // 60
-
-        user_attendance_list.append({
-            'user': user,
-            'record': record,
-            'status': record.get_status_display() if record else '未出勤',
-            'total_work_hours': total_work_hours,
-            'total_work_minutes': total_work_minutes,
-        })
-
-    # 統計情報を計算
-    total_clocked_in = sum(1 for item in user_attendance_list if item['record'] and item['record'].is_clocked_in)
-    total_on_break = sum(1 for item in user_attendance_list if item['record'] and item['record'].is_on_break)
-    total_clocked_out = sum(1 for item in user_attendance_list if item['record'] and not item['record'].is_clocked_in and item['record'].clock_in_time)
-    total_not_clocked = sum(1 for item in user_attendance_list if not item['record'] or not item['record'].clock_in_time)
+    team = None
+    team_id = _team_param(request.GET.get('team'))
+    if request.GET.get('team'):
+        team = users.get_team(team_id) if team_id is not None else None
+        if team is None:
+            raise Http404
 
+    # 当日のスナップショット（打刻時にシグナルで更新されるキャッシュ。チームごとに保持）
+    snapshot = dashboard_snapshot.get_snapshot(today, team_id)
     context = {
-        'date': today,
-        'user_attendance_list': user_attendance_list,
-        'total_clocked_in': total_clocked_in,
-        'total_on_break': total_on_break,
-        'total_clocked_out': total_clocked_out,
-        'total_not_clocked': total_not_clocked,
+        **snapshot,
+        'teams': users.teams(),
+        'team': team,
+        'stream_enabled': _stream_enabled(request),
+        'poll_seconds': DASHBOARD_POLL_SECONDS,
     }
-    return render(request, 'attendance/dashboard.html', context)
+
+    # 内容が変わっていなければ描画せずに 304 を返す（データベースへの問い合わせなし）
+    # チーム名の変更等も反映するよう、ユーザー一覧（チーム一覧）のバージョンも含める
+    etag = quote_etag(f"{today.isoformat()}-{team_id or 'all'}-{users.version()}-{context['version']}")
+    not_modified = _conditional_response(request, etag, context['updated_at'])
+    if not_modified is not None:
+        return not_modified
+    return _set_validators(render(request, 'attendance/dashboard.html', context), etag, context['updated_at'])
+
+
+# ダッシュボード配信で共有キャッシュのスナップショットと照合する間隔（秒）
+# 他のプロセスでの打刻はこの間隔で届く。変更がない場合は接続維持のコメントを送る
+DASHBOARD_STREAM_SYNC_SECONDS = 5
+
+
+async def _iter_dashboard_events(target_date, team_id=None):
+    """Server-Sent Events 形式で状態の差分（全体、または指定したチームの集計）を送り続けるジェネレータ
+
+    このプロセスでの打刻は即座に、他のプロセスでの打刻は共有キャッシュのスナップショットとの照合で送る。
+    """
+    from asgiref.sync import sync_to_async
+    from . import dashboard as dashboard_snapshot, events
+
+    get_snapshot = sync_to_async(dashboard_snapshot.get_snapshot)
+    subscription = events.subscribe()
+    try:
+        snapshot = await get_snapshot(target_date, team_id)
+        # 再接続までの待ち時間を指定
+        yield 'retry: 3000\n\n'
+        while True:
+            event = await subscription.get(DASHBOARD_STREAM_SYNC_SECONDS)
+            if subscription.overflowed:
+                # 取りこぼしがある場合は画面を再読み込みさせる
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            if event is not None:
+                if event['date'] == target_date.isoformat() and event['team_id'] == team_id:
+                    yield f'event: status\ndata: {json.dumps(event, ensure_ascii=False)}\n\n'
+                continue
+
+            latest = await get_snapshot(target_date, team_id)
+            deltas = dashboard_snapshot.changed_deltas(snapshot, latest)
+            snapshot = latest
+            if deltas is None:
+                yield 'event: reload\ndata: {}\n\n'
+                return
+            for delta in deltas:
+                yield f'event: status\ndata: {json.dumps(delta, ensure_ascii=False)}\n\n'
+            if not deltas:
+                yield ': keepalive\n\n'
+    finally:
+        subscription.close()
+
+
+@require_http_methods(["GET"])
+async def dashboard_stream(request):
+    """ダッシュボードの更新配信（Server-Sent Events。ASGI の場合のみ）"""
+    from django.http import HttpResponse
+
+    if not _stream_enabled(request):
+        # 204 を受け取った EventSource は再接続しない
+        return HttpResponse(status=204)
+
+    today = timezone.now().date()
+    team_id = _team_param(request.GET.get('team'))
+
+    response = StreamingHttpResponse(_iter_dashboard_events(today, team_id), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 
 
 @require_http_methods(["GET"])
@@ -189,241 +310,535 @@ def clear_session(request):
     return redirect('attendance:index')
 
 
+def _format_hhmm(duration):
+    """timedelta を HH:MM 形式に変換（未設定・0 の場合は '-'）"""
+    if not duration:
+        return '-'
+    total_seconds = int(duration.total_seconds())
+    return f'{total_seconds // 3600:02d}:{(total_seconds % 3600) // 60:02d}'
+
+
+# レポート画面の1ページあたりの件数
+REPORTS_PAGE_SIZE = 50
+
+
+def _parse_cursor(value):
+    """ページカーソル（'YYYY-MM-DD_ユーザーID'）を (日付, ユーザーID) に変換"""
+    if not value:
+        return None
+    try:
+        date_part, user_part = value.split('_', 1)
+        return datetime.strptime(date_part, '%Y-%m-%d').date(), int(user_part)
+    except ValueError:
+        return None
+
+
+def _format_cursor(record):
+    """勤怠記録からページカーソルを生成"""
+    return f'{record.date.isoformat()}_{record.user_id}'
+
+
+def _page_key(record):
+    """(-date, user) 順の並び替えキー"""
+    return (-record.date.toordinal(), record.user_id)
+
+
+def _paginate_records(sources, after=None, before=None, page_size=REPORTS_PAGE_SIZE):
+    """(-date, user) 順のキーセットページネーション
+
+    OFFSET を使わずに直前のページの末尾（または先頭）のキーから続きを取得するため、
+    テーブルが大きくなってもページの取得コストは一定。
+    sources には同じ並び順で併合するクエリセット（稼働テーブル・アーカイブ）のリストを指定する。
+    """
+    from django.db.models import Q
+
+    if before:
+        # 前のページは逆順で取得してから並べ直す
+        before_date, before_user_id = before
+        page = sorted(
+            (
+                record
+                for records in sources
+                for record in records.filter(Q(date__gt=before_date) | Q(date=before_date, user_id__lt=before_user_id))
+                .order_by('date', '-user_id')[:page_size + 1]
+            ),
+            key=_page_key,
+            reverse=True,
+        )[:page_size + 1]
+        has_prev = len(page) > page_size
+        page = page[:page_size][::-1]
+        has_next = True
+    else:
+        if after:
+            after_date, after_user_id = after
+            sources = [
+                records.filter(Q(date__lt=after_date) | Q(date=after_date, user_id__gt=after_user_id))
+                for records in sources
+            ]
+        page = sorted(
+            (record for records in sources for record in records.order_by('-date', 'user_id')[:page_size + 1]),
+            key=_page_key,
+        )[:page_size + 1]
+        has_next = len(page) > page_size
+        page = page[:page_size]
+        has_prev = after is not None
+
+    return {
+        'records': page,
+        'has_next': has_next and bool(page),
+        'has_prev': has_prev and bool(page),
+        'next_cursor': _format_cursor(page[-1]) if page else None,
+        'prev_cursor': _format_cursor(page[0]) if page else None,
+    }
+
+
+def _summary_context(per_user):
+    """ユーザーごとの集計行に表示用の値を加え、全体の合計を算出"""
+    for row in per_user:
+        row['full_name'] = f"{row['user__first_name']} {row['user__last_name']}".strip()
+        row['work_time_display'] = _format_hhmm(row['work_time'])
+        row['break_time_display'] = _format_hhmm(row['break_time'])
+
+    # 全体の合計はユーザー単位の集計結果から算出（ユーザー数分の加算のみ）
+    total_work_time = sum((row['work_time'] for row in per_user if row['work_time']), timedelta(0))
+    total_break_time = sum((row['break_time'] for row in per_user if row['break_time']), timedelta(0))
+    return {
+        'per_user': per_user,
+        'record_count': sum(row['record_count'] for row in per_user),
+        'days_worked': sum(row['days_worked'] for row in per_user),
+        'work_time_display': _format_hhmm(total_work_time),
+        'break_time_display': _format_hhmm(total_break_time),
+    }
+
+
+def _summarize_records(sources):
+    """フィルタ後の勤怠記録をユーザーごとに集計（テーブルごとに1クエリ）"""
+    from django.db.models import Count, Q, Sum
+
+    per_user = {}
+    for records in sources:
+        rows = (
+            records.order_by()
+            .values('user_id', 'user__username', 'user__first_name', 'user__last_name')
+            .annotate(
+                record_count=Count('id'),
+                days_worked=Count('id', filter=Q(clock_in_time__isnull=False)),
+                work_time=Sum('total_work_time'),
+                break_time=Sum('total_break_time'),
+            )
+            .order_by('user__last_name', 'user__first_name', 'user_id')
+        )
+        for row in rows:
+            total = per_user.setdefault(row['user_id'], row)
+            if total is not row:
+                # 稼働テーブルとアーカイブの両方にある場合は合算
+                total['record_count'] += row['record_count']
+                total['days_worked'] += row['days_worked']
+                total['work_time'] = (total['work_time'] or timedelta(0)) + (row['work_time'] or timedelta(0))
+                total['break_time'] = (total['break_time'] or timedelta(0)) + (row['break_time'] or timedelta(0))
+
+    return _summary_context(sorted(
+        per_user.values(),
+        key=lambda row: (row['user__last_name'], row['user__first_name'], row['user_id']),
+    ))
+
+
+def _summarize_months(summaries):
+    """月次集計をユーザーごとに合算（月単位の期間で使用、ユーザー数 × 月数の行のみ読み込む）"""
+    from django.db.models import Sum
+
+    return _summary_context(list(
+        summaries.order_by()
+        .values('user_id', 'user__username', 'user__first_name', 'user__last_name')
+        .annotate(
+            record_count=Sum('record_count'),
+            days_worked=Sum('days_worked'),
+            work_time=Sum('total_work_time'),
+            break_time=Sum('total_break_time'),
+        )
+        .order_by('user__last_name', 'user__first_name', 'user_id')
+    ))
+
+
+def _reports_validators(request, report_filter):
+    """レポート画面の検証子（検索条件・ページ位置・対象の記録の件数と最終更新日時・ユーザー一覧から求める）"""
+    import hashlib
+    from django.utils.http import quote_etag
+    from . import users
+
+    count, last_modified = report_filter.fingerprint()
+    key = '|'.join([
+        report_filter.querystring(),
+        request.GET.get('after', ''),
+        request.GET.get('before', ''),
+        str(count),
+        last_modified.isoformat() if last_modified else '-',
+        users.version(),
+    ])
+    return quote_etag(hashlib.md5(key.encode('utf-8'), usedforsecurity=False).hexdigest()), last_modified
+
+
 @require_http_methods(["GET"])
 def reports(request):
     """レポート画面 - 日付範囲でフィルタリング"""
-    from django.db.models import Q
-    from .forms import DateRangeFilterForm
+    from django.conf import settings
+    from .filters import ReportFilter
+
+    report_filter = ReportFilter.from_request(request)
+    for error in report_filter.errors:
+        messages.error(request, error)
+
+    # 対象の記録・ユーザー・表示位置が変わっていなければ描画せずに 304 を返す
+    validators = None
+    if report_filter.is_valid() and not request.GET.get('explain'):
+        validators = _reports_validators(request, report_filter)
+        not_modified = _conditional_response(request, *validators)
+        if not_modified is not None:
+            return not_modified
+
+    # ページング
+    page = _paginate_records(
+        report_filter.querysets('html'),
+        after=_parse_cursor(request.GET.get('after')),
+        before=_parse_cursor(request.GET.get('before')),
+    )
 
-    form = DateRangeFilterForm(request.GET or None)
-    records = AttendanceRecord.objects.select_related('user')
+    context = {
+        'form': report_filter.display_form(),
+        'records': page['records'],
+        'page': page,
+        'summary': (
+            _summarize_months(report_filter.monthly_summaries())
+            if report_filter.covers_whole_months()
+            else _summarize_records(report_filter.base_querysets())
+        ),
+        'filter_query': report_filter.querystring(),
+    }
 
-    # フィルタリング処理
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    user_id = request.GET.get('user')
+    # DEBUG 時は ?explain=1 で実行計画を表示
+    if settings.DEBUG and request.GET.get('explain'):
+        context['query_plan'] = report_filter.explain('html')
 
-    if start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            records = records.filter(date__gte=start_date)
-        except ValueError:
-            pass
+    response = render(request, 'attendance/reports.html', context)
+    return _set_validators(response, *validators) if validators else response
 
-    if end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            records = records.filter(date__lte=end_date)
-        except ValueError:
-            pass
 
-    if user_id:
-        records = records.filter(user_id=user_id)
+@require_http_methods(["GET"])
+def report_analytics(request):
+    """分析画面 - 残業・平均出勤時刻・遅刻回数・週あたりの労働時間の分布"""
+    from .analytics import analyze
+    from .filters import ReportFilter
 
-    records = records.order_by('-date', 'user')
+    report_filter = ReportFilter.from_request(request)
+    for error in report_filter.errors:
+        messages.error(request, error)
 
     context = {
-        'form': form,
-        'records': records,
+        'form': report_filter.display_form(),
+        'analytics': analyze(report_filter.base_querysets()),
+        'filter_query': report_filter.querystring(),
     }
-    return render(request, 'attendance/reports.html', context)
+    return render(request, 'attendance/analytics.html', context)
 
 
 @require_http_methods(["GET"])
-def report_export_csv(request):
-    """CSV エクスポート"""
-    import csv
-    from django.http import HttpResponse
+def report_analytics_json(request):
+    """分析 API - report_analytics と同じ集計を JSON で返す"""
+    from django.http import JsonResponse
+    from .analytics import analyze
+    from .filters import ReportFilter
 
-    response = HttpResponse(content_type='text/csv; charset=utf-8-sig')
-    response['Content-Disposition'] = 'attachment; filename="attendance_report.csv"'
+    report_filter = ReportFilter.from_request(request)
+    if not report_filter.is_valid():
+        return JsonResponse({'errors': report_filter.errors}, status=400)
 
-    # BOM を追加（Excel で正しく開くため）
-    response.write('\ufeff')
+    return JsonResponse({
+        'start_date': report_filter.start_date.isoformat(),
+        'end_date': report_filter.end_date.isoformat(),
+        'user': report_filter.user.pk if report_filter.user else None,
+        'team': report_filter.team,
+        **analyze(report_filter.base_querysets()),
+    }, json_dumps_params={'ensure_ascii': False})
 
-    writer = csv.writer(response)
-    writer.writerow(['ユーザー', 'ユーザー名', '日付', '出勤', '退勤', '休憩開始', '休憩終了', '実働時間', '休憩時間'])
 
-    # フィルタリング
-    records = AttendanceRecord.objects.select_related('user')
+# CSV エクスポートで1回の送信にまとめる行数
+CSV_EXPORT_CHUNK_ROWS = 500
 
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    user_id = request.GET.get('user')
 
-    if start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            records = records.filter(date__gte=start_date)
-        except ValueError:
-            pass
+class _Echo:
+    """csv.writer の出力をそのまま返す疑似バッファ"""
 
-    if end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            records = records.filter(date__lte=end_date)
-        except ValueError:
-            pass
-
-    if user_id:
-        records = records.filter(user_id=user_id)
-
-    records = records.order_by('-date', 'user')
-
-    for record in records:
-        clock_in = record.clock_in_time.strftime('%H:%M:%S') if record.clock_in_time else '-'
-        clock_out = record.clock_out_time.strftime('%H:%M:%S') if record.clock_out_time else '-'
-        break_start = record.break_start_time.strftime('%H:%M:%S') if record.break_start_time else '-'
-        break_end = record.break_end_time.strftime('%H:%M:%S') if record.break_end_time else '-'
-
-        # 実働時間をフォーマット
-        work_time = '-'
-        if record.total_work_time:
-            total_seconds = int(record.total_work_time.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            work_time = f'{hours:02d}:{minutes:02d}'
-
-        # 休憩時間をフォーマット
-        break_time = '-'
-        if record.total_break_time:
-            total_seconds = int(record.total_break_time.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            break_time = f'{hours:02d}:{minutes:02d}'
-
-        writer.writerow([
-            record.user.get_full_name(),
-            record.user.username,
-            record.date.strftime('%Y-%m-%d'),
-            clock_in,
-            clock_out,
-            break_start,
-            break_end,
-            work_time,
-            break_time,
-        ])
+    def write(self, value):
+        return value
+
+
+def _iter_csv_export(rows):
+    """CSV をチャンク単位で生成するジェネレータ"""
+    writer = csv.writer(_Echo())
+
+    # BOM を先頭に1回だけ付与（Excel で正しく開くため）
+    yield '\ufeff'.encode('utf-8')
+    yield writer.writerow(['ユーザー', 'ユーザー名', '日付', '出勤', '退勤', '休憩開始', '休憩終了', '実働時間', '休憩時間']).encode('utf-8')
+
+    chunk = []
+    for (first_name, last_name, username, record_date,
+         clock_in, clock_out, break_start, break_end, work_time, break_time) in rows:
+        chunk.append(writer.writerow([
+            f'{first_name} {last_name}'.strip(),
+            username,
+            record_date.isoformat(),
+            clock_in.isoformat(timespec='seconds') if clock_in else '-',
+            clock_out.isoformat(timespec='seconds') if clock_out else '-',
+            break_start.isoformat(timespec='seconds') if break_start else '-',
+            break_end.isoformat(timespec='seconds') if break_end else '-',
+            _format_hhmm(work_time),
+            _format_hhmm(break_time),
+        ]))
+        if len(chunk) >= CSV_EXPORT_CHUNK_ROWS:
+            yield ''.join(chunk).encode('utf-8')
+            chunk = []
 
+    if chunk:
+        yield ''.join(chunk).encode('utf-8')
+
+
+def _bad_filter_response(report_filter):
+    """検索条件が不正な場合のレスポンス"""
+    from django.http import HttpResponseBadRequest
+
+    return HttpResponseBadRequest('\n'.join(report_filter.errors), content_type='text/plain; charset=utf-8')
+
+
+@require_http_methods(["GET"])
+def report_export_csv(request):
+    """CSV エクスポート（ストリーミング）"""
+    from .filters import ReportFilter
+
+    report_filter = ReportFilter.from_request(request)
+    if not report_filter.is_valid():
+        return _bad_filter_response(report_filter)
+
+    # 行を読みながら逐次送信するため、メモリ使用量は期間に依存しない
+    response = StreamingHttpResponse(_iter_csv_export(report_filter.rows('csv')), content_type='text/csv; charset=utf-8-sig')
+    response['Content-Disposition'] = 'attachment; filename="attendance_report.csv"'
     return response
 
 
+def _iter_pdf_rows(rows):
+    """PDF の表に渡す行を逐次生成するジェネレータ"""
+    for first_name, last_name, username, record_date, clock_in, clock_out, work_time in rows:
+        work_time_text = '-'
+        if work_time:
+            total_seconds = int(work_time.total_seconds())
+            work_time_text = f'{total_seconds // 3600}:{(total_seconds % 3600) // 60:02d}'
+
+        yield [
+            f'{first_name} {last_name}'.strip(),
+            username,
+            record_date.isoformat(),
+            f'{clock_in.hour:02d}:{clock_in.minute:02d}' if clock_in else '-',
+            f'{clock_out.hour:02d}:{clock_out.minute:02d}' if clock_out else '-',
+            work_time_text,
+        ]
+
+
 @require_http_methods(["GET"])
 def report_export_pdf(request):
     """PDF エクスポート"""
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-    from reportlab.lib import colors
-    from reportlab.pdfbase import pdfmetrics
-    from reportlab.pdfbase.cidfonts import UnicodeCIDFont
-    from datetime import datetime as dt
     from io import BytesIO
     from django.http import HttpResponse
+    from . import pdf
+    from .filters import ReportFilter
 
-    # フィルタリング
-    records = AttendanceRecord.objects.select_related('user')
+    report_filter = ReportFilter.from_request(request)
+    if not report_filter.is_valid():
+        return _bad_filter_response(report_filter)
 
-    start_date = request.GET.get('start_date')
-    end_date = request.GET.get('end_date')
-    user_id = request.GET.get('user')
+    # PDF を生成（件数の上限なし、ページ単位で表を分割）
+    buffer = BytesIO()
+    pdf.build_report(buffer, _iter_pdf_rows(report_filter.rows('pdf')))
 
-    if start_date:
-        try:
-            start_date = datetime.strptime(start_date, '%Y-%m-%d').date()
-            records = records.filter(date__gte=start_date)
-        except ValueError:
-            pass
+    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    response['Content-Disposition'] = 'attachment; filename="attendance_report.pdf"'
+    return response
 
-    if end_date:
-        try:
-            end_date = datetime.strptime(end_date, '%Y-%m-%d').date()
-            records = records.filter(date__lte=end_date)
-        except ValueError:
-            pass
 
-    if user_id:
-        records = records.filter(user_id=user_id)
+def _export_job_payload(job):
+    """エクスポートのジョブの状態を API の応答に変換"""
+    from django.urls import reverse
+
+    payload = {
+        'key': job['key'],
+        'output': job['output'],
+        'state': job['state'],
+        'rows': job['rows'],
+        'total': job['total'],
+        'progress': round(job['rows'] / job['total'], 3) if job['total'] else (1.0 if job['state'] == 'done' else 0.0),
+        'error': job['error'],
+        'status_url': reverse('attendance:report_export_job_status', args=[job['output'], job['key']]),
+        'download_url': None,
+    }
+    if job['state'] == 'done':
+        payload['download_url'] = reverse('attendance:report_export_job_download', args=[job['output'], job['key']])
+    return payload
 
-    records = records.order_by('-date', 'user')
 
-    # PDF を生成
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4, topMargin=20, bottomMargin=20)
-    elements = []
-
-    # 日本語フォントを登録（CIDフォント）
-    jp_font = 'HeiseiKakuGo-W5'
-    pdfmetrics.registerFont(UnicodeCIDFont(jp_font))
-
-    # スタイル設定
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        textColor=colors.HexColor('#007bff'),
-        spaceAfter=12,
-        alignment=1,  # Center
-        fontName=jp_font,
+@require_http_methods(["POST"])
+def report_export_job(request, output):
+    """エクスポートのジョブを登録（検索条件はクエリ文字列で指定）"""
+    from django.http import Http404, JsonResponse
+    from . import exports
+    from .filters import ReportFilter
+
+    if output not in exports.OUTPUT_TYPES:
+        raise Http404
+    report_filter = ReportFilter.from_request(request)
+    if not report_filter.is_valid():
+        return JsonResponse({'errors': report_filter.errors}, status=400)
+
+    job = exports.submit(report_filter, output)
+    return JsonResponse(_export_job_payload(job), status=200 if job['state'] == 'done' else 202)
+
+
+@require_http_methods(["GET"])
+def report_export_job_status(request, output, key):
+    """エクスポートのジョブの状態と進捗"""
+    from django.http import Http404, JsonResponse
+    from . import exports
+
+    job = exports.status(key, output) if output in exports.OUTPUT_TYPES else None
+    if job is None:
+        raise Http404
+    return JsonResponse(_export_job_payload(job))
+
+
+@require_http_methods(["GET"])
+def report_export_job_download(request, output, key):
+    """完了したエクスポートのファイル"""
+    from django.http import FileResponse, Http404
+    from . import exports
+
+    path = exports.file_path(key, output) if output in exports.OUTPUT_TYPES else None
+    if path is None:
+        raise Http404
+    extension, content_type = exports.OUTPUT_TYPES[output]
+    return FileResponse(
+        open(path, 'rb'),
+        as_attachment=True,
+        filename=f'attendance_report.{extension}',
+        content_type=content_type,
     )
 
-    # タイトル
-    title = Paragraph('勤怠レポート', title_style)
-    elements.append(title)
-    elements.append(Spacer(1, 0.3*inch))
-
-    # 生成日時
-    now = dt.now().strftime('%Y年%m月%d日 %H:%M:%S')
-    normal_style = styles['Normal'].clone('JapaneseNormal')
-    normal_style.fontName = jp_font
-    info = Paragraph(f'生成日時: {now}', normal_style)
-    elements.append(info)
-    elements.append(Spacer(1, 0.2*inch))
-
-    # テーブルデータ
-    data = [['ユーザー', 'ユーザー名', '日付', '出勤', '退勤', '実働時間']]
-
-    for record in records[:100]:  # 最初の100件のみ
-        clock_in = record.clock_in_time.strftime('%H:%M') if record.clock_in_time else '-'
-        clock_out = record.clock_out_time.strftime('%H:%M') if record.clock_out_time else '-'
-
-        work_time = '-'
-        if record.total_work_time:
-            total_seconds = int(record.total_work_time.total_seconds())
-            hours = total_seconds // 3600
-            minutes = (total_seconds % 3600) // 60
-            work_time = f'{hours}:{minutes:02d}'
-
-        data.append([
-            record.user.get_full_name(),
-            record.user.username,
-            record.date.strftime('%Y-%m-%d'),
-            clock_in,
-            clock_out,
-            work_time,
-        ])
-
-    # テーブル作成
-    table = Table(data, colWidths=[1.5*inch, 1.2*inch, 1.2*inch, 0.9*inch, 0.9*inch, 1*inch])
-    table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#007bff')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), jp_font),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('FONTNAME', (0, 1), (-1, -1), jp_font),
-    ]))
-    elements.append(table)
-
-    # PDF生成
-    doc.build(elements)
-    buffer.seek(0)
-
-    response = HttpResponse(buffer, content_type='application/pdf')
-    response['Content-Disposition'] = 'attachment; filename="attendance_report.pdf"'
-    return response
+
+# 1回の一括登録で受け付ける打刻イベント数の上限
+CLOCK_EVENTS_MAX_BATCH = 5000
+
+
+def _kiosk_token_valid(request):
+    """端末トークン（Authorization: Bearer ...）を検証"""
+    import hmac
+    from django.conf import settings
+
+    header = request.headers.get('Authorization', '')
+    if not header.startswith('Bearer '):
+        return False
+    token = header[len('Bearer '):].strip()
+    return any(
+        hmac.compare_digest(token, expected)
+        for expected in getattr(settings, 'ATTENDANCE_KIOSK_TOKENS', [])
+    )
+
+
+@csrf_exempt
+@require_http_methods(["POST"])
+def clock_events_ingest(request):
+    """打刻イベントの一括登録 API（端末に溜まった打刻をまとめて送信）
+
+    {"events": [{"user": "user1", "action": "clock_in", "timestamp": "2026-01-05T09:00:00+09:00", "source": "kiosk-1"}, ...]}
+    """
+    from django.http import JsonResponse
+    from django.utils.dateparse import parse_datetime
+    from .models import ClockEvent
+    from .projection import ingest
+
+    if not _kiosk_token_valid(request):
+        return JsonResponse({'error': '端末の認証に失敗しました。'}, status=401)
+
+    try:
+        payload = json.loads(request.body)
+        items = payload['events']
+        if not isinstance(items, list):
+            raise TypeError
+    except (ValueError, KeyError, TypeError):
+        return JsonResponse({'error': 'リクエストの形式が正しくありません。'}, status=400)
+
+    if len(items) > CLOCK_EVENTS_MAX_BATCH:
+        return JsonResponse({'error': f'一度に送信できるのは{CLOCK_EVENTS_MAX_BATCH}件までです。'}, status=400)
+
+    # ユーザー名・ID をまとめて解決
+    usernames = {str(item.get('user')) for item in items if isinstance(item, dict)}
+    users = {}
+    for user_id, username in User.objects.filter(is_active=True, username__in=usernames).values_list('id', 'username'):
+        users[username] = user_id
+    numeric_ids = {int(name) for name in usernames if name.isdigit() and name not in users}
+    for user_id in User.objects.filter(is_active=True, id__in=numeric_ids).values_list('id', flat=True):
+        users[str(user_id)] = user_id
+
+    events = []
+    errors = []
+    for index, item in enumerate(items):
+        if not isinstance(item, dict):
+            errors.append({'index': index, 'error': '形式が正しくありません。'})
+            continue
+        user_id = users.get(str(item.get('user')))
+        event_type = ClockEvent.ACTION_TYPES.get(item.get('action'))
+        timestamp = parse_datetime(str(item.get('timestamp', '')))
+        if user_id is None:
+            errors.append({'index': index, 'error': 'ユーザーが見つかりません。'})
+        elif event_type is None:
+            errors.append({'index': index, 'error': 'アクションが正しくありません。'})
+        elif timestamp is None:
+            errors.append({'index': index, 'error': '打刻日時が正しくありません。'})
+        else:
+            if timezone.is_naive(timestamp):
+                timestamp = timezone.make_aware(timestamp)
+            events.append(ClockEvent(
+                user_id=user_id,
+                event_type=event_type,
+                timestamp=timestamp,
+                source=str(item.get('source', ''))[:64],
+            ))
+
+    if errors:
+        return JsonResponse({'error': '登録できない打刻があります。', 'errors': errors}, status=400)
+
+    updated = ingest(events)
+    return JsonResponse({'accepted': len(events), 'records': updated})
+
+
+@require_http_methods(["GET"])
+def user_search(request):
+    """ユーザーの前方一致検索 API（打刻画面・レポート画面の入力候補）"""
+    from django.http import JsonResponse
+    from . import users
+
+    try:
+        limit = max(1, min(int(request.GET.get('limit', users.SEARCH_LIMIT)), users.SEARCH_MAX_LIMIT))
+    except ValueError:
+        limit = users.SEARCH_LIMIT
+
+    results = [
+        {'id': user['id'], 'username': user['username'], 'full_name': user['full_name']}
+        for user in users.search(request.GET.get('q', ''), limit)
+    ]
+    return JsonResponse({'results': results})
+
+
+@staff_member_required
+@require_http_methods(["GET"])
+def metrics(request):
+    """ビューごとの処理時間の百分位数（直近のリクエスト、プロセス内）- スタッフのみ"""
+    from django.http import JsonResponse
+    from .instrumentation import metrics as request_metrics
+
+    return JsonResponse({'views': request_metrics.snapshot()})
@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -47,6 +48,10 @@ CRISPY_ALLOWED_TEMPLATE_PACKS = "bootstrap5"
 CRISPY_TEMPLATE_PACK = "bootstrap5"
 
 MIDDLEWARE = [
+    # リクエストの計測（全体の処理時間を含めるため先頭に置く）
+    'attendance.instrumentation.RequestTimingMiddleware',
+    # 応答の圧縮（本文を変更するミドルウェアより前に置く。ストリーミングレスポンスは圧縮しない）
+    'attendance.middleware.GZipMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -60,15 +65,22 @@ ROOT_URLCONF = 'attendance_config.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates に描画時間の計測を加えたもの
+        'BACKEND': 'attendance.instrumentation.TimedDjangoTemplates',
         'DIRS': [],
-        'APP_DIRS': True,
         'OPTIONS': {
             'context_processors': [
                 'django.template.context_processors.request',
                 'django.contrib.auth.context_processors.auth',
                 'django.contrib.messages.context_processors.messages',
             ],
+            # 読み込んだテンプレートをプロセス内に保持（DEBUG 時はファイルの変更で破棄される）
+            'loaders': [
+                ('django.template.loaders.cached.Loader', [
+                    'django.template.loaders.filesystem.Loader',
+                    'django.template.loaders.app_directories.Loader',
+                ]),
+            ],
         },
     },
 ]
@@ -86,6 +98,53 @@ DATABASES = {
     }
 }
 
+# 本番用の SQLite 設定（環境変数 DJANGO_DB_PROFILE=production で有効）
+# 接続ごとに適用する PRAGMA（manage.py check_sqlite で適用状況を確認できる）
+SQLITE_PRAGMAS = {
+    'journal_mode': 'wal',      # 読み取りと書き込みを並行して実行
+    'synchronous': 'normal',    # WAL ではチェックポイント時のみ fsync
+    'busy_timeout': 5000,       # ロック待ち（ミリ秒）
+    'cache_size': -20000,       # ページキャッシュ（負の値は KiB 単位）
+    'mmap_size': 134217728,     # メモリマップ I/O（バイト）
+    'temp_store': 'memory',
+}
+
+if os.environ.get('DJANGO_DB_PROFILE') == 'production':
+    DATABASES['default'].update({
+        # 接続をリクエスト間で再利用
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # 書き込みトランザクションは開始時に書き込みロックを取得（途中でのロック昇格失敗を防ぐ）
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+            'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in SQLITE_PRAGMAS.items()),
+        },
+    })
+
+
+# Cache
+# https://docs.djangoproject.com/en/6.0/topics/cache/
+
+# ダッシュボードのスナップショット、ユーザー一覧のバージョン、PIN の試行回数等は全ワーカーで共有する必要があるため、
+# プロセスごとの LocMemCache は使わない。既定は同じホストの全プロセスで共有するファイルキャッシュ、
+# 環境変数 DJANGO_REDIS_URL を指定した場合は Redis（複数ホスト構成）を使う
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.environ.get('DJANGO_CACHE_DIR', BASE_DIR / 'cache'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+if os.environ.get('DJANGO_REDIS_URL'):
+    CACHES['default'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ['DJANGO_REDIS_URL'],
+    }
+
 
 # Password validation
 # https://docs.djangoproject.com/en/6.0/ref/settings/#auth-password-validators
@@ -123,3 +182,55 @@ USE_TZ = True
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
+
+# 本番用の静的ファイル設定（環境変数 DJANGO_STATIC_PROFILE=production で有効。事前に collectstatic を実行する）
+# ファイル名に内容のハッシュを含め、gzip / brotli の圧縮版を作成する（長期間キャッシュして配信できる）
+if os.environ.get('DJANGO_STATIC_PROFILE') == 'production':
+    STORAGES = {
+        'default': {
+            'BACKEND': 'django.core.files.storage.FileSystemStorage',
+        },
+        'staticfiles': {
+            'BACKEND': 'attendance.storage.CompressedManifestStaticFilesStorage',
+        },
+    }
+
+
+# Logging
+# https://docs.djangoproject.com/en/6.0/topics/logging/
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'message': {'format': '%(asctime)s %(message)s'},
+    },
+    'handlers': {
+        'slow_requests': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'message',
+        },
+    },
+    'loggers': {
+        # 遅いリクエスト（1行1件の JSON）
+        'attendance.slow_requests': {
+            'handlers': ['slow_requests'],
+            'level': 'WARNING',
+            'propagate': False,
+        },
+    },
+}
+
+
+# 勤怠管理
+# 遅いリクエストとしてログに出力するしきい値（ミリ秒）
+ATTENDANCE_SLOW_REQUEST_MS = int(os.environ.get('ATTENDANCE_SLOW_REQUEST_MS', 500))
+
+# 打刻イベント一括登録 API（端末）の認証トークン
+ATTENDANCE_KIOSK_TOKENS = [
+    token for token in os.environ.get('ATTENDANCE_KIOSK_TOKENS', '').split(',') if token
+]
+
+# バックグラウンドで作成したエクスポートの保存先とワーカー数
+ATTENDANCE_EXPORT_DIR = os.environ.get('ATTENDANCE_EXPORT_DIR', BASE_DIR / 'exports')
+ATTENDANCE_EXPORT_WORKERS = int(os.environ.get('ATTENDANCE_EXPORT_WORKERS', 2))